@@ -0,0 +1,197 @@
+"""
+CPU micro-benchmarks of the ASR and OCR engines
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from benchmarks.load import percentile
+
+CDSS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+def _service_engine(service, language: str, engine: str, transcribe) -> Callable[[str], str]:
+    """Load the model through the service and call it the way the API does"""
+    service.warm_up([language])
+    loaded = service.loaded_models().get(language)
+    if loaded != ENGINE_MODEL_TYPES[engine]:
+        # Disabled in config, or failed and fell back to an external API: nothing local to measure
+        raise RuntimeError(f"{engine} is not the {language} engine the service loaded ({loaded})")
+    loop = asyncio.new_event_loop()
+
+    def infer(path: str) -> str:
+        with open(path, "rb") as f:
+            return loop.run_until_complete(transcribe(f.read(), language))
+    return infer
+
+def _load_funasr() -> Callable[[str], str]:
+    from app.services.asr import asr_service
+    return _service_engine(asr_service, "zh", "funasr", asr_service.transcribe_voice)
+
+def _load_whisper() -> Callable[[str], str]:
+    from app.services.asr import asr_service
+    return _service_engine(asr_service, "en", "whisper", asr_service.transcribe_voice)
+
+def _load_paddleocr() -> Callable[[str], str]:
+    from app.services.ocr import ocr_service
+    return _service_engine(ocr_service, "zh", "paddleocr", ocr_service.transcribe_image)
+
+# engine -> what the service's loaded_models() reports once that engine is loaded
+ENGINE_MODEL_TYPES = {"funasr": "AutoModel", "whisper": "whisper", "paddleocr": "PaddleOCR"}
+
+# engine -> (input kind, loader)
+ENGINES: Dict[str, Tuple[str, Callable[[], Callable[[str], str]]]] = {
+    "funasr": ("audio", _load_funasr),
+    "whisper": ("audio", _load_whisper),
+    "paddleocr": ("image", _load_paddleocr)
+}
+
+def _rss() -> Dict[str, Optional[int]]:
+    from app.core.stats import process_memory
+    return process_memory()
+
+def summarize(latencies: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "mean": sum(latencies) / len(latencies) if latencies else None,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "max": max(latencies) if latencies else None
+    }
+
+def run_engine(engine: str, threads: int, files: List[str], repeats: int) -> Dict:
+    """Benchmark one engine in the current process; call in a fresh process only"""
+    from app.core.serving import limit_threads
+    from app.utils.audio import audio_duration
+    limit_threads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    kind, loader = ENGINES[engine]
+    started = time.perf_counter()
+    infer = loader()
+    load_s = time.perf_counter() - started
+    memory_after_load = _rss()["rss_bytes"]
+
+    cold_s = None
+    warm: List[float] = []
+    audio_s = 0.0
+    processing_s = 0.0
+    for index, path in enumerate(files):
+        duration = None
+        if kind == "audio":
+            with open(path, "rb") as f:
+                duration = audio_duration(f.read())
+        for attempt in range(repeats + (1 if index == 0 else 0)):
+            started = time.perf_counter()
+            infer(path)
+            elapsed = time.perf_counter() - started
+            if index == 0 and attempt == 0:
+                cold_s = elapsed  # first call after loading pays for lazy initialisation
+                continue
+            warm.append(elapsed)
+            if duration:
+                audio_s += duration
+                processing_s += elapsed
+
+    return {
+        "engine": engine,
+        "kind": kind,
+        "threads": threads,
+        "files": len(files),
+        "repeats": repeats,
+        "load_s": load_s,
+        "cold_s": cold_s,
+        "warm_s": summarize(warm),
+        "real_time_factor": processing_s / audio_s if audio_s else None,
+        "rss_after_load_bytes": memory_after_load,
+        "peak_rss_bytes": _rss()["peak_rss_bytes"]
+    }
+
+def _corpus(directory: Optional[str], extensions: Tuple[str, ...], kind: str, scratch: str) -> List[str]:
+    if directory:
+        files = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith(extensions)
+        )
+        if not files:
+            sys.exit(f"No {kind} files in {directory}")
+        return files
+    from benchmarks.fixtures import synthetic_png, synthetic_wav
+    path = os.path.join(scratch, "synthetic.wav" if kind == "audio" else "synthetic.png")
+    with open(path, "wb") as f:
+        f.write(synthetic_wav(seconds=10.0) if kind == "audio" else synthetic_png())
+    return [path]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ASR/OCR engines on CPU.")
+    parser.add_argument("--engines", default=",".join(ENGINES), help=f"Comma separated, from: {', '.join(ENGINES)}")
+    parser.add_argument("--threads", default="1,2,4", help="Comma separated thread counts")
+    parser.add_argument("--audio-dir", help="Directory of audio files (default: synthetic)")
+    parser.add_argument("--image-dir", help="Directory of images (default: synthetic)")
+    parser.add_argument("--repeats", type=int, default=3, help="Warm runs per file")
+    parser.add_argument("--output", default="engine-benchmarks.json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)  # JSON run spec, used internally
+    args = parser.parse_args(argv)
+
+    if args.child:
+        spec = json.loads(args.child)
+        print(json.dumps(run_engine(spec["engine"], spec["threads"], spec["files"], spec["repeats"])))
+        return
+
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    unknown = [e for e in engines if e not in ENGINES]
+    if unknown:
+        sys.exit(f"Unknown engines: {', '.join(unknown)}")
+    thread_counts = [int(t) for t in args.threads.split(",") if t.strip()]
+
+    results = {
+        "machine": {"python": platform.python_version(), "processor": platform.processor(), "cpus": os.cpu_count()},
+        "timestamp": int(time.time()),
+        "runs": []
+    }
+    env = {
+        **os.environ,
+        "CUDA_VISIBLE_DEVICES": "",  # CPU numbers only
+        "PYTHONPATH": os.pathsep.join(filter(None, [os.path.join(CDSS_DIR, "src"), CDSS_DIR, os.environ.get("PYTHONPATH")]))
+    }
+    with tempfile.TemporaryDirectory() as scratch:
+        corpora = {
+            "audio": lambda: _corpus(args.audio_dir, AUDIO_EXTENSIONS, "audio", scratch),
+            "image": lambda: _corpus(args.image_dir, IMAGE_EXTENSIONS, "image", scratch)
+        }
+        for engine in engines:
+            files = corpora[ENGINES[engine][0]]()
+            for threads in thread_counts:
+                print(f"{engine} with {threads} thread(s) on {len(files)} file(s) ...")
+                spec = json.dumps({"engine": engine, "threads": threads, "files": files, "repeats": args.repeats})
+                completed = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.engines", "--child", spec],
+                    cwd=CDSS_DIR, env=env, capture_output=True, text=True
+                )
+                if completed.returncode != 0:
+                    error = completed.stderr.strip().splitlines()[-1:] or ["unknown error"]
+                    print(f"  failed: {error[0]}")
+                    results["runs"].append({"engine": engine, "threads": threads, "error": error[0]})
+                    continue
+                run = json.loads(completed.stdout.strip().splitlines()[-1])
+                results["runs"].append(run)
+                rtf = f", RTF {run['real_time_factor']:.3f}" if run["real_time_factor"] else ""
+                print(f"  load {run['load_s']:.1f}s, cold {run['cold_s']:.2f}s, warm p50 {run['warm_s']['p50']:.2f}s{rtf}, "
+                      f"peak RSS {run['peak_rss_bytes'] / 2**20:.0f} MiB")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
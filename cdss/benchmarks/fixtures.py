@@ -0,0 +1,54 @@
+"""
+Synthetic audio and image fixtures, generated in memory with the standard library
+"""
+
+import io
+import math
+import struct
+import wave
+import zlib
+
+def synthetic_wav(seconds: float = 5.0, sample_rate: int = 16000, frequency: float = 440.0) -> bytes:
+    """A mono 16-bit PCM WAV with a tone, speech-like in length and format"""
+    frames = bytearray()
+    for i in range(int(seconds * sample_rate)):
+        # Amplitude modulation roughly at syllable rate
+        envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 4 * i / sample_rate)
+        sample = int(12000 * envelope * math.sin(2 * math.pi * frequency * i / sample_rate))
+        frames += struct.pack("<h", sample)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+def synthetic_png(width: int = 640, height: int = 480) -> bytes:
+    """A grayscale PNG with horizontal bars resembling lines of text"""
+    rows = []
+    for y in range(height):
+        is_text_line = (y // 12) % 3 == 1
+        row = bytes(
+            0 if is_text_line and (x // 6) % 5 != 4 and 40 < x < width - 40 else 255
+            for x in range(width)
+        )
+        rows.append(b"\x00" + row)  # filter type 0 per scanline
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)  # 8-bit grayscale
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(b"".join(rows)))
+        + chunk(b"IEND", b"")
+    )
+
+SAMPLE_TRANSCRIPT = (
+    "医生：您好，哪里不舒服？患者：我咳嗽三天了，晚上比较厉害。医生：有没有发烧？"
+    "患者：没有发烧，就是有点嗓子疼。医生：以前有什么病吗？患者：没有。"
+)
+
+SAMPLE_RECORD = "**主诉:** 咳嗽三天\n**现病史:** 三天前受凉后出现咳嗽，无发热\n**诊断:** 急性上呼吸道感染"
@@ -0,0 +1,229 @@
+"""
+Load driver for the CDSS API
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+import httpx
+from benchmarks.fixtures import synthetic_wav, synthetic_png, SAMPLE_TRANSCRIPT, SAMPLE_RECORD
+from benchmarks.stub_llm import StubConfig, start_stub
+
+ENDPOINTS = ("query", "t2mr", "mr2nl", "a2mr")
+CDSS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def _request_factory(endpoint: str, language: str):
+    """Return a function issuing one request to endpoint with an httpx client"""
+    if endpoint == "query":
+        body = {"prompt": "咳嗽三天应该注意什么？", "role": "patient", "medical_records": SAMPLE_RECORD, "language": language}
+        return lambda client: client.post("/query", json=body)
+    if endpoint == "mr2nl":
+        body = {"prompt": "", "role": "patient", "medical_records": SAMPLE_RECORD, "language": language}
+        return lambda client: client.post("/mr2nl", json=body)
+    if endpoint == "t2mr":
+        body = {"transcript": SAMPLE_TRANSCRIPT, "language": language, "is_json": True}
+        return lambda client: client.post("/t2mr", json=body)
+    if endpoint == "a2mr":
+        audio, image = synthetic_wav(), synthetic_png()
+        return lambda client: client.post(
+            "/a2mr",
+            files=[("files", ("visit.wav", audio, "audio/wav")), ("files", ("note.png", image, "image/png"))],
+            data={"language": language, "is_json": "true"}
+        )
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+async def run_endpoint(base_url: str, endpoint: str, concurrency: int, requests: int, language: str, timeout_s: float) -> Dict:
+    """Issue `requests` requests to one endpoint with `concurrency` in flight"""
+    send = _request_factory(endpoint, language)
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await send(client)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if status == "200":
+                latencies.append(elapsed)
+            else:
+                errors[status] = errors.get(status, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout_s, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall_s = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "requests_per_s": round(len(latencies) / wall_s, 3) if wall_s else None,
+        "latency_s": {f"p{q}": percentile(latencies, q) for q in (50, 95, 99)}
+    }
+
+def _peak_rss_of(pid: int) -> Optional[int]:
+    """Peak RSS (VmHWM) of a process tree root, in bytes; Linux only"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def _server_peak_rss(base_url: str) -> Optional[int]:
+    try:
+        return httpx.get(f"{base_url}/server-info", timeout=5).json()["process"]["peak_rss_bytes"]
+    except (httpx.HTTPError, KeyError, ValueError):
+        return None
+
+def start_api(port: int, llm_url: str, workers: int) -> subprocess.Popen:
+    """Start the API against the stub LLM and wait until it answers"""
+    env = {
+        **os.environ,
+        "LLM_API_URL": llm_url,
+        "FALLBACK_LLM_API_URL": llm_url,
+        "PYTHONPATH": os.pathsep.join(filter(None, [os.path.join(CDSS_DIR, "src"), os.environ.get("PYTHONPATH")])),
+        "TRACING_ENABLED": os.environ.get("TRACING_ENABLED", "True")
+    }
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "serve", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=CDSS_DIR,
+        env=env
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/server-info", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.3)
+    process.terminate()
+    raise RuntimeError("API server did not start within 120s")
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions of results against baseline, as human-readable lines"""
+    regressions = []
+    for endpoint, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous:
+            continue
+        for q in ("p50", "p95", "p99"):
+            now, before = current["latency_s"][q], previous["latency_s"].get(q)
+            if now is not None and before and now > before * (1 + tolerance):
+                regressions.append(f"{endpoint} {q}: {before:.3f}s -> {now:.3f}s")
+        now, before = current["requests_per_s"], previous.get("requests_per_s")
+        if now is not None and before and now < before * (1 - tolerance):
+            regressions.append(f"{endpoint} requests/s: {before:.2f} -> {now:.2f}")
+    before, now = baseline.get("peak_rss_bytes"), results.get("peak_rss_bytes")
+    if before and now and now > before * (1 + tolerance):
+        regressions.append(f"peak RSS: {before / 2**20:.0f} MiB -> {now / 2**20:.0f} MiB")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the CDSS API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API to test (ignored with --start-server)")
+    parser.add_argument("--start-server", action="store_true", help="Start a stub LLM and the API locally")
+    parser.add_argument("--port", type=int, default=8010, help="API port with --start-server")
+    parser.add_argument("--workers", type=int, default=1, help="API workers with --start-server")
+    parser.add_argument("--stub-latency-ms", type=float, default=200)
+    parser.add_argument("--stub-tokens-per-s", type=float, default=50)
+    parser.add_argument("--stub-completion-tokens", type=int, default=120)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--language", default="zh")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="Stored results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args(argv)
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    api = None
+    stub = None
+    base_url = args.url
+    if args.start_server:
+        StubConfig.latency_s = args.stub_latency_ms / 1000
+        StubConfig.tokens_per_s = args.stub_tokens_per_s
+        StubConfig.completion_tokens = args.stub_completion_tokens
+        stub = start_stub()
+        api = start_api(args.port, f"http://127.0.0.1:{stub.server_address[1]}/v1", args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        results = {
+            "config": {
+                "endpoints": endpoints,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "language": args.language,
+                "workers": args.workers if args.start_server else None,
+                "stub_llm": {
+                    "latency_ms": args.stub_latency_ms,
+                    "tokens_per_s": args.stub_tokens_per_s,
+                    "completion_tokens": args.stub_completion_tokens
+                } if args.start_server else None,
+                "python": platform.python_version(),
+                "cpus": os.cpu_count()
+            },
+            "timestamp": int(time.time()),
+            "endpoints": {}
+        }
+        for endpoint in endpoints:
+            print(f"Benchmarking /{endpoint} ...")
+            results["endpoints"][endpoint] = asyncio.run(run_endpoint(
+                base_url, endpoint, args.concurrency, args.requests, args.language, args.timeout
+            ))
+            summary = results["endpoints"][endpoint]
+            p = summary["latency_s"]
+            fmt = lambda v: f"{v:.3f}s" if v is not None else "-"
+            print(f"  ok {summary['ok']}/{summary['requests']}, {summary['requests_per_s']} req/s, "
+                  f"p50 {fmt(p['p50'])}, p95 {fmt(p['p95'])}, p99 {fmt(p['p99'])}, errors {summary['errors']}")
+        # The parent's VmHWM misses forked workers, /server-info reports the worker that answers
+        results["peak_rss_bytes"] = (_peak_rss_of(api.pid) if api and args.workers == 1 else None) or _server_peak_rss(base_url)
+    finally:
+        if api:
+            api.terminate()
+            api.wait(timeout=60)
+        if stub:
+            stub.shutdown()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
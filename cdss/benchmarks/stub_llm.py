@@ -0,0 +1,163 @@
+"""
+OpenAI-compatible stub LLM server for benchmarks
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+# The sections of a sample consultation; all other sections of the schema are answered with "None"
+RECORD_CONTENT = {
+    "主诉": "咳嗽三天", "现病史": "三天前受凉后出现咳嗽，无发热", "既往史": "无",
+    "体格检查": "双肺呼吸音清", "辅助检查": "无", "诊断": "急性上呼吸道感染", "处置意见": "多饮水，对症治疗"
+}
+TEXT_REPLY = "**主诉:** 咳嗽三天\n**现病史:** 三天前受凉后出现咳嗽，无发热\n**诊断:** 急性上呼吸道感染"
+
+class StubConfig:
+    latency_s = 0.2
+    tokens_per_s = 50.0
+    completion_tokens = 120
+
+def _listed_sections(text: str, template: str) -> Optional[List[str]]:
+    """The section names filled into a prompt template's {sections}, if text contains that prompt"""
+    prefix, suffix = template.split("{sections}")
+    start = text.find(prefix)
+    if start == -1:
+        return None
+    start += len(prefix)
+    end = text.find(suffix, start)
+    return text[start:end if end != -1 else None].split(", ")
+
+def _record_sections(body: dict) -> Tuple[str, List[str]]:
+    """The language and sections a JSON record prompt asks for; a section retry asks for only some"""
+    from app.core.i18n import LLM_PROMPTS, SUPPORTED_LANGUAGES, get_medical_record_sections
+    messages = body.get("messages", [])
+    last = (messages[-1].get("content") or "") if messages else ""
+    text = "\n".join(m.get("content") or "" for m in messages)
+    for key, prompt in (("mr_json_retry", last), ("mr_json_format", text)):
+        for language in SUPPORTED_LANGUAGES:
+            listed = _listed_sections(prompt, LLM_PROMPTS[language][key])
+            if listed:
+                schema = get_medical_record_sections(language)
+                return language, [name for name in schema if name in listed]
+    return "zh", get_medical_record_sections("zh")
+
+def _json_reply(body: dict) -> str:
+    language, sections = _record_sections(body)
+    none = "无" if language == "zh" else "None"
+    return json.dumps({name: RECORD_CONTENT.get(name, none) for name in sections}, ensure_ascii=False)
+
+def _reply_for(body: dict) -> str:
+    wants_json = body.get("response_format", {}).get("type") == "json_object" or any(
+        "JSON" in (m.get("content") or "") for m in body.get("messages", []) if m.get("role") == "system"
+    )
+    return _json_reply(body) if wants_json else TEXT_REPLY
+
+def _usage(body: dict) -> dict:
+    prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": StubConfig.completion_tokens,
+        "total_tokens": prompt_tokens + StubConfig.completion_tokens
+    }
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        time.sleep(StubConfig.latency_s)
+        content = _reply_for(body)
+        generation_s = StubConfig.completion_tokens / StubConfig.tokens_per_s if StubConfig.tokens_per_s else 0
+        completion_id = f"chatcmpl-stub-{time.time_ns()}"
+
+        if not body.get("stream"):
+            time.sleep(generation_s)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": _usage(body)
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+        for piece in pieces:
+            time.sleep(generation_s / len(pieces))
+            self._send_event({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            })
+        if body.get("stream_options", {}).get("include_usage"):
+            self._send_event({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "stub"), "choices": [], "usage": _usage(body)
+            })
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def _send_event(self, payload: dict):
+        self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+def start_stub(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the stub on a background thread; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Delay before the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=50, help="Generation speed; 0 for instant")
+    parser.add_argument("--completion-tokens", type=int, default=120, help="Reported completion tokens per reply")
+    args = parser.parse_args(argv)
+
+    StubConfig.latency_s = args.latency_ms / 1000
+    StubConfig.tokens_per_s = args.tokens_per_s
+    StubConfig.completion_tokens = args.completion_tokens
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    print(f"Stub LLM listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -4,27 +4,158 @@ Voice2MR API entry point
 """
 
 import argparse
+import sys
 import uvicorn
 
-def main():
+COMMANDS = ("serve", "batch", "inference-server")
+
+APP_PATH = "src.app:app"
+
+def serve(args):
+    if args.workers > 1:
+        if args.reload:
+            sys.exit("--reload cannot be combined with --workers")
+        from app.core.serving import serve_prefork
+
+        serve_prefork(
+            APP_PATH,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            threads_per_worker=args.threads_per_worker,
+            preload=not args.no_preload,
+            preload_languages=args.preload_languages.split(",") if args.preload_languages else None,
+            pin_cpus=args.pin_cpus
+        )
+        return
+
+    if args.threads_per_worker:
+        from app.core.serving import limit_threads
+        limit_threads(args.threads_per_worker)
+    uvicorn.run(APP_PATH,
+                host=args.host,
+                port=args.port,
+                reload=args.reload)
+
+def batch(args):
+    from app.batch import run_batch
+
+    stats = run_batch(
+        input_dir=args.input_dir,
+        output_path=args.output,
+        workers=args.workers,
+        language=args.language,
+        is_json=not args.markdown,
+        per_directory=args.per_directory,
+        checkpoint_path=args.checkpoint,
+        warm_up=not args.no_warm_up
+    )
+    print(f"Processed: {stats['processed']}, skipped: {stats['skipped']}, failed: {stats['failed']}")
+
+def inference_server(args):
+    from app.core.serving import limit_threads
+    if args.threads:
+        limit_threads(args.threads)
+    from app.services.inference_server import run_inference_server
+
+    run_inference_server(
+        args.socket,
+        languages=args.languages.split(","),
+        warm_up=not args.no_warm_up
+    )
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Keep `main.py --port 8000` working: no subcommand means serve
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv = ["serve"] + list(argv)
+
     parser = argparse.ArgumentParser(description='Medical AI Assistant API.')
-    parser.add_argument('--port', 
-                       type=int, 
-                       help='The listening port', 
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Run the API server (default)')
+    serve_parser.add_argument('--port',
+                       type=int,
+                       help='The listening port',
                        default=8000)
-    parser.add_argument('--host',
+    serve_parser.add_argument('--host',
                        type=str,
                        help='The host to bind to',
                        default="0.0.0.0")
-    parser.add_argument('--reload',
+    serve_parser.add_argument('--reload',
                        action='store_true',
                        help='Enable auto-reload')
-    args = parser.parse_args()
+    serve_parser.add_argument('--workers',
+                       type=int,
+                       help='The number of worker processes; more than one preloads the models and forks',
+                       default=1)
+    serve_parser.add_argument('--threads-per-worker',
+                       type=int,
+                       help='The torch/OpenMP threads per worker (default: CPUs / workers)',
+                       default=None)
+    serve_parser.add_argument('--pin-cpus',
+                       action='store_true',
+                       help='Pin each worker to its own CPUs (Linux only)')
+    serve_parser.add_argument('--no-preload',
+                       action='store_true',
+                       help='Let each worker load its own models on first use instead of sharing preloaded ones')
+    serve_parser.add_argument('--preload-languages',
+                       type=str,
+                       help='Comma separated languages to preload (default: WARMUP_LANGUAGES)',
+                       default=None)
+    serve_parser.set_defaults(func=serve)
 
-    uvicorn.run("src.app:app", 
-                host=args.host,
-                port=args.port,
-                reload=args.reload)
+    batch_parser = subparsers.add_parser('batch', help='Convert a directory of recordings, scans and transcripts into medical records')
+    batch_parser.add_argument('input_dir',
+                       type=str,
+                       help='The directory to process')
+    batch_parser.add_argument('--output',
+                       type=str,
+                       help='The JSONL file to append results to',
+                       default="records.jsonl")
+    batch_parser.add_argument('--checkpoint',
+                       type=str,
+                       help='The progress file used to resume (default: <output>.checkpoint)',
+                       default=None)
+    batch_parser.add_argument('--workers',
+                       type=int,
+                       help='The number of worker processes, each keeping its own models loaded',
+                       default=2)
+    batch_parser.add_argument('--language',
+                       type=str,
+                       help='The language of the archive',
+                       default="zh")
+    batch_parser.add_argument('--markdown',
+                       action='store_true',
+                       help='Output records in markdown instead of json')
+    batch_parser.add_argument('--per-directory',
+                       action='store_true',
+                       help='Treat all files of a directory as one consultation')
+    batch_parser.add_argument('--no-warm-up',
+                       action='store_true',
+                       help='Do not preload ASR/OCR models when a worker starts')
+    batch_parser.set_defaults(func=batch)
+
+    inference_parser = subparsers.add_parser('inference-server', help='Run the out-of-process ASR/OCR inference server')
+    inference_parser.add_argument('--socket',
+                       type=str,
+                       help='The Unix socket to listen on; point INFERENCE_SOCKET of the API at it',
+                       default="/tmp/cdss-inference.sock")
+    inference_parser.add_argument('--languages',
+                       type=str,
+                       help='Comma separated languages to load at startup',
+                       default="zh")
+    inference_parser.add_argument('--threads',
+                       type=int,
+                       help='The torch/OpenMP threads of the server',
+                       default=None)
+    inference_parser.add_argument('--no-warm-up',
+                       action='store_true',
+                       help='Load models on first use instead of at startup')
+    inference_parser.set_defaults(func=inference_server)
+
+    args = parser.parse_args(argv)
+    args.func(args)
 
 if __name__ == "__main__":
     main()
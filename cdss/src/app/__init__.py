@@ -3,13 +3,71 @@ Voice2MR API application package
 """
 
 import argparse
-from fastapi import FastAPI
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import medical_records, chat, server_info
+from app.api.routes import medical_records, chat, server_info, metrics
+from app.core.config import WARMUP_ON_STARTUP, WARMUP_LANGUAGES, LLM_WARM_POOL_ENABLED, RETRIEVAL_ENABLED
+from app.core.stats import request_counter
+from app.core.tracing import TracingMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.deadline import DeadlineMiddleware
+from app.core.metrics import http_request_seconds, registry as metrics_registry
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-fork workers publish their metrics so that any worker can answer /metrics for all of them
+    metrics_registry.start_sharing()
+    if WARMUP_ON_STARTUP:
+        from app.services.warmup import warm_up_models
+        timings = await asyncio.to_thread(warm_up_models, WARMUP_LANGUAGES)
+        for service, seconds in timings.items():
+            print(f"Warmed up {service} models for {WARMUP_LANGUAGES} in {seconds:.1f}s")
+    if RETRIEVAL_ENABLED:
+        from app.services.retrieval import retrieval_service
+        await asyncio.to_thread(retrieval_service.ensure_index)
+    # One warm pool per deployment: N pre-fork workers would send N preloads and keep-alives
+    run_warm_pool = LLM_WARM_POOL_ENABLED and os.environ.get("CDSS_WORKER_ID", "0") == "0"
+    if run_warm_pool:
+        from app.services.llm import llm_service
+        llm_service.warm_pool.start()
+    yield
+    if run_warm_pool:
+        await llm_service.warm_pool.stop()
 
-# Add CORS middleware
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    request_counter.active += 1
+    request_counter.total += 1
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        request_counter.active -= 1
+        # Label by route template, not raw path, to keep the number of series bounded
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            endpoint=route.path if route else "unmatched",
+            status=status
+        )
+
+# Cancels handlers on deadline expiry or client disconnect
+app.add_middleware(DeadlineMiddleware)
+# Inside tracing, so that profiles are saved under the request id
+app.add_middleware(ProfilingMiddleware)
+# Wraps everything but CORS and times the whole request
+app.add_middleware(TracingMiddleware)
+# Outermost, so that responses written by the middlewares above (e.g. the deadline's 504) carry CORS headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Temporary for development
@@ -23,6 +81,7 @@ app.add_middleware(
 app.include_router(medical_records.router, tags=["Medical Records"])
 app.include_router(chat.router, tags=["Chat"])
 app.include_router(server_info.router, tags=["Server Info"])
+app.include_router(metrics.router, tags=["Server Info"])
 
 if __name__ == "__main__":
     import uvicorn
@@ -7,6 +7,7 @@ class CDSSRequestModel(BaseModel):
     role: str
     session_id: Optional[str] = None
     medical_records: Optional[str] = None
+    record_id: Optional[str] = None  # a record stored by /t2mr or /a2mr, instead of medical_records
     history: Optional[List[str]] = None
     language: str = "zh"  # Default to Chinese for backward compatibility
 
@@ -20,3 +21,15 @@ class MRRequestModel(BaseModel):
     medical_records: Optional[str] = None
     is_json: bool = True
     language: str = "zh"  # Default to Chinese for backward compatibility
+
+class MRUpdateRequestModel(BaseModel):
+    existing_record: Optional[str] = None  # defaults to the stored record of record_id
+    transcript_delta: str
+    medical_records: Optional[str] = None
+    record_id: Optional[str] = None  # stored record to update and replace with the update
+    is_json: bool = True
+    language: str = "zh"
+
+class MRBatchRequestModel(BaseModel):
+    items: List[MRRequestModel]
+    concurrency: Optional[int] = None  # defaults to BATCH_DEFAULT_CONCURRENCY
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
 
 class CDSSResponseModel(BaseModel):
     session_id: Optional[str] = None
@@ -8,6 +8,8 @@ class CDSSResponseModel(BaseModel):
     prompt_tokens: int
     completion_tokens: int
     total_tokens: int
+    degraded: bool = False  # answered by the fallback model
+    cached: bool = False  # served from the semantic cache of similar earlier questions
 
 class MRResponseModel(BaseModel):
     content: str
@@ -15,6 +17,12 @@ class MRResponseModel(BaseModel):
     prompt_tokens: int
     completion_tokens: int
     total_tokens: int
+    tokens_saved: int = 0  # prompt tokens removed by transcript normalisation
+    degraded: bool = False  # answered by the fallback model
+    record_id: Optional[str] = None  # id of the stored record, usable in /query and /mr2nl
+
+class MRUpdateResponseModel(MRResponseModel):
+    sections: Dict[str, str]  # section name -> "changed" / "unchanged"
 
 class ScaleResponseModel(BaseModel):
     answers: List[str]
@@ -27,3 +35,9 @@ class ServerInfoModel(BaseModel):
     light_mode: bool
     features: Dict[str, bool]
     version: str
+    models: Dict[str, Dict[str, str]] = {}  # asr/ocr -> language -> engine
+    process: Dict[str, Any] = {}
+    workers: Dict[str, int] = {}
+    queues: Dict[str, int] = {}
+    llm: Dict[str, Dict[str, Any]] = {}
+    caches: Dict[str, Dict[str, Any]] = {}
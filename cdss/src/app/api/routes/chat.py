@@ -2,6 +2,7 @@ from fastapi import APIRouter
 from app.api.models.request_models import CDSSRequestModel
 from app.api.models.response_models import CDSSResponseModel
 from app.services.medical_record import medical_record_service
+from app.core.degradation import degradation_router
 
 router = APIRouter()
 
@@ -16,18 +17,23 @@ async def process_text(request_model: CDSSRequestModel) -> CDSSResponseModel:
     - **role**: The role of the user (doctor/patient).
     - **session_id**: Optional session ID for conversation continuity.
     - **medical_records**: Optional medical records for context.
+    - **record_id**: Optional id of a record stored by /t2mr or /a2mr, used instead of medical_records.
     - **history**: Optional conversation history.
     - **language**: The language for the response (default: zh).
 
-    Returns the AI assistant's response.
+    Returns the AI assistant's response; **degraded** is true when the light fallback model answered,
+    **cached** when the answer to an earlier, similar question was reused.
     """
     response = await medical_record_service.process_chat(
         prompt=request_model.prompt,
         role=request_model.role,
         medical_records=request_model.medical_records,
+        record_id=request_model.record_id,
         session_id=request_model.session_id,
         history=request_model.history,
-        language=request_model.language
+        language=request_model.language,
+        allow_degrade=degradation_router.allows("/query", request_model.role),
+        use_semantic_cache=True
     )
     return CDSSResponseModel(**response)
 
@@ -39,14 +45,20 @@ async def mr2nl(request_model: CDSSRequestModel) -> CDSSResponseModel:
     This endpoint converts formal medical records into natural language that is easier to understand.
     
     - **medical_records**: The medical records to convert.
+    - **record_id**: Alternatively, the id of a record stored by /t2mr or /a2mr.
     - **role**: The role of the user (doctor/patient).
     - **language**: The language for the response (default: zh).
 
     Returns the natural language version of the medical records.
     """
+    medical_records = request_model.medical_records
+    if request_model.record_id:
+        medical_records = await medical_record_service.load_record(request_model.record_id)
     response = await medical_record_service.process_chat(
-        prompt=f"Please rephrase the following medical records into natural language: {request_model.medical_records}",
+        prompt=f"Please rephrase the following medical records into natural language: {medical_records}",
         role=request_model.role,
-        language=request_model.language
+        language=request_model.language,
+        allow_degrade=degradation_router.allows("/mr2nl", request_model.role),
+        endpoint="/mr2nl"
     )
     return CDSSResponseModel(**response)
@@ -1,8 +1,12 @@
+import json
 from fastapi import APIRouter, File, Form, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import List
-from app.api.models.request_models import MRRequestModel
-from app.api.models.response_models import MRResponseModel
+from app.api.models.request_models import MRRequestModel, MRUpdateRequestModel, MRBatchRequestModel
+from app.api.models.response_models import MRResponseModel, MRUpdateResponseModel
 from app.services.medical_record import medical_record_service
+from app.core.tracing import span
+from app.core.config import BATCH_MAX_CONCURRENCY, BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_ITEMS
 
 router = APIRouter()
 
@@ -18,7 +22,7 @@ async def t2mr_endpoint(request_model: MRRequestModel) -> MRResponseModel:
     - **is_json**: Whether the result in the json or text with markdown formats.
     - **language**: The language for the response (default: zh).
 
-    Returns the medical records in json or text in markdown.
+    Returns the medical records in json or text in markdown, and the **record_id** they are stored under.
     """
     response = await medical_record_service.generate_medical_record(
         transcript=request_model.transcript,
@@ -26,8 +30,99 @@ async def t2mr_endpoint(request_model: MRRequestModel) -> MRResponseModel:
         language=request_model.language,
         is_json=request_model.is_json
     )
+    response["record_id"] = await medical_record_service.save_record(
+        response["content"], request_model.language, request_model.is_json
+    )
     return MRResponseModel(**response)
 
+@router.post("/t2mr/batch")
+async def t2mr_batch_endpoint(request_model: MRBatchRequestModel) -> StreamingResponse:
+    """
+    Transcripts to Medical Records in bulk.
+
+    This endpoint converts many transcripts in one call, scheduling them against the LLM with bounded concurrency.
+    
+    - **items**: The /t2mr requests to process.
+    - **concurrency**: How many items to process at once (default: BATCH_DEFAULT_CONCURRENCY, capped at BATCH_MAX_CONCURRENCY).
+
+    Returns NDJSON, one line per item in completion order. Each line has the item **index** and either
+    **status** "ok" with the **result**, including the **record_id** it is stored under, or **status** "error"
+    with the **status_code** and **error** of that item.
+    """
+    if len(request_model.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request_model.items)} items, maximum is {BATCH_MAX_ITEMS}"
+        )
+
+    concurrency = min(request_model.concurrency or BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    items = [
+        {
+            "transcript": item.transcript,
+            "medical_records": item.medical_records,
+            "language": item.language,
+            "is_json": item.is_json,
+            "endpoint": "/t2mr/batch"
+        }
+        for item in request_model.items
+    ]
+
+    async def stream_results():
+        async for index, result, error in medical_record_service.generate_medical_records_batch(items, concurrency):
+            if error is None:
+                result["record_id"] = await medical_record_service.save_record(
+                    result["content"], items[index]["language"], items[index]["is_json"]
+                )
+                line = {"index": index, "status": "ok", "result": MRResponseModel(**result).model_dump()}
+            else:
+                line = {
+                    "index": index,
+                    "status": "error",
+                    "status_code": getattr(error, "status_code", 500),
+                    "error": getattr(error, "detail", None) or str(error)
+                }
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@router.post("/t2mr/update", response_model=MRUpdateResponseModel)
+async def t2mr_update_endpoint(request_model: MRUpdateRequestModel) -> MRUpdateResponseModel:
+    """
+    Incrementally update a Medical Record from an appended transcript.
+
+    Use this endpoint when a consultation continues: instead of re-sending the whole transcript to /t2mr,
+    send the record generated so far, or its record_id, and only the new part of the transcript.
+    
+    - **existing_record**: The medical record generated so far, in json or text with markdown formats.
+                           Optional with record_id, whose stored record is used instead.
+    - **transcript_delta**: The part of the transcript appended since the record was generated.
+    - **medical_records**: Additional medical data to be applied, regarding the medical record of the patient.
+    - **is_json**: Whether the result in the json or text with markdown formats.
+    - **language**: The language for the response (default: zh).
+    - **record_id**: Optional id of the stored record, which is replaced by the updated one.
+
+    Returns the merged medical record with a changed/unchanged marker per section.
+    """
+    existing_record = request_model.existing_record
+    if request_model.record_id:
+        # Loaded before the LLM call, so an unknown id is answered with 404 without spending tokens
+        stored = await medical_record_service.load_record(request_model.record_id)
+        existing_record = existing_record or stored
+    if existing_record is None:
+        raise HTTPException(status_code=422, detail="existing_record or record_id is required")
+
+    response = await medical_record_service.update_medical_record(
+        existing_record=existing_record,
+        transcript_delta=request_model.transcript_delta,
+        medical_records=request_model.medical_records,
+        language=request_model.language,
+        is_json=request_model.is_json
+    )
+    if request_model.record_id:
+        await medical_record_service.update_record(request_model.record_id, response["content"], request_model.is_json)
+        response["record_id"] = request_model.record_id
+    return MRUpdateResponseModel(**response)
+
 @router.post("/a2mr", response_model=MRResponseModel)
 async def a2mr_endpoint(
     files: List[UploadFile] = File(...),
@@ -46,14 +141,15 @@ async def a2mr_endpoint(
     - **is_json**: Whether the result in the json or text with markdown formats.
     - **language**: The language for the response (default: zh).
 
-    Returns the medical records in json or text in markdown.
+    Returns the medical records in json or text in markdown, and the **record_id** they are stored under.
     """
     voice_files = []
     voice_content_types = []
     image_files = []
     
     for file in files:
-        content = await file.read()
+        with span("upload_read", content_type=file.content_type):
+            content = await file.read()
         if file.content_type.startswith('audio/') or file.content_type.startswith('video/'):
             voice_files.append(content)
             voice_content_types.append(file.content_type)
@@ -61,9 +157,12 @@ async def a2mr_endpoint(
             image_files.append(content)
 
     transcripts = []
+    tokens_saved = 0
     if voice_files:
         try:
-            voice_transcript = await medical_record_service.process_voice_files(voice_files, voice_content_types, language)
+            voice_transcript, tokens_saved = await medical_record_service.process_voice_files(
+                voice_files, voice_content_types, language
+            )
             transcripts.append(voice_transcript)
         except RuntimeError as e:
             raise HTTPException(
@@ -91,7 +190,10 @@ async def a2mr_endpoint(
     response = await medical_record_service.generate_medical_record(
         transcript="\n".join(transcripts),
         language=language,
-        is_json=is_json
+        is_json=is_json,
+        endpoint="/a2mr"
     )
+    response["tokens_saved"] = tokens_saved
+    response["record_id"] = await medical_record_service.save_record(response["content"], language, is_json)
     
     return MRResponseModel(**response)
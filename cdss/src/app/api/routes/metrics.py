@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.core.metrics import registry, CONTENT_TYPE
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """
+    Prometheus metrics of every pre-fork worker, or of this process when not pre-forked.
+
+    Latency histograms per endpoint, ASR real-time factor, OCR time per image,
+    LLM total time and time-to-first-token, LLM token counters per model and
+    language, and primary vs fallback usage.
+    """
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
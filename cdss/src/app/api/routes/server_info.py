@@ -1,20 +1,79 @@
-from fastapi import APIRouter
 import os
+from fastapi import APIRouter
+from app.api.models.response_models import ServerInfoModel
+from app.core.config import (
+    APP_VERSION, LIGHT_MODE, HAS_ASR, HAS_OCR, INFERENCE_SOCKET, TRANSCRIPT_NORMALIZATION
+)
+from app.core.exceptions import InferenceServiceError
+from app.core.serving import worker_counts
+from app.core.stats import all_cache_stats, process_memory, request_counter
+from app.services.warmup import loaded_models
+from app.services.llm import llm_service
+from app.services.medical_record import medical_record_service
 
 router = APIRouter()
 
-@router.get("/server-info")
-async def get_server_info():
+@router.get("/server-info", response_model=ServerInfoModel)
+async def get_server_info() -> ServerInfoModel:
     """
-    Get server configuration information.
+    Get server configuration and runtime information.
+
+    Load balancers and dashboards use this to make routing decisions. All values
+    are for the worker process that answered, except `workers` and, with an
+    inference server, `models` and the `inference_*` queues. The LLM warm pool
+    runs in worker 0 only, so `llm.warm_pool` is live there.
     
     Returns:
-        dict: Server information including:
-            - light_mode (bool): True if server is running in lightweight mode
+        - **light_mode**: True if ASR/OCR are unavailable to this server
+        - **features**: Which optional capabilities are enabled
+        - **version**: The application version
+        - **models**: Loaded ASR/OCR models per language
+        - **process**: pid, worker id, resident memory and in-flight HTTP requests
+        - **workers**: Configured and active worker processes
+        - **queues**: Queue depth per backend
+        - **llm**: Health, load and latency percentiles of each LLM backend
+        - **caches**: Hit rate of each cache
     """
-    # Check if LIGHT_MODE environment variable is set to "true"
-    light_mode = os.getenv("LIGHT_MODE", "false").lower() == "true"
-    
-    return {
-        "light_mode": light_mode
+    queues = {
+        f"llm_{backend}": stats.in_flight for backend, stats in llm_service.backend_stats.items()
     }
+    queues["batch"] = medical_record_service.batch_in_flight
+
+    models = loaded_models()
+    inference_available = False
+    if INFERENCE_SOCKET:
+        from app.services.inference_client import inference_client
+        queues["inference_client"] = inference_client.in_flight
+        try:
+            server_state = await inference_client.ping()
+            inference_available = True
+            models = server_state["models"]
+            queues.update({f"inference_{op}": depth for op, depth in server_state["queues"].items()})
+        except InferenceServiceError:
+            pass  # down, or hung past INFERENCE_PING_TIMEOUT_S: reported as unavailable
+
+    asr_available = inference_available or HAS_ASR
+    ocr_available = inference_available or HAS_OCR
+
+    return ServerInfoModel(
+        light_mode=LIGHT_MODE and not inference_available,
+        features={
+            "asr": asr_available,
+            "ocr": ocr_available,
+            "inference_server": inference_available,
+            "transcript_normalization": TRANSCRIPT_NORMALIZATION
+        },
+        version=APP_VERSION,
+        models=models,
+        process={
+            "pid": os.getpid(),
+            "worker_id": os.environ.get("CDSS_WORKER_ID", "0"),
+            "active_requests": request_counter.active,
+            "total_requests": request_counter.total,
+            **process_memory()
+        },
+        workers=worker_counts(),
+        queues=queues,
+        llm=llm_service.status(),
+        caches=all_cache_stats()
+    )
@@ -0,0 +1,205 @@
+"""
+Offline batch processing of recording and scanned-note archives into medical records
+"""
+
+import asyncio
+import json
+import mimetypes
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Set, Tuple
+
+TEXT_EXTENSIONS = {".txt", ".md"}
+# The content types /a2mr accepts (SUPPORTED_AUDIO_TYPES); mimetypes guesses e.g. audio/x-wav for .wav
+AUDIO_CONTENT_TYPES = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/m4a",
+    ".mov": "video/quicktime",
+    ".mp4": "video/mp4"
+}
+
+def _content_type(path: str) -> Optional[str]:
+    extension = os.path.splitext(path)[1].lower()
+    return AUDIO_CONTENT_TYPES.get(extension) or mimetypes.guess_type(path)[0]
+
+def _media_kind(path: str) -> Optional[str]:
+    """Classify a file as 'voice', 'image' or 'text', or None when it is not an input"""
+    if os.path.splitext(path)[1].lower() in TEXT_EXTENSIONS:
+        return "text"
+    content_type = _content_type(path)
+    if not content_type:
+        return None
+    if content_type.startswith(("audio/", "video/")):
+        return "voice"
+    if content_type.startswith("image/"):
+        return "image"
+    return None
+
+def collect_jobs(input_dir: str, per_directory: bool = False) -> List[Tuple[str, List[str]]]:
+    """
+    Walk input_dir and group its media files into jobs.
+
+    Args:
+        input_dir: Root of the archive
+        per_directory: Treat all files of one directory as a single consultation,
+            like a multi-file /a2mr upload, instead of one record per file
+
+    Returns:
+        Sorted list of (job key, file paths); the key is relative to input_dir
+    """
+    jobs: Dict[str, List[str]] = {}
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if _media_kind(path) is None:
+                continue
+            key = os.path.relpath(root if per_directory else path, input_dir)
+            jobs.setdefault(key, []).append(path)
+    return sorted(jobs.items())
+
+def fingerprint(paths: List[str]) -> str:
+    """Cheap change detector for a job's inputs: size and mtime of every file"""
+    parts = []
+    for path in paths:
+        stat = os.stat(path)
+        parts.append(f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}")
+    return "|".join(parts)
+
+def load_checkpoint(checkpoint_path: str) -> Set[Tuple[str, str]]:
+    """Load the (job key, fingerprint) pairs of jobs that already finished"""
+    done = set()
+    if not os.path.exists(checkpoint_path):
+        return done
+    with open(checkpoint_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written last line of an interrupted run
+            done.add((entry["key"], entry["fingerprint"]))
+    return done
+
+def _init_worker(languages: List[str], warm_up: bool):
+    """Process pool initializer: load the models once so every job in this worker reuses them"""
+    if warm_up:
+        from app.services.warmup import warm_up_models
+        warm_up_models(languages)
+
+async def _process_job(paths: List[str], language: str, is_json: bool) -> Dict:
+    from app.services.medical_record import medical_record_service
+
+    voice_files, voice_content_types, image_files, texts = [], [], [], []
+    for path in paths:
+        kind = _media_kind(path)
+        if kind == "text":
+            with open(path, encoding="utf-8") as f:
+                texts.append(f.read())
+            continue
+        with open(path, "rb") as f:
+            content = f.read()
+        if kind == "voice":
+            voice_files.append(content)
+            voice_content_types.append(_content_type(path))
+        else:
+            image_files.append(content)
+
+    transcripts = []
+    tokens_saved = 0
+    if voice_files:
+        voice_transcript, tokens_saved = await medical_record_service.process_voice_files(
+            voice_files, voice_content_types, language
+        )
+        transcripts.append(voice_transcript)
+    if image_files:
+        transcripts.append(await medical_record_service.process_image_files(image_files, language))
+    transcripts.extend(texts)
+
+    result = await medical_record_service.generate_medical_record(
+        transcript="\n".join(transcripts),
+        language=language,
+        is_json=is_json
+    )
+    result["tokens_saved"] = tokens_saved
+    return result
+
+def run_job(key: str, paths: List[str], language: str, is_json: bool) -> Dict:
+    """Run the ASR/OCR/LLM pipeline for one job inside a worker process"""
+    started = time.time()
+    entry = {"key": key, "files": [os.path.basename(p) for p in paths], "language": language}
+    try:
+        entry.update(asyncio.run(_process_job(paths, language, is_json)))
+        entry["status"] = "ok"
+    except Exception as e:
+        entry["status"] = "error"
+        entry["error"] = getattr(e, "detail", None) or str(e)
+    entry["elapsed_s"] = round(time.time() - started, 3)
+    return entry
+
+def run_batch(
+    input_dir: str,
+    output_path: str,
+    workers: int = 2,
+    language: str = "zh",
+    is_json: bool = True,
+    per_directory: bool = False,
+    checkpoint_path: Optional[str] = None,
+    warm_up: bool = True
+) -> Dict[str, int]:
+    """
+    Process an archive directory into a JSONL file of medical records.
+
+    Finished jobs are appended to a checkpoint file, so re-running the same command
+    after an interruption skips them. A job whose files changed since it finished is
+    processed again. Failed jobs are not checkpointed and are retried on the next run.
+
+    Returns:
+        Counts of processed, skipped and failed jobs
+    """
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+    done = load_checkpoint(checkpoint_path)
+
+    pending = []
+    skipped = 0
+    for key, paths in collect_jobs(input_dir, per_directory):
+        fp = fingerprint(paths)
+        if (key, fp) in done:
+            skipped += 1
+        else:
+            pending.append((key, paths, fp))
+
+    stats = {"processed": 0, "skipped": skipped, "failed": 0}
+    if not pending:
+        return stats
+
+    # spawn rather than fork: torch and paddle thread pools do not survive fork reliably
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=([language], warm_up)
+    ) as pool, open(output_path, "a", encoding="utf-8") as output, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        futures = {
+            pool.submit(run_job, key, paths, language, is_json): (key, fp)
+            for key, paths, fp in pending
+        }
+        for future in as_completed(futures):
+            key, fp = futures[future]
+            entry = future.result()
+            output.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            output.flush()
+            if entry["status"] == "ok":
+                # Only checkpoint once the result is safely on disk
+                os.fsync(output.fileno())
+                checkpoint.write(json.dumps({"key": key, "fingerprint": fp}, ensure_ascii=False) + "\n")
+                checkpoint.flush()
+                stats["processed"] += 1
+            else:
+                stats["failed"] += 1
+            print(f"[{entry['status']}] {key} ({entry['elapsed_s']}s)")
+
+    return stats
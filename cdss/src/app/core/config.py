@@ -1,4 +1,5 @@
 import os
+from importlib.util import find_spec
 from dotenv import load_dotenv
 
 # Load environment variables from app/.env
@@ -11,14 +12,36 @@ LLM_MODEL_NAME = os.environ.get("LLM_MODEL_NAME", "gemma3:1b")
 FALLBACK_LLM_API_URL = os.environ.get("FALLBACK_LLM_API_URL", "http://localhost:11434/v1")
 FALLBACK_LLM_API_KEY = os.environ.get("FALLBACK_LLM_API_KEY", "not used")
 FALLBACK_MODEL_NAME = os.environ.get("FALLBACK_MODEL_NAME", "qwen2.5:0.5b")
-LIGHT_MODE = os.environ.get("LIGHT_MODE", "True")
-HAS_ASR = os.environ.get("asr", "False")
-HAS_OCR = os.environ.get("ocr", "False")
+# Pools of OpenAI-compatible endpoints per tier (comma separated), sharing the tier's key and model
+LLM_API_URLS = [url.strip() for url in os.environ.get("LLM_API_URLS", LLM_API_URL).split(",") if url.strip()]
+FALLBACK_LLM_API_URLS = [
+    url.strip() for url in os.environ.get("FALLBACK_LLM_API_URLS", FALLBACK_LLM_API_URL).split(",") if url.strip()
+]
+# Passive health checks: eject an endpoint after this many consecutive failures, for LLM_EJECT_S (doubling)
+LLM_EJECT_AFTER_FAILURES = int(os.environ.get("LLM_EJECT_AFTER_FAILURES", "3"))
+LLM_EJECT_S = float(os.environ.get("LLM_EJECT_S", "30"))
+# Sessions stick to their endpoint unless it has this many more requests in flight than the least loaded one
+LLM_STICKY_MAX_EXTRA = int(os.environ.get("LLM_STICKY_MAX_EXTRA", "4"))
+# Prompt prefixes each endpoint is assumed to keep cached (Ollama/llama.cpp keep one per slot), for hit-rate metrics
+LLM_PREFIX_CACHE_SLOTS = int(os.environ.get("LLM_PREFIX_CACHE_SLOTS", "4"))
+# Identical concurrent LLM/ASR/OCR calls share one computation instead of each running their own
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT_ENABLED", "True").lower() == "true"
+# Stream LLM completions internally, which makes time-to-first-token measurable in /metrics
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "False").lower() == "true"
 APP_VERSION = "1.0.0"
 
 # Constants
 KV_LIMIT = 256
 
+# Strip fillers, repeats and overlapping segments from ASR transcripts before prompting.
+# Never applied to OCR text or typed transcripts. Off by default: it rewrites the transcript.
+TRANSCRIPT_NORMALIZATION = os.environ.get("TRANSCRIPT_NORMALIZATION", "False").lower() == "true"
+
+# Batch processing
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_DEFAULT_CONCURRENCY = int(os.environ.get("BATCH_DEFAULT_CONCURRENCY", "2"))
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "1000"))
+
 # Supported Media Types
 SUPPORTED_AUDIO_TYPES = [
     "audio/mpeg", 
@@ -94,14 +117,134 @@ EXTERNAL_SERVICES = {
     }
 }
 
-# Light mode detection
-try:
-    import app.services.asr
-    import app.services.ocr
-    HAS_ASR = True
-    HAS_OCR = True
-except ImportError:
-    HAS_ASR = False
-    HAS_OCR = False
+# Light mode detection.
+# Only look the packages up: importing them pulls in torch/paddle and costs seconds
+# on every worker start. The models themselves load on first use or during warm-up.
+def _has_packages(*names: str) -> bool:
+    try:
+        return all(find_spec(name) is not None for name in names)
+    except (ImportError, ValueError):
+        return False
+
+HAS_ASR = _has_packages("torch", "funasr")
+HAS_OCR = _has_packages("paddleocr")
 
 LIGHT_MODE = not (HAS_ASR and HAS_OCR)
+
+# Load the ASR/OCR models at startup instead of on the first request
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "False").lower() == "true"
+WARMUP_LANGUAGES = [lang.strip() for lang in os.environ.get("WARMUP_LANGUAGES", "zh").split(",") if lang.strip()]
+
+# Keep the Ollama models of both LLM tiers loaded: preload them at startup and,
+# during LLM_WARM_HOURS on LLM_WARM_WEEKDAYS (ISO, Monday = 1), refresh their
+# keep-alive every LLM_KEEP_ALIVE_INTERVAL_S. Non-Ollama endpoints are skipped.
+LLM_WARM_POOL_ENABLED = os.environ.get("LLM_WARM_POOL_ENABLED", "False").lower() == "true"
+LLM_KEEP_ALIVE = os.environ.get("LLM_KEEP_ALIVE", "30m")
+LLM_KEEP_ALIVE_INTERVAL_S = float(os.environ.get("LLM_KEEP_ALIVE_INTERVAL_S", "240"))
+LLM_WARM_HOURS = os.environ.get("LLM_WARM_HOURS", "07:00-20:00")  # empty: always
+LLM_WARM_WEEKDAYS = [int(day) for day in os.environ.get("LLM_WARM_WEEKDAYS", "1,2,3,4,5,6,7").split(",") if day.strip()]
+
+# Retrieval over a folder of clinical guideline documents (.txt/.md) for doctor
+# queries; enabled when RETRIEVAL_DOCS_DIR is set and numpy is installed.
+# Embeds with sentence-transformers if installed, otherwise with feature hashing;
+# uses a faiss HNSW index once the corpus has RETRIEVAL_ANN_MIN_ROWS chunks.
+RETRIEVAL_DOCS_DIR = os.environ.get("RETRIEVAL_DOCS_DIR", "")
+RETRIEVAL_INDEX_DIR = os.environ.get("RETRIEVAL_INDEX_DIR", "retrieval_index")
+RETRIEVAL_EMBEDDING_MODEL = os.environ.get(
+    "RETRIEVAL_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+)
+RETRIEVAL_CHUNK_CHARS = int(os.environ.get("RETRIEVAL_CHUNK_CHARS", "600"))
+RETRIEVAL_CHUNK_OVERLAP = int(os.environ.get("RETRIEVAL_CHUNK_OVERLAP", "100"))
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_MIN_SCORE = float(os.environ.get("RETRIEVAL_MIN_SCORE", "0.2"))
+RETRIEVAL_MAX_CHARS = int(os.environ.get("RETRIEVAL_MAX_CHARS", "2400"))  # retrieved text put in the prompt
+RETRIEVAL_ANN_MIN_ROWS = int(os.environ.get("RETRIEVAL_ANN_MIN_ROWS", "20000"))
+RETRIEVAL_ENABLED = bool(RETRIEVAL_DOCS_DIR) and _has_packages("numpy")
+
+# Semantic cache of /query answers for the listed roles, per language and role.
+# Questions carrying medical records or history never use it. Needs numpy and a
+# sentence-transformers embedding model; off by default, as a wrong hit serves another question's answer.
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "False").lower() == "true" and _has_packages("numpy")
+SEMANTIC_CACHE_ROLES = [role.strip() for role in os.environ.get("SEMANTIC_CACHE_ROLES", "patient").split(",") if role.strip()]
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # cosine similarity
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "1024"))  # answers per language and role
+SEMANTIC_CACHE_TTL_S = float(os.environ.get("SEMANTIC_CACHE_TTL_S", "86400"))
+
+# Map-reduce condensation of long medical_records: records above CONDENSE_MIN_TOKENS
+# (estimated) are cut into CONDENSE_CHUNK_TOKENS parts, summarised in parallel and,
+# if the summaries are still above CONDENSE_MIN_TOKENS, merged. Results are cached by record hash.
+# Off by default: it is lossy rewriting of clinical data.
+CONDENSE_ENABLED = os.environ.get("CONDENSE_ENABLED", "False").lower() == "true"
+CONDENSE_MIN_TOKENS = int(os.environ.get("CONDENSE_MIN_TOKENS", "3000"))
+CONDENSE_CHUNK_TOKENS = int(os.environ.get("CONDENSE_CHUNK_TOKENS", "2000"))
+CONDENSE_MAX_CONCURRENCY = int(os.environ.get("CONDENSE_MAX_CONCURRENCY", "4"))  # chunk summaries in flight per record
+CONDENSE_CACHE_SIZE = int(os.environ.get("CONDENSE_CACHE_SIZE", "256"))  # condensed records kept per worker
+
+# SQLite store of generated medical records, so /query and /mr2nl can reference them by record_id
+RECORD_STORE_PATH = os.environ.get("RECORD_STORE_PATH", "records.db")
+RECORD_CONTEXT_CACHE_SIZE = int(os.environ.get("RECORD_CONTEXT_CACHE_SIZE", "256"))  # prepared records per worker
+
+# JSON medical records are streamed through a schema validator: generation stops as soon
+# as the output goes off-schema, and only the missing sections are asked for again
+STRUCTURED_OUTPUT_ENABLED = os.environ.get("STRUCTURED_OUTPUT_ENABLED", "False").lower() == "true"
+STRUCTURED_MAX_RETRIES = int(os.environ.get("STRUCTURED_MAX_RETRIES", "2"))  # section retries per record
+
+# Out-of-process ASR/OCR inference server. When INFERENCE_SOCKET is set, the API
+# sends ASR/OCR work to the server listening there instead of loading models itself.
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET", "")
+INFERENCE_TIMEOUT_S = float(os.environ.get("INFERENCE_TIMEOUT_S", "120"))
+INFERENCE_PING_TIMEOUT_S = float(os.environ.get("INFERENCE_PING_TIMEOUT_S", "2"))  # /server-info health probe
+INFERENCE_MAX_IN_FLIGHT = int(os.environ.get("INFERENCE_MAX_IN_FLIGHT", "16"))  # per API worker
+INFERENCE_MAX_QUEUE = int(os.environ.get("INFERENCE_MAX_QUEUE", "64"))  # per server and operation
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_BATCH_WINDOW_MS = float(os.environ.get("INFERENCE_BATCH_WINDOW_MS", "20"))
+
+# Budget for `import app` in a light-mode environment, checked by tests/unit/core/test_startup.py
+IMPORT_TIME_BUDGET_S = 2.0
+
+# Per-request tracing. Stage durations are always returned in the Server-Timing
+# header; spans are additionally written as JSONL and/or exported over OTLP/HTTP.
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "True").lower() == "true"
+TRACE_JSONL_PATH = os.environ.get("TRACE_JSONL_PATH", "")
+OTLP_ENDPOINT = os.environ.get("OTLP_ENDPOINT", "")  # e.g. http://localhost:4318/v1/traces
+OTEL_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "cdss")
+
+# On-demand profiling. A request is profiled when it sends `X-Profile: <PROFILING_TOKEN>`
+# or, at random, for PROFILING_SAMPLE_PERCENT of requests.
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "False").lower() == "true"
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_PERCENT = float(os.environ.get("PROFILING_SAMPLE_PERCENT", "0"))
+PROFILING_DIR = os.environ.get("PROFILING_DIR", "profiles")
+PROFILER = os.environ.get("PROFILER", "auto").lower()  # auto (pyinstrument if installed), cprofile
+
+# Request deadlines. Clients may send `X-Request-Timeout: <seconds>` (capped at
+# REQUEST_MAX_TIMEOUT_S); otherwise REQUEST_TIMEOUT_S applies, 0 meaning no deadline.
+REQUEST_TIMEOUT_S = float(os.environ.get("REQUEST_TIMEOUT_S", "0"))
+REQUEST_MAX_TIMEOUT_S = float(os.environ.get("REQUEST_MAX_TIMEOUT_S", "600"))
+# Streaming endpoints that REQUEST_TIMEOUT_S would cut off mid-stream; only an explicit header bounds them
+REQUEST_TIMEOUT_EXEMPT_PATHS = os.environ.get("REQUEST_TIMEOUT_EXEMPT_PATHS", "/t2mr/batch")
+# Only try the fallback LLM when at least this much of the deadline is left
+LLM_MIN_FALLBACK_BUDGET_S = float(os.environ.get("LLM_MIN_FALLBACK_BUDGET_S", "5"))
+
+# Complexity-based model routing among the models of the primary endpoints.
+# LLM_MODEL_TIERS: "model=context tokens,...", fastest first; empty sends everything to LLM_MODEL_NAME.
+# Trivial requests (few prompt tokens, from LLM_ROUTE_FAST_ENDPOINTS in LLM_ROUTE_FAST_LANGUAGES,
+# empty meaning any) go to the fastest model; prompts that overflow a model's window go to a larger one.
+LLM_MODEL_TIERS = os.environ.get("LLM_MODEL_TIERS", "")
+LLM_ROUTE_FAST_MAX_TOKENS = int(os.environ.get("LLM_ROUTE_FAST_MAX_TOKENS", "300"))  # estimated prompt tokens
+LLM_ROUTE_FAST_ENDPOINTS = os.environ.get("LLM_ROUTE_FAST_ENDPOINTS", "/query:patient")
+LLM_ROUTE_FAST_LANGUAGES = os.environ.get("LLM_ROUTE_FAST_LANGUAGES", "")
+LLM_ROUTE_OUTPUT_TOKENS = int(os.environ.get("LLM_ROUTE_OUTPUT_TOKENS", "1024"))  # reserved for the answer
+
+# Load-aware degradation: send requests that allow it to the fallback model while
+# the primary is overloaded. Switches on above either HIGH threshold and back off
+# once below both LOW thresholds.
+DEGRADE_ENABLED = os.environ.get("DEGRADE_ENABLED", "True").lower() == "true"
+DEGRADE_ALLOWED_ENDPOINTS = os.environ.get("DEGRADE_ALLOWED_ENDPOINTS", "/query:patient,/mr2nl:patient")
+DEGRADE_QUEUE_HIGH = int(os.environ.get("DEGRADE_QUEUE_HIGH", "8"))  # primary requests in flight
+DEGRADE_QUEUE_LOW = int(os.environ.get("DEGRADE_QUEUE_LOW", "4"))
+DEGRADE_LATENCY_HIGH_S = float(os.environ.get("DEGRADE_LATENCY_HIGH_S", "30"))  # recent primary p95
+DEGRADE_LATENCY_LOW_S = float(os.environ.get("DEGRADE_LATENCY_LOW_S", "15"))
+DEGRADE_MIN_HOLD_S = float(os.environ.get("DEGRADE_MIN_HOLD_S", "10"))
+# Primary latencies older than this no longer count towards the p95
+DEGRADE_LATENCY_MAX_AGE_S = float(os.environ.get("DEGRADE_LATENCY_MAX_AGE_S", "60"))
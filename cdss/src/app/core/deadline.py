@@ -0,0 +1,166 @@
+"""
+Per-request deadlines and cancellation
+"""
+
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from app.core.config import REQUEST_TIMEOUT_S, REQUEST_MAX_TIMEOUT_S, REQUEST_TIMEOUT_EXEMPT_PATHS
+from app.core.exceptions import DeadlineExceeded
+
+TIMEOUT_HEADER = b"x-request-timeout"
+
+# Absolute deadline on the time.monotonic() clock, or None for no deadline
+_deadline: ContextVar[Optional[float]] = ContextVar("cdss_deadline", default=None)
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current request's deadline, or None without a deadline"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def check_deadline(stage: str):
+    """Raise DeadlineExceeded if the current request has no budget left for stage"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(stage)
+
+def timeout_for(default: Optional[float]) -> Optional[float]:
+    """The smaller of a call's own timeout and the budget left; raises when none is left"""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("call")
+    return left if default is None else min(default, left)
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Run the enclosed code with a deadline seconds from now (None for none)"""
+    token = _deadline.set(None if seconds is None else time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def _requested_timeout(scope, exempt_paths=frozenset()) -> Optional[float]:
+    for key, value in scope.get("headers", []):
+        if key == TIMEOUT_HEADER:
+            try:
+                seconds = float(value.decode("latin-1"))
+            except ValueError:
+                break
+            if seconds > 0:
+                return min(seconds, REQUEST_MAX_TIMEOUT_S)
+            break
+    if scope.get("path") in exempt_paths:
+        return None
+    return REQUEST_TIMEOUT_S or None
+
+def _has_body(scope) -> bool:
+    """Whether the request announces a body (chunked or a non-zero Content-Length)"""
+    for key, value in scope.get("headers", []):
+        if key == b"transfer-encoding":
+            return True
+        if key == b"content-length":
+            return value.strip() != b"0"
+    return False
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware enforcing deadlines and stopping work for disconnected clients.
+
+    The handler reads the request body itself, so large uploads are still
+    streamed (and spooled) as they arrive; a disconnect during the upload
+    reaches it as usual. Once the body has been read, the connection is
+    watched for a disconnect while the handler runs.
+
+    Requests to exempt_paths (streaming endpoints) get no default deadline,
+    only the one a client asks for with X-Request-Timeout.
+    """
+
+    def __init__(self, app, exempt_paths: str = REQUEST_TIMEOUT_EXEMPT_PATHS):
+        self.app = app
+        self.exempt_paths = frozenset(path.strip() for path in exempt_paths.split(",") if path.strip())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timeout = _requested_timeout(scope, self.exempt_paths)
+        has_body = _has_body(scope)
+        disconnected = asyncio.Event()
+        body_read = asyncio.Event()
+        # The empty body of a bodyless request, read by the watcher before the handler asks for it
+        pending = []
+
+        async def lazy_receive():
+            if has_body and not body_read.is_set():
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                elif not message.get("more_body", False):
+                    body_read.set()
+                return message
+            # The watcher owns the connection now; only one task may call receive at a time
+            await body_read.wait()
+            if pending:
+                return pending.pop(0)
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        response_started = False
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        async def watch_disconnect():
+            if has_body:
+                await body_read.wait()
+            else:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                else:
+                    pending.append(message)
+                body_read.set()
+            while not disconnected.is_set():
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+
+        with deadline_scope(timeout):
+            handler = asyncio.create_task(self.app(scope, lazy_receive, tracking_send))
+        watcher = asyncio.create_task(watch_disconnect())
+        disconnect_waiter = asyncio.create_task(disconnected.wait())
+        try:
+            done, _ = await asyncio.wait({handler, disconnect_waiter}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if handler in done:
+                handler.result()  # re-raise errors of the handler
+                return
+            handler.cancel()
+            await asyncio.gather(handler, return_exceptions=True)
+            if disconnect_waiter in done:
+                print(f"Client disconnected, cancelled {scope['method']} {scope['path']}")
+                return
+            print(f"Deadline of {timeout:.1f}s exceeded, cancelled {scope['method']} {scope['path']}")
+            if not response_started:
+                error = DeadlineExceeded(scope["path"])
+                body = json.dumps({"detail": error.detail}).encode("utf-8")
+                await send({
+                    "type": "http.response.start",
+                    "status": error.status_code,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+                })
+                await send({"type": "http.response.body", "body": body})
+        finally:
+            watcher.cancel()
+            disconnect_waiter.cancel()
+            if not handler.done():
+                handler.cancel()
@@ -0,0 +1,91 @@
+"""
+Load-aware degradation of lighter requests to the fallback LLM
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+from app.core.config import (
+    DEGRADE_ENABLED, DEGRADE_ALLOWED_ENDPOINTS, DEGRADE_QUEUE_HIGH, DEGRADE_QUEUE_LOW,
+    DEGRADE_LATENCY_HIGH_S, DEGRADE_LATENCY_LOW_S, DEGRADE_MIN_HOLD_S, DEGRADE_LATENCY_MAX_AGE_S
+)
+from app.core.stats import LatencyWindow
+
+# Recent primary latencies considered; small so the router reacts within seconds
+RECENT_LATENCY_WINDOW = 32
+
+def parse_policy(spec: str) -> Set[Tuple[str, Optional[str]]]:
+    """Parse "endpoint[:role],..." into (endpoint, role or None for any role) pairs"""
+    allowed = set()
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        endpoint, _, role = entry.partition(":")
+        allowed.add((endpoint.strip(), role.strip() or None))
+    return allowed
+
+class DegradationRouter:
+    def __init__(
+        self,
+        enabled: bool = DEGRADE_ENABLED,
+        allowed_endpoints: str = DEGRADE_ALLOWED_ENDPOINTS,
+        queue_high: int = DEGRADE_QUEUE_HIGH,
+        queue_low: int = DEGRADE_QUEUE_LOW,
+        latency_high_s: float = DEGRADE_LATENCY_HIGH_S,
+        latency_low_s: float = DEGRADE_LATENCY_LOW_S,
+        min_hold_s: float = DEGRADE_MIN_HOLD_S,
+        latency_max_age_s: float = DEGRADE_LATENCY_MAX_AGE_S
+    ):
+        self.enabled = enabled
+        self.allowed = parse_policy(allowed_endpoints)
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.latency_high_s = latency_high_s
+        self.latency_low_s = latency_low_s
+        self.min_hold_s = min_hold_s
+        self.degraded = False
+        self.changed_at = 0.0
+        self.degraded_requests = 0
+        self._recent = LatencyWindow(RECENT_LATENCY_WINDOW, latency_max_age_s)
+        self._lock = threading.Lock()
+
+    def allows(self, endpoint: str, role: Optional[str] = None) -> bool:
+        """Whether the policy lets requests to endpoint (by role) be degraded"""
+        return self.enabled and ((endpoint, None) in self.allowed or (endpoint, role) in self.allowed)
+
+    def observe_primary(self, seconds: float):
+        """Record the latency of a completed primary completion"""
+        self._recent.observe(seconds)
+
+    def should_degrade(self, primary_in_flight: int) -> bool:
+        """Update the degradation state from the primary backend's load and return it"""
+        if not self.enabled:
+            return False
+        p95 = self._recent.percentile(95) or 0.0
+        now = time.monotonic()
+        with self._lock:
+            if now - self.changed_at >= self.min_hold_s:
+                if not self.degraded and (primary_in_flight >= self.queue_high or p95 >= self.latency_high_s):
+                    self.degraded, self.changed_at = True, now
+                    print(f"Degrading to the fallback LLM: {primary_in_flight} in flight, p95 {p95:.1f}s")
+                elif self.degraded and primary_in_flight <= self.queue_low and p95 <= self.latency_low_s:
+                    self.degraded, self.changed_at = False, now
+                    print(f"Primary LLM recovered: {primary_in_flight} in flight, p95 {p95:.1f}s")
+            return self.degraded
+
+    def snapshot(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "degraded": self.degraded,
+            "degraded_requests": self.degraded_requests,
+            "recent_p95_s": self._recent.percentile(95),
+            "thresholds": {
+                "queue_high": self.queue_high,
+                "queue_low": self.queue_low,
+                "latency_high_s": self.latency_high_s,
+                "latency_low_s": self.latency_low_s
+            }
+        }
+
+degradation_router = DegradationRouter()
@@ -43,3 +43,28 @@ class UnsupportedLanguage(MedAIException):
             detail=f"Unsupported language: {language}",
             error_key="unsupported_language"
         )
+
+class InferenceServiceError(MedAIException):
+    def __init__(self, detail: str = None, status_code: int = 503, retry_after: Optional[int] = None):
+        super().__init__(
+            status_code=status_code,
+            detail=f"Inference Service Error: {detail}" if detail else "Inference Service Error",
+            headers={"Retry-After": str(retry_after)} if retry_after else None,
+            error_key="inference_service_error"
+        )
+
+class DeadlineExceeded(MedAIException):
+    def __init__(self, stage: str = None):
+        super().__init__(
+            status_code=504,
+            detail=f"Request deadline exceeded during {stage}" if stage else "Request deadline exceeded",
+            error_key="deadline_exceeded"
+        )
+
+class RecordNotFound(MedAIException):
+    def __init__(self, record_id: str):
+        super().__init__(
+            status_code=404,
+            detail=f"Medical record not found: {record_id}",
+            error_key="record_not_found"
+        )
@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 # Supported languages
 SUPPORTED_LANGUAGES = ['en', 'zh', 'es', 'fr', 'th']
@@ -54,6 +54,62 @@ MEDICAL_RECORD_TEMPLATE = {
 """
 }
 
+# Medical record sections, in the order requested by 'mr_format_detail'
+MEDICAL_RECORD_SECTIONS = {
+    'zh': ['主诉', '现病史', '既往史', '过敏史', '家族史', '体格检查', '辅助检查',
+           '诊断', '处置意见', '注意事项', '中医辩证', '中药处方'],
+    'en': ['Chief Complaint', 'Present Illness History', 'Past Medical History', 'Allergies',
+           'Family History', 'Physical Examination', 'Auxiliary Examination', 'Diagnosis',
+           'Treatment Plan', 'Precautions', 'TCM Diagnosis', 'TCM Prescription'],
+    'es': ['Motivo de Consulta', 'Historia de la Enfermedad Actual', 'Antecedentes Médicos',
+           'Alergias', 'Historia Familiar', 'Examen Físico', 'Exámenes Auxiliares', 'Diagnóstico',
+           'Plan de Tratamiento', 'Precauciones', 'Diagnóstico MTC', 'Prescripción MTC'],
+    'fr': ['Motif de Consultation', 'Histoire de la Maladie Actuelle', 'Antécédents Médicaux',
+           'Allergies', 'Histoire Familiale', 'Examen Physique', 'Examens Complémentaires',
+           'Diagnostic', 'Plan de Traitement', 'Précautions', 'Diagnostic MTC', 'Prescription MTC'],
+    'th': ['อาการสำคัญ', 'ประวัติการเจ็บป่วยปัจจุบัน', 'ประวัติการรักษา', 'ประวัติการแพ้',
+           'ประวัติครอบครัว', 'การตรวจร่างกาย', 'การตรวจพิเศษ', 'การวินิจฉัย', 'แผนการรักษา',
+           'ข้อควรระวัง', 'การวินิจฉัยแพทย์แผนจีน', 'การสั่งยาแผนจีน']
+}
+
+# Disfluencies removed from ASR transcripts before prompting.
+# 'fillers' are dropped wherever they stand alone, so they must never be words or
+# abbreviations in their own right (no "mm", "er": units and receptor status).
+# 'pause_fillers' carry meaning in other positions ("slept well", "le moral est bon"),
+# so they are only dropped at the start of an utterance and followed by a comma.
+DISFLUENCIES = {
+    'zh': {
+        'fillers': ['嗯嗯', '嗯', '呃', '额', '唔', '哦哦'],
+        'pause_fillers': ['那个', '就是说', '就是', '然后呢', '这个']
+    },
+    'en': {
+        'fillers': ['um', 'umm', 'uh', 'uhh', 'erm', 'hmm'],
+        'pause_fillers': ['you know', 'i mean', 'like', 'well', 'so', 'okay so']
+    },
+    'es': {
+        'fillers': ['eh', 'em', 'emm', 'mmm'],
+        'pause_fillers': ['este', 'o sea', 'pues', 'bueno', 'a ver']
+    },
+    'fr': {
+        'fillers': ['euh', 'heu', 'hum', 'bah'],
+        'pause_fillers': ['ben', 'bon', 'genre', 'tu vois', 'en fait', 'quoi']
+    },
+    'th': {
+        'fillers': ['เอ่อ', 'อ่า', 'อืม', 'เออ'],
+        'pause_fillers': []
+    }
+}
+
+# Negation and stop words: two questions differing in these ("Can I eat..." vs
+# "Can I not eat...", "stop taking" vs "keep taking") never share a cached answer
+NEGATIONS = {
+    'zh': ['不', '没', '别', '勿', '无', '未', '非', '停', '禁'],
+    'en': ['no', 'not', "n't", 'never', 'without', 'none', 'nor', 'stop', 'avoid'],
+    'es': ['no', 'nunca', 'sin', 'ni', 'ningún', 'ninguna', 'dejar', 'deje', 'evitar'],
+    'fr': ['ne', "n'", 'pas', 'jamais', 'sans', 'aucun', 'aucune', 'arrêter', 'éviter'],
+    'th': ['ไม่', 'อย่า', 'ห้าม', 'หยุด', 'งด', 'ไม่มี']
+}
+
 # Language-specific LLM prompts
 LLM_PROMPTS = {
     'zh': {
@@ -107,7 +163,18 @@ LLM_PROMPTS = {
 答案是针对患者的，所以请使用可以被可能没有广泛医学知识的人理解的词语。
 请使用友善和鼓励的语气。
 请尽量简洁地用不超过20句话回答，并突出显示一两个要点。
-如有必要，请先询问患者的具体情况。"""
+如有必要，请先询问患者的具体情况。""",
+        'mr_update': "以下是一份已有的病历记录（JSON格式，键为病历各部分）以及本次问诊新增的对话内容。请根据新增内容更新病历：",
+        'mr_update_detail': """要求：
+- 只返回因新增内容而需要修改的部分，不需要修改的部分不要返回
+- 返回JSON对象，键为病历部分名称（与已有病历的键一致），值为该部分更新后的完整内容
+- 如果新增内容不需要修改任何部分，请返回 {}
+- 请不要遗漏任何检查数据
+- 请不要提及任何个人身份信息""",
+        'mr_condense': "以下是一位患者病历的一部分。请将其压缩为简明的临床摘要，保留所有诊断、手术、用药及剂量、过敏、检查结果（含数值和日期）以及治疗反应，省略重复内容和格式文字。只输出摘要：",
+        'mr_condense_merge': "以下是同一位患者病历各部分的摘要，按时间顺序排列。请将它们合并为一份简明的病史摘要，去除重复，保留所有诊断、用药及剂量、过敏、关键检查结果（含数值和日期）。只输出摘要：",
+        'mr_json_format': "只输出一个JSON对象，不要输出其他任何内容。它的键必须恰好是以下病历部分，并按此顺序排列：{sections}。每个值是该部分内容的字符串；如果没有相关信息，请写\"无\"。",
+        'mr_json_retry': "只输出一个JSON对象，只包含以下病历部分：{sections}。每个值是该部分内容的字符串；如果没有相关信息，请写\"无\"。"
     },
     'en': {
         'doctor_context': "You are an intelligent medical assistant in a hospital. You communicate in English and are an expert in oncology.",
@@ -160,7 +227,18 @@ Even plan titles should be specific. Avoid general terms like systematic, compre
 The answer should use words understandable to someone without extensive medical knowledge.
 Please use a kind and encouraging tone.
 Try to answer concisely in less than 20 sentences with one or two key points highlighted.
-If necessary, please first ask questions about the patient's specific conditions."""
+If necessary, please first ask questions about the patient's specific conditions.""",
+        'mr_update': "Below is an existing medical record (in JSON, keyed by record section) and the new part of the consultation transcript. Please update the medical record based on the new content:",
+        'mr_update_detail': """Requirements:
+- Return only the sections that must change because of the new content; do not return unchanged sections
+- Return a JSON object whose keys are section names (matching the keys of the existing record) and whose values are the complete updated content of that section
+- If the new content does not change any section, return {}
+- Please do not miss any examination data
+- Please do not mention any personal identity information""",
+        'mr_condense': "Below is part of a patient's medical records. Condense it into a concise clinical summary. Keep every diagnosis, procedure, medication with dose, allergy, test result (with values and dates) and treatment response; drop repetition and boilerplate. Output only the summary:",
+        'mr_condense_merge': "Below are summaries of consecutive parts of one patient's medical records. Merge them into one concise history, removing duplicates and keeping every diagnosis, medication with dose, allergy and key test result (with values and dates). Output only the summary:",
+        'mr_json_format': "Output only one JSON object and nothing else. Its keys must be exactly these medical record sections, in this order: {sections}. Each value is the content of that section as a string; write \"None\" if there is no information.",
+        'mr_json_retry': "Output only one JSON object, for just these medical record sections: {sections}. Each value is the content of that section as a string; write \"None\" if there is no information."
     },
     'es': {
         'doctor_context': "Eres un asistente médico inteligente en un hospital. Te comunicas en español y eres experto en oncología.",
@@ -184,7 +262,18 @@ Incluso los títulos del plan deben ser específicos. Evita términos generales
 La respuesta debe usar palabras comprensibles para alguien sin conocimientos médicos extensos.
 Por favor, usa un tono amable y alentador.
 Intenta responder de manera concisa en menos de 20 oraciones con uno o dos puntos clave resaltados.
-Si es necesario, primero haz preguntas sobre las condiciones específicas del paciente."""
+Si es necesario, primero haz preguntas sobre las condiciones específicas del paciente.""",
+        'mr_update': "A continuación se muestra un registro médico existente (en JSON, con una clave por sección) y la parte nueva de la transcripción de la consulta. Por favor, actualiza el registro médico según el contenido nuevo:",
+        'mr_update_detail': """Requisitos:
+- Devuelve solo las secciones que deben cambiar por el contenido nuevo; no devuelvas las secciones sin cambios
+- Devuelve un objeto JSON cuyas claves son los nombres de las secciones (iguales a las claves del registro existente) y cuyos valores son el contenido completo actualizado de esa sección
+- Si el contenido nuevo no cambia ninguna sección, devuelve {}
+- No omitas ningún dato de exámenes.
+- No menciones información de identidad personal.""",
+        'mr_condense': "A continuación se muestra una parte del historial médico de un paciente. Resúmela en un resumen clínico conciso. Conserva todos los diagnósticos, procedimientos, medicamentos con dosis, alergias, resultados de pruebas (con valores y fechas) y respuestas al tratamiento; omite repeticiones y texto de formato. Escribe solo el resumen:",
+        'mr_condense_merge': "A continuación se muestran resúmenes de partes consecutivas del historial médico de un paciente. Combínalos en un único historial conciso, eliminando duplicados y conservando todos los diagnósticos, medicamentos con dosis, alergias y resultados clave (con valores y fechas). Escribe solo el resumen:",
+        'mr_json_format': "Escribe solo un objeto JSON y nada más. Sus claves deben ser exactamente estas secciones del registro médico, en este orden: {sections}. Cada valor es el contenido de esa sección como texto; escribe \"Ninguno\" si no hay información.",
+        'mr_json_retry': "Escribe solo un objeto JSON, únicamente con estas secciones del registro médico: {sections}. Cada valor es el contenido de esa sección como texto; escribe \"Ninguno\" si no hay información."
     },
     'fr': {
         'doctor_context': "Vous êtes un assistant médical intelligent dans un hôpital. Vous communiquez en français et êtes expert en oncologie.",
@@ -208,7 +297,18 @@ Même les titres du plan doivent être spécifiques. Évitez les termes généra
 La réponse doit utiliser des mots compréhensibles pour quelqu'un sans connaissances médicales approfondies.
 Veuillez utiliser un ton bienveillant et encourageant.
 Essayez de répondre de manière concise en moins de 20 phrases avec un ou deux points clés mis en évidence.
-Si nécessaire, posez d'abord des questions sur les conditions spécifiques du patient."""
+Si nécessaire, posez d'abord des questions sur les conditions spécifiques du patient.""",
+        'mr_update': "Voici un dossier médical existant (en JSON, une clé par section) et la nouvelle partie de la transcription de la consultation. Veuillez mettre à jour le dossier médical en fonction du nouveau contenu :",
+        'mr_update_detail': """Exigences :
+- Ne renvoyez que les sections qui doivent changer à cause du nouveau contenu ; ne renvoyez pas les sections inchangées
+- Renvoyez un objet JSON dont les clés sont les noms des sections (identiques aux clés du dossier existant) et dont les valeurs sont le contenu complet mis à jour de cette section
+- Si le nouveau contenu ne change aucune section, renvoyez {}
+- Ne manquez aucune donnée d'examen.
+- Ne mentionnez aucune information d'identité personnelle.""",
+        'mr_condense': "Voici une partie du dossier médical d'un patient. Condensez-la en un résumé clinique concis. Conservez chaque diagnostic, intervention, médicament avec sa posologie, allergie, résultat d'examen (avec valeurs et dates) et réponse au traitement ; supprimez les répétitions et le texte de mise en forme. Écrivez uniquement le résumé :",
+        'mr_condense_merge': "Voici les résumés de parties consécutives du dossier médical d'un patient. Fusionnez-les en un seul historique concis, en supprimant les doublons et en conservant chaque diagnostic, médicament avec sa posologie, allergie et résultat d'examen clé (avec valeurs et dates). Écrivez uniquement le résumé :",
+        'mr_json_format': "Écrivez uniquement un objet JSON et rien d'autre. Ses clés doivent être exactement ces sections du dossier médical, dans cet ordre : {sections}. Chaque valeur est le contenu de la section sous forme de texte ; écrivez \"Aucun\" s'il n'y a pas d'information.",
+        'mr_json_retry': "Écrivez uniquement un objet JSON, seulement pour ces sections du dossier médical : {sections}. Chaque valeur est le contenu de la section sous forme de texte ; écrivez \"Aucun\" s'il n'y a pas d'information."
     },
     'th': {
         'doctor_context': "คุณเป็นผู้ช่วยแพทย์อัจฉริยะในโรงพยาบาล คุณสื่อสารเป็นภาษาไทยและเป็นผู้เชี่ยวชาญด้านมะเร็งวิทยา",
@@ -232,7 +332,18 @@ Si nécessaire, posez d'abord des questions sur les conditions spécifiques du p
 คำตอบควรใช้คำที่เข้าใจได้สำหรับผู้ที่ไม่มีความรู้ทางการแพทย์มากนัก
 กรุณาใช้น้ำเสียงที่เป็นมิตรและให้กำลังใจ
 พยายามตอบอย่างกระชับในไม่เกิน 20 ประโยคโดยเน้นประเด็นสำคัญ 1-2 ข้อ
-หากจำเป็น กรุณาถามคำถามเกี่ยวกับสภาวะเฉพาะของผู้ป่วยก่อน"""
+หากจำเป็น กรุณาถามคำถามเกี่ยวกับสภาวะเฉพาะของผู้ป่วยก่อน""",
+        'mr_update': "ต่อไปนี้คือบันทึกทางการแพทย์ที่มีอยู่ (ในรูปแบบ JSON โดยมีคีย์เป็นหัวข้อของบันทึก) และบทสนทนาส่วนใหม่ของการตรวจ กรุณาปรับปรุงบันทึกทางการแพทย์ตามเนื้อหาใหม่:",
+        'mr_update_detail': """ข้อกำหนด:
+- ส่งกลับเฉพาะหัวข้อที่ต้องเปลี่ยนแปลงเนื่องจากเนื้อหาใหม่ ไม่ต้องส่งหัวข้อที่ไม่เปลี่ยนแปลง
+- ส่งกลับเป็นออบเจ็กต์ JSON โดยคีย์คือชื่อหัวข้อ (ตรงกับคีย์ของบันทึกเดิม) และค่าคือเนื้อหาที่ปรับปรุงแล้วทั้งหมดของหัวข้อนั้น
+- หากเนื้อหาใหม่ไม่ทำให้หัวข้อใดเปลี่ยนแปลง ให้ส่งกลับ {}
+- อย่าละเว้นข้อมูลการตรวจใดๆ
+- อย่าระบุข้อมูลส่วนบุคคลใดๆ""",
+        'mr_condense': "ต่อไปนี้คือส่วนหนึ่งของเวชระเบียนของผู้ป่วย กรุณาย่อให้เป็นสรุปทางคลินิกที่กระชับ โดยเก็บการวินิจฉัย หัตถการ ยาพร้อมขนาดยา การแพ้ ผลการตรวจ (พร้อมค่าและวันที่) และการตอบสนองต่อการรักษาไว้ทั้งหมด ตัดส่วนที่ซ้ำและข้อความรูปแบบออก ให้ตอบเฉพาะสรุปเท่านั้น:",
+        'mr_condense_merge': "ต่อไปนี้คือสรุปของเวชระเบียนแต่ละส่วนของผู้ป่วยรายเดียวกันตามลำดับเวลา กรุณารวมเป็นประวัติที่กระชับฉบับเดียว ตัดส่วนที่ซ้ำ และเก็บการวินิจฉัย ยาพร้อมขนาดยา การแพ้ และผลการตรวจสำคัญ (พร้อมค่าและวันที่) ไว้ทั้งหมด ให้ตอบเฉพาะสรุปเท่านั้น:",
+        'mr_json_format': "ให้ตอบเป็นออบเจ็กต์ JSON เพียงหนึ่งออบเจ็กต์เท่านั้น ห้ามมีข้อความอื่น คีย์ต้องเป็นหัวข้อของบันทึกทางการแพทย์ต่อไปนี้ตามลำดับนี้เท่านั้น: {sections} แต่ละค่าคือเนื้อหาของหัวข้อนั้นเป็นข้อความ หากไม่มีข้อมูลให้เขียนว่า \"ไม่มี\"",
+        'mr_json_retry': "ให้ตอบเป็นออบเจ็กต์ JSON เพียงหนึ่งออบเจ็กต์ เฉพาะหัวข้อของบันทึกทางการแพทย์ต่อไปนี้: {sections} แต่ละค่าคือเนื้อหาของหัวข้อนั้นเป็นข้อความ หากไม่มีข้อมูลให้เขียนว่า \"ไม่มี\""
     }
 }
 
@@ -242,6 +353,24 @@ def get_language_prompt(language: str, prompt_key: str) -> str:
         language = DEFAULT_LANGUAGE
     return LLM_PROMPTS[language][prompt_key]
 
+def get_medical_record_sections(language: str) -> List[str]:
+    """Get the language-specific medical record section names"""
+    if language not in SUPPORTED_LANGUAGES:
+        language = DEFAULT_LANGUAGE
+    return MEDICAL_RECORD_SECTIONS[language]
+
+def get_negations(language: str) -> List[str]:
+    """Get the language-specific negation and stop words guarding the semantic cache"""
+    if language not in SUPPORTED_LANGUAGES:
+        language = DEFAULT_LANGUAGE
+    return NEGATIONS[language]
+
+def get_disfluencies(language: str) -> Dict[str, List[str]]:
+    """Get the language-specific filler words stripped from transcripts"""
+    if language not in SUPPORTED_LANGUAGES:
+        language = DEFAULT_LANGUAGE
+    return DISFLUENCIES[language]
+
 def get_error_message(language: str, error_key: str) -> str:
     """Get language-specific error message"""
     # TODO: Implement error message translations
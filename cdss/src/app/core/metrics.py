@@ -0,0 +1,278 @@
+"""
+Prometheus metrics served at /metrics, merged across pre-fork workers
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from fast cache hits to long LLM generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Real-time factor: processing seconds per second of audio
+RTF_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5)
+# Seconds between writes of a worker's values to CDSS_METRICS_DIR
+SHARE_INTERVAL_S = 5
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = ("worker",) + tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        worker = os.environ.get("CDSS_WORKER_ID", "0")
+        return (worker,) + tuple(str(labels.get(name, "")) for name in self.labelnames[1:])
+
+    def state(self) -> List:
+        """[label values, value] pairs of every series, as written to CDSS_METRICS_DIR"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def render(self, series: Optional[List] = None) -> List[str]:
+        """The exposition lines of this process's series, or of the given [label values, value] pairs"""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self, series: Optional[List] = None) -> List[str]:
+        lines = super().render()
+        for key, value in self.state() if series is None else series:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> (per-bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def state(self) -> List:
+        with self._lock:
+            return [[list(key), [list(counts), total, count]] for key, (counts, total, count) in self._values.items()]
+
+    def render(self, series: Optional[List] = None) -> List[str]:
+        lines = super().render()
+        for key, (counts, total, count) in self.state() if series is None else series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._sharer: Optional[threading.Thread] = None
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def _share(self, directory: str) -> Dict[str, List]:
+        """Write this worker's values to directory and return them"""
+        state = {name: metric.state() for name, metric in self._metrics.items()}
+        path = os.path.join(directory, f"worker-{os.environ.get('CDSS_WORKER_ID', '0')}.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+        return state
+
+    def start_sharing(self):
+        """In a pre-fork worker, keep writing this worker's values to CDSS_METRICS_DIR"""
+        directory = os.environ.get("CDSS_METRICS_DIR")
+        if not directory or (self._sharer is not None and self._sharer.is_alive()):
+            return
+
+        def run():
+            while True:
+                try:
+                    self._share(directory)
+                except OSError as e:
+                    print(f"Failed to share metrics: {e}")
+                time.sleep(SHARE_INTERVAL_S)
+
+        self._sharer = threading.Thread(target=run, name="metrics-sharer", daemon=True)
+        self._sharer.start()
+
+    def _all_workers(self, directory: str) -> Dict[str, List]:
+        """This worker's live values plus the last values every other worker wrote"""
+        own = self._share(directory)
+        merged = {name: list(series) for name, series in own.items()}
+        own_file = f"worker-{os.environ.get('CDSS_WORKER_ID', '0')}.json"
+        for name in sorted(os.listdir(directory)):
+            if name == own_file or not (name.startswith("worker-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(directory, name), encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for metric, series in state.items():
+                merged.setdefault(metric, []).extend(series)
+        return merged
+
+    def render(self) -> str:
+        directory = os.environ.get("CDSS_METRICS_DIR")
+        series = self._all_workers(directory) if directory else {}
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.render(series.get(name, []) if directory else None))
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Get (or register) the counter called name"""
+    return registry.get(name) or registry.register(Counter(name, documentation, labelnames))
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = LATENCY_BUCKETS
+) -> Histogram:
+    """Get (or register) the histogram called name"""
+    return registry.get(name) or registry.register(Histogram(name, documentation, labelnames, buckets))
+
+# Metrics shared across modules
+http_request_seconds = histogram(
+    "cdss_http_request_duration_seconds", "HTTP request latency by endpoint",
+    ("method", "endpoint", "status")
+)
+asr_real_time_factor = histogram(
+    "cdss_asr_real_time_factor", "ASR processing time divided by audio duration",
+    ("language",), RTF_BUCKETS
+)
+asr_seconds = histogram("cdss_asr_duration_seconds", "ASR time per audio file", ("language",))
+ocr_seconds = histogram("cdss_ocr_duration_seconds", "OCR time per image", ("language",))
+llm_request_seconds = histogram(
+    "cdss_llm_request_duration_seconds", "Total LLM completion time",
+    ("backend", "model", "outcome")
+)
+llm_time_to_first_token = histogram(
+    "cdss_llm_time_to_first_token_seconds", "Time until the first streamed token (LLM_STREAMING only)",
+    ("backend", "model")
+)
+llm_requests = counter(
+    "cdss_llm_requests_total", "LLM completions by backend (primary/fallback) and outcome",
+    ("backend", "model", "outcome")
+)
+llm_prompt_tokens = counter(
+    "cdss_llm_prompt_tokens_total", "Prompt tokens sent to the LLM", ("model", "language")
+)
+llm_completion_tokens = counter(
+    "cdss_llm_completion_tokens_total", "Completion tokens generated by the LLM", ("model", "language")
+)
+llm_degraded_requests = counter(
+    "cdss_llm_degraded_requests_total", "Requests sent to the fallback model because the primary was overloaded",
+    ("model",)
+)
+llm_prefix_cache_lookups = counter(
+    "cdss_llm_prefix_cache_lookups_total",
+    "Prompts whose stable prefix the chosen endpoint recently processed (hit) or not (miss)",
+    ("model", "result")
+)
+llm_cached_prompt_tokens = counter(
+    "cdss_llm_cached_prompt_tokens_total", "Prompt tokens the LLM server reported as served from its prefix cache",
+    ("model",)
+)
+llm_cold_starts = counter(
+    "cdss_llm_cold_starts_total",
+    "Times an LLM model was found unloaded, by the warm pool's check (keepalive) or on a request",
+    ("model", "detected")
+)
+llm_preload_seconds = histogram(
+    "cdss_llm_preload_duration_seconds", "Time to load (or refresh) an LLM model via the warm pool", ("model",)
+)
+coalesced_requests = counter(
+    "cdss_coalesced_requests_total", "Calls that joined an identical call already in flight instead of computing",
+    ("operation",)
+)
+retrieval_seconds = histogram("cdss_retrieval_duration_seconds", "Guideline retrieval time per query")
+semantic_cache_lookups = counter(
+    "cdss_semantic_cache_lookups_total", "Semantic cache lookups of /query answers",
+    ("language", "role", "result")
+)
+condense_seconds = histogram("cdss_condense_duration_seconds", "Time to condense long medical records", ("language",))
+condensed_tokens = counter(
+    "cdss_condensed_tokens_total", "Estimated medical record tokens before and after condensation",
+    ("stage",)
+)
+structured_outputs = counter(
+    "cdss_structured_output_total", "JSON medical records by validation outcome (valid, repaired, incomplete)",
+    ("outcome",)
+)
+structured_section_retries = counter(
+    "cdss_structured_section_retries_total", "Medical record sections requested again after failing validation",
+    ("language",)
+)
+llm_routing_decisions = counter(
+    "cdss_llm_routing_decisions_total", "Primary model chosen per request, by reason (fast, default, long_context, overflow)",
+    ("model", "reason", "endpoint")
+)
@@ -0,0 +1,112 @@
+"""
+Complexity-based choice of the primary LLM model
+"""
+
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from app.core.config import (
+    LLM_MODEL_NAME, LLM_MODEL_TIERS, LLM_ROUTE_FAST_MAX_TOKENS, LLM_ROUTE_FAST_ENDPOINTS,
+    LLM_ROUTE_FAST_LANGUAGES, LLM_ROUTE_OUTPUT_TOKENS
+)
+from app.core.degradation import parse_policy
+from app.core import metrics
+
+def parse_tiers(spec: str) -> List[Tuple[str, Optional[int]]]:
+    """Parse "model[=context tokens],..." into (model, context window or None for unknown) pairs"""
+    tiers = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        # Model names contain ':' (e.g. "qwen2.5:7b"), so the window follows '='
+        name, _, context = entry.rpartition("=") if "=" in entry else (entry, "", "")
+        tiers.append((name.strip(), int(context) if context.strip() else None))
+    return tiers
+
+class ModelRouter:
+    def __init__(
+        self,
+        tiers: str = LLM_MODEL_TIERS,
+        default_model: str = LLM_MODEL_NAME,
+        fast_max_tokens: int = LLM_ROUTE_FAST_MAX_TOKENS,
+        fast_endpoints: str = LLM_ROUTE_FAST_ENDPOINTS,
+        fast_languages: str = LLM_ROUTE_FAST_LANGUAGES,
+        output_tokens: int = LLM_ROUTE_OUTPUT_TOKENS
+    ):
+        self.tiers = parse_tiers(tiers)
+        self.enabled = bool(self.tiers)
+        if self.enabled and default_model not in self.models:
+            # Not listed: its window is unknown, so it takes everything that is not trivial
+            self.tiers.append((default_model, None))
+        self.default_model = default_model
+        self.fast_max_tokens = fast_max_tokens
+        self.fast_endpoints = parse_policy(fast_endpoints)
+        self.fast_languages = {language.strip() for language in fast_languages.split(",") if language.strip()}
+        self.output_tokens = output_tokens
+        self.decisions: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def models(self) -> List[str]:
+        return [name for name, _ in self.tiers]
+
+    def _fits(self, context: Optional[int], prompt_tokens: int) -> bool:
+        return context is None or prompt_tokens + self.output_tokens <= context
+
+    def _is_trivial(self, prompt_tokens: int, endpoint: Optional[str], role: Optional[str], language: Optional[str]) -> bool:
+        if prompt_tokens > self.fast_max_tokens or endpoint is None:
+            return False
+        if (endpoint, None) not in self.fast_endpoints and (endpoint, role) not in self.fast_endpoints:
+            return False
+        return not self.fast_languages or language in self.fast_languages
+
+    def choose(
+        self,
+        prompt_tokens: int,
+        endpoint: Optional[str] = None,
+        role: Optional[str] = None,
+        language: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """The model for a request and the reason: fast, default, long_context or overflow"""
+        if not self.enabled:
+            return self.default_model, "default"
+
+        fastest, fastest_context = self.tiers[0]
+        if self._is_trivial(prompt_tokens, endpoint, role, language) and self._fits(fastest_context, prompt_tokens):
+            return fastest, "fast"
+        start = self.models.index(self.default_model)
+        for name, context in self.tiers[start:]:
+            if self._fits(context, prompt_tokens):
+                return name, "default" if name == self.default_model else "long_context"
+        # Nothing is large enough; the largest window truncates the least
+        name, _ = max(self.tiers, key=lambda tier: tier[1] or 0)
+        return name, "overflow"
+
+    def route(
+        self,
+        prompt_tokens: int,
+        endpoint: Optional[str] = None,
+        role: Optional[str] = None,
+        language: Optional[str] = None
+    ) -> str:
+        """Choose the model for a request and record the decision"""
+        model, reason = self.choose(prompt_tokens, endpoint, role, language)
+        with self._lock:
+            self.decisions[(model, reason)] += 1
+        metrics.llm_routing_decisions.inc(model=model, reason=reason, endpoint=endpoint or "internal")
+        return model
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            decisions = [
+                {"model": model, "reason": reason, "count": count}
+                for (model, reason), count in self.decisions.items()
+            ]
+        return {
+            "enabled": self.enabled,
+            "tiers": [{"model": name, "context_tokens": context} for name, context in self.tiers],
+            "decisions": decisions
+        }
+
+model_router = ModelRouter()
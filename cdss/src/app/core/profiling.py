@@ -0,0 +1,99 @@
+"""
+Opt-in per-request profiling
+"""
+
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import random
+import secrets
+import threading
+import time
+from importlib.util import find_spec
+from app.core.config import (
+    PROFILING_ENABLED, PROFILING_TOKEN, PROFILING_SAMPLE_PERCENT, PROFILING_DIR, PROFILER
+)
+from app.core.tracing import current_trace
+
+PROFILE_HEADER = b"x-profile"
+
+def _use_pyinstrument() -> bool:
+    if PROFILER == "cprofile":
+        return False
+    return find_spec("pyinstrument") is not None
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling selected requests"""
+
+    def __init__(self, app):
+        self.app = app
+        self.pyinstrument = _use_pyinstrument()
+        # cProfile cannot tell concurrent requests apart, so it profiles one at a time
+        self._cprofile_busy = threading.Lock()
+
+    def _requested(self, scope) -> bool:
+        if PROFILING_TOKEN:
+            for key, value in scope.get("headers", []):
+                if key == PROFILE_HEADER:
+                    return secrets.compare_digest(value.decode("latin-1"), PROFILING_TOKEN)
+        return PROFILING_SAMPLE_PERCENT > 0 and random.random() * 100 < PROFILING_SAMPLE_PERCENT
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ENABLED or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        trace = current_trace()
+        request_id = trace.request_id if trace else secrets.token_hex(8)
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{request_id}"
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode("latin-1"))]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        if self.pyinstrument:
+            from pyinstrument import Profiler
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                profiler.stop()
+                await asyncio.to_thread(self._save_pyinstrument, profiler, profile_id, scope)
+            return
+
+        if not self._cprofile_busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                profiler.disable()
+        finally:
+            self._cprofile_busy.release()
+        await asyncio.to_thread(self._save_cprofile, profiler, profile_id, scope)
+
+    def _save_pyinstrument(self, profiler, profile_id: str, scope):
+        os.makedirs(PROFILING_DIR, exist_ok=True)
+        path = os.path.join(PROFILING_DIR, f"{profile_id}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+        print(f"Saved profile of {scope['method']} {scope['path']} to {path}")
+
+    def _save_cprofile(self, profiler: cProfile.Profile, profile_id: str, scope):
+        os.makedirs(PROFILING_DIR, exist_ok=True)
+        path = os.path.join(PROFILING_DIR, f"{profile_id}.prof")
+        profiler.dump_stats(path)
+        # A readable summary next to the raw stats, for a quick look without tooling
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+        with open(os.path.join(PROFILING_DIR, f"{profile_id}.txt"), "w", encoding="utf-8") as f:
+            f.write(f"{scope['method']} {scope['path']}\n{summary.getvalue()}")
+        print(f"Saved profile of {scope['method']} {scope['path']} to {path}")
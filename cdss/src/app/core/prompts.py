@@ -0,0 +1,121 @@
+"""
+Prompt assembly laid out so consecutive requests share a cacheable prefix
+"""
+
+import hashlib
+from typing import Dict, List, Optional
+from app.core.i18n import LLM_PROMPTS, MEDICAL_RECORD_SECTIONS, SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE
+
+ROLES = ("doctor", "patient")
+JSON_INSTRUCTION = "Please respond in JSON format."
+
+def _language(language: str) -> str:
+    return language if language in SUPPORTED_LANGUAGES else DEFAULT_LANGUAGE
+
+def _compile_role_contexts() -> Dict[tuple, str]:
+    contexts = {}
+    for language in SUPPORTED_LANGUAGES:
+        for role in ROLES:
+            context = LLM_PROMPTS[language][f'{role}_context']
+            contexts[(language, role, False)] = context
+            contexts[(language, role, True)] = f"{context} {JSON_INSTRUCTION}"
+    return contexts
+
+def _compile_instructions() -> Dict[tuple, str]:
+    instructions = {}
+    for language in SUPPORTED_LANGUAGES:
+        prompts = LLM_PROMPTS[language]
+        instructions[(language, 'mr')] = f"{prompts['mr_format']}\n{prompts['mr_format_detail']}"
+        sections = ", ".join(MEDICAL_RECORD_SECTIONS[language])
+        # Without mr_format_detail: it asks for markdown, which contradicts the JSON-only instruction
+        instructions[(language, 'mr_json')] = f"{prompts['mr_format']}\n{prompts['mr_json_format'].format(sections=sections)}"
+        instructions[(language, 'mr_update')] = f"{prompts['mr_update']}\n{prompts['mr_update_detail']}"
+        instructions[(language, 'mr_condense')] = prompts['mr_condense']
+        instructions[(language, 'mr_condense_merge')] = prompts['mr_condense_merge']
+    return instructions
+
+# Precompiled once so that every request reuses the very same strings
+ROLE_CONTEXTS = _compile_role_contexts()
+TASK_INSTRUCTIONS = _compile_instructions()
+
+def role_context(language: str, role: str, is_json: bool = False) -> str:
+    """The system context of a role, with the JSON instruction baked in when is_json"""
+    return ROLE_CONTEXTS[(_language(language), role, is_json)]
+
+def records_context(language: str, role: str, medical_records: str, retrieved_info: str = "") -> str:
+    """The role's query context filled with the patient's records (and retrieved documents for doctors)"""
+    template = LLM_PROMPTS[_language(language)][f'{role}_query_context']
+    if role == "doctor":
+        return template.format(medical_records=medical_records, retrieved_info=retrieved_info)
+    return template.format(medical_records=medical_records)
+
+def chat_messages(
+    language: str,
+    role: str,
+    prompt: str,
+    medical_records: Optional[str] = None,
+    history: Optional[List[str]] = None,
+    retrieved_info: str = ""
+) -> List[Dict]:
+    """Messages of a chat turn, after the role context"""
+    messages = []
+    if medical_records or retrieved_info:
+        # Retrieved passages change with the question, so with them the stable prefix ends at the role context
+        messages.append({"role": "system", "content": records_context(language, role, medical_records or "", retrieved_info)})
+    if history:
+        messages.append({"role": "assistant", "content": '\n'.join(history)})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+def medical_record_messages(
+    language: str,
+    transcript: str,
+    medical_records: Optional[str] = None,
+    is_json: bool = False
+) -> List[Dict]:
+    """Messages converting a transcript into a medical record, after the role context"""
+    content = transcript
+    if medical_records:
+        content = f"Additional medical records:\n{medical_records}\n\n{transcript}"
+    return [
+        {"role": "system", "content": TASK_INSTRUCTIONS[(_language(language), 'mr_json' if is_json else 'mr')]},
+        {"role": "user", "content": content}
+    ]
+
+def section_retry_messages(language: str, messages: List[Dict], sections: List[str]) -> List[Dict]:
+    """The messages of a JSON record generation, asking again for just the given sections"""
+    retry = LLM_PROMPTS[_language(language)]['mr_json_retry'].format(sections=", ".join(sections))
+    # Appended after the original messages so the retry reuses their cached prefix
+    return messages + [{"role": "user", "content": retry}]
+
+def medical_record_update_messages(
+    language: str,
+    sections_json: str,
+    transcript_delta: str,
+    medical_records: Optional[str] = None
+) -> List[Dict]:
+    """Messages updating the sections of a medical record from a transcript delta, after the role context"""
+    content = f"{sections_json}\n\n{transcript_delta}"
+    if medical_records:
+        content = f"Additional medical records:\n{medical_records}\n\n{content}"
+    return [
+        {"role": "system", "content": TASK_INSTRUCTIONS[(_language(language), 'mr_update')]},
+        {"role": "user", "content": content}
+    ]
+
+def condense_messages(language: str, text: str, merge: bool = False) -> List[Dict]:
+    """Messages summarising one part of long medical records, or merging the parts' summaries"""
+    return [
+        {"role": "system", "content": TASK_INSTRUCTIONS[(_language(language), 'mr_condense_merge' if merge else 'mr_condense')]},
+        {"role": "user", "content": text}
+    ]
+
+def prefix_key(messages: List[Dict]) -> str:
+    """Hash of the leading system messages, the part a backend prefix cache can reuse"""
+    digest = hashlib.blake2b(digest_size=16)
+    for message in messages:
+        if message["role"] != "system":
+            break
+        digest.update(message["content"].encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
@@ -0,0 +1,214 @@
+"""
+Pre-fork multi-worker serving with the ASR/OCR models shared copy-on-write
+"""
+
+import gc
+import multiprocessing
+import os
+import signal
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# Seconds a worker gets to finish in-flight requests on shutdown before it is killed
+GRACEFUL_TIMEOUT_S = 30
+# Do not respawn a worker that keeps dying faster than this
+MIN_WORKER_LIFETIME_S = 5
+
+# Live worker count, in shared memory so that every forked worker can read it
+_active_workers = None
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+def worker_counts() -> Dict[str, int]:
+    """Configured and currently running worker processes"""
+    configured = int(os.environ.get("CDSS_WORKERS", "1"))
+    active = _active_workers.value if _active_workers is not None else 1
+    return {"configured": configured, "active": active}
+
+def default_threads_per_worker(workers: int) -> int:
+    """Split the available CPUs evenly between workers"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    return max(1, cpus // max(1, workers))
+
+def cpu_slices(cpus: List[int], workers: int, threads_per_worker: int) -> List[List[int]]:
+    """
+    Assign each worker a disjoint set of CPUs, wrapping around when there are
+    fewer CPUs than workers * threads_per_worker.
+    """
+    cpus = sorted(cpus)
+    return [
+        [cpus[(worker * threads_per_worker + i) % len(cpus)] for i in range(threads_per_worker)]
+        for worker in range(workers)
+    ]
+
+def limit_threads(threads: int):
+    """
+    Cap the native thread pools of torch, OpenMP and BLAS.
+
+    The environment variables are read when those libraries initialise, so this
+    must run in the parent before the models are preloaded.
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+
+def _pin_worker(threads: int, cpus: Optional[List[int]]):
+    """Pin the current (worker) process to its CPUs and thread count"""
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, set(cpus))
+    # Only when the parent preloaded it: importing torch here would cost every worker its own copy.
+    # Without it, the OMP/MKL variables set by limit_threads still cap the threads.
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already fixed because the parent ran a parallel op during preload
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(app, sock: socket.socket, worker_id: int, threads: int, cpus: Optional[List[int]]):
+    """Body of a forked worker; never returns"""
+    import uvicorn
+
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    os.environ["CDSS_WORKER_ID"] = str(worker_id)
+    _pin_worker(threads, cpus)
+
+    exit_code = 0
+    try:
+        config = uvicorn.Config(app, lifespan="on", timeout_graceful_shutdown=GRACEFUL_TIMEOUT_S)
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException as e:
+        print(f"Worker {worker_id} crashed: {e}")
+        exit_code = 1
+    os._exit(exit_code)
+
+def serve_prefork(
+    app_path: str,
+    host: str,
+    port: int,
+    workers: int,
+    threads_per_worker: Optional[int] = None,
+    preload: bool = True,
+    preload_languages: Optional[List[str]] = None,
+    pin_cpus: bool = False
+):
+    """
+    Serve app_path with `workers` forked uvicorn processes sharing one listening socket.
+
+    Args:
+        app_path: The ASGI app import string, as passed to uvicorn
+        workers: Number of worker processes
+        threads_per_worker: torch/OpenMP threads per worker (default: CPUs / workers)
+        preload: Load the ASR/OCR models in the parent before forking
+        preload_languages: Languages to preload (default: WARMUP_LANGUAGES)
+        pin_cpus: Pin each worker to its own CPUs (Linux only)
+
+    Models are preloaded on CPU; forking after CUDA is initialised is not supported.
+    """
+    from uvicorn.importer import import_from_string
+    global _active_workers
+
+    threads_per_worker = threads_per_worker or default_threads_per_worker(workers)
+    limit_threads(threads_per_worker)
+    os.environ["CDSS_WORKERS"] = str(workers)
+
+    app = import_from_string(app_path)
+    from app.core.config import INFERENCE_SOCKET
+    if preload and not INFERENCE_SOCKET:  # with an inference server the workers hold no models
+        from app.core.config import WARMUP_LANGUAGES
+        from app.services.warmup import warm_up_models
+        languages = preload_languages or WARMUP_LANGUAGES
+        for service, seconds in warm_up_models(languages).items():
+            print(f"Preloaded {service} models for {languages} in {seconds:.1f}s")
+    from app.core.config import RETRIEVAL_ENABLED
+    if RETRIEVAL_ENABLED:
+        # Built once here; the workers inherit the open index instead of racing to rebuild it
+        from app.services.retrieval import retrieval_service
+        retrieval_service.ensure_index()
+
+    # Move everything loaded so far out of the GC's reach: collections in the
+    # workers would otherwise write to every object header and un-share the pages
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind_socket(host, port)
+    # Every worker writes its metrics here, so that whichever worker is scraped reports all of them
+    metrics_dir = tempfile.mkdtemp(prefix="cdss-metrics-")
+    os.environ["CDSS_METRICS_DIR"] = metrics_dir
+    slices = None
+    if pin_cpus and hasattr(os, "sched_getaffinity"):
+        slices = cpu_slices(list(os.sched_getaffinity(0)), workers, threads_per_worker)
+
+    _active_workers = multiprocessing.Value("i", 0)
+    children: Dict[int, int] = {}  # pid -> worker id
+    started_at: Dict[int, float] = {}
+    shutting_down = False
+
+    def spawn(worker_id: int):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(app, sock, worker_id, threads_per_worker, slices[worker_id] if slices else None)
+        children[pid] = worker_id
+        started_at[worker_id] = time.monotonic()
+        _active_workers.value = len(children)
+
+    def stop(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Serving on {host}:{port} with {workers} workers x {threads_per_worker} threads")
+    for worker_id in range(workers):
+        spawn(worker_id)
+
+    deadline = None
+    while children:
+        if shutting_down and deadline is None:
+            deadline = time.monotonic() + GRACEFUL_TIMEOUT_S
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if deadline is not None and time.monotonic() > deadline:
+                for child in list(children):
+                    os.kill(child, signal.SIGKILL)
+            time.sleep(0.2)
+            continue
+
+        worker_id = children.pop(pid)
+        _active_workers.value = len(children)
+        if shutting_down:
+            continue
+        lifetime = time.monotonic() - started_at[worker_id]
+        print(f"Worker {worker_id} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}")
+        if lifetime < MIN_WORKER_LIFETIME_S:
+            print(f"Worker {worker_id} died after {lifetime:.1f}s, not respawning")
+            stop(None, None)
+        else:
+            spawn(worker_id)
+
+    sock.close()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -0,0 +1,81 @@
+"""
+Coalescing of identical concurrent calls
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from app.core.config import SINGLE_FLIGHT_ENABLED
+from app.core.deadline import remaining
+from app.core.exceptions import DeadlineExceeded
+from app.core.stats import cache_stats
+from app.core import metrics
+
+def content_key(*parts: Any) -> str:
+    """Hash of the JSON-serialisable parts (bytes are hashed as they are)"""
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(json.dumps(part, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    def __init__(self, name: str, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.name = name
+        self.enabled = enabled
+        self._calls: Dict[str, _Call] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """
+        Run fn, or join the identical call already running under key.
+
+        Returns:
+            Tuple of (result, shared), shared being True for callers that joined an existing call
+        """
+        if not self.enabled:
+            return await fn(), False
+
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            cache_stats(f"singleflight_{self.name}").hit()
+            metrics.coalesced_requests.inc(operation=self.name)
+        else:
+            cache_stats(f"singleflight_{self.name}").miss()
+            call = _Call(asyncio.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except DeadlineExceeded:
+            left = remaining()
+            if not shared or (left is not None and left <= 0):
+                raise
+            # The first caller's deadline ran out, not ours: compute again with our own budget
+            self._forget(key, call)
+            return await self.do(key, fn)
+        except asyncio.CancelledError:
+            # This caller went away; stop the computation once nobody waits for it
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+            raise
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,153 @@
+"""
+In-process runtime statistics reported by /server-info
+"""
+
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+# Number of recent samples kept for latency percentiles
+LATENCY_WINDOW = 512
+
+class LatencyWindow:
+    """Sliding window of recent latencies with percentile lookup; samples older than max_age_s are ignored"""
+
+    def __init__(self, size: int = LATENCY_WINDOW, max_age_s: Optional[float] = None):
+        self._samples = deque(maxlen=size)  # (time.monotonic(), seconds)
+        self.max_age_s = max_age_s
+
+    def observe(self, seconds: float):
+        self._samples.append((time.monotonic(), seconds))
+
+    def _fresh(self) -> List[float]:
+        if self.max_age_s is None:
+            return [seconds for _, seconds in self._samples]
+        cutoff = time.monotonic() - self.max_age_s
+        return [seconds for observed_at, seconds in self._samples if observed_at >= cutoff]
+
+    def __len__(self) -> int:
+        return len(self._fresh())
+
+    def percentile(self, q: float) -> Optional[float]:
+        ordered = sorted(self._fresh())
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {f"p{q}": self.percentile(q) for q in (50, 95, 99)}
+
+class BackendStats:
+    """Load, health and latency of one backend (e.g. an LLM endpoint)"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.last_success_at: Optional[float] = None
+        self.latency = LatencyWindow()
+        self._lock = threading.Lock()
+
+    def start(self) -> float:
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+        return time.perf_counter()
+
+    def cancel(self):
+        """A call abandoned by its caller: neither a success nor a failure of the backend"""
+        with self._lock:
+            self.in_flight -= 1
+            self.cancelled += 1
+
+    def finish(self, started: float, error: Optional[Exception] = None):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.in_flight -= 1
+            if error is None:
+                self.consecutive_failures = 0
+                self.last_success_at = time.time()
+                self.latency.observe(elapsed)
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = str(error)[:200]
+
+    @property
+    def healthy(self) -> bool:
+        return self.consecutive_failures == 0
+
+    def snapshot(self) -> Dict:
+        return {
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_success_at": self.last_success_at,
+            "latency_s": self.latency.summary()
+        }
+
+class CacheStats:
+    """Hit/miss counters of one cache"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        self.hits += 1
+
+    def miss(self):
+        self.misses += 1
+
+    def snapshot(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None
+        }
+
+_caches: Dict[str, CacheStats] = {}
+
+def cache_stats(name: str) -> CacheStats:
+    """Get (or register) the stats of the cache called name"""
+    if name not in _caches:
+        _caches[name] = CacheStats()
+    return _caches[name]
+
+def all_cache_stats() -> Dict[str, Dict]:
+    return {name: stats.snapshot() for name, stats in _caches.items()}
+
+class RequestCounter:
+    """HTTP requests currently being handled by this worker"""
+
+    def __init__(self):
+        self.active = 0
+        self.total = 0
+
+request_counter = RequestCounter()
+
+def process_memory() -> Dict[str, Optional[int]]:
+    """Resident and peak resident memory of this process, in bytes"""
+    rss = None
+    try:
+        with open(f"/proc/{os.getpid()}/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak if sys.platform == "darwin" else peak * 1024
+    return {"rss_bytes": rss, "peak_rss_bytes": peak}
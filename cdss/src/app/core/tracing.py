@@ -0,0 +1,230 @@
+"""
+Lightweight per-request tracing
+"""
+
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from app.core.config import (
+    TRACING_ENABLED, TRACE_JSONL_PATH, OTLP_ENDPOINT, OTEL_SERVICE_NAME, APP_VERSION
+)
+
+REQUEST_ID_HEADER = "x-request-id"
+# Finished traces waiting for export; beyond this they are dropped rather than slowing requests
+EXPORT_QUEUE_SIZE = 1024
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_dict(self, trace_id: str) -> Dict:
+        return {
+            "trace_id": trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+class Trace:
+    def __init__(self, trace_id: Optional[str] = None, request_id: Optional[str] = None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.request_id = request_id or self.trace_id
+        self.spans: List[Span] = []
+
+    def server_timing(self) -> str:
+        """Stage durations as a Server-Timing header value; repeated stages are summed"""
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            if s.end_ns is not None:
+                totals[s.name] = totals.get(s.name, 0.0) + s.duration_ms
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in totals.items())
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("cdss_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("cdss_span", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a stage of the current request; a no-op outside a traced request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, attributes)
+    trace.spans.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+class _Exporter:
+    """Writes finished traces to JSONL and/or an OTLP collector from a background thread"""
+
+    def __init__(self, jsonl_path: str, otlp_endpoint: str):
+        self.jsonl_path = jsonl_path
+        self.otlp_endpoint = otlp_endpoint
+        self._queue: queue.Queue = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.jsonl_path or self.otlp_endpoint)
+
+    def submit(self, trace: Trace):
+        if not self.enabled:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            # Started lazily so that it also exists in forked workers
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            traces = [self._queue.get()]
+            while len(traces) < 64:
+                try:
+                    traces.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self.jsonl_path:
+                    self._write_jsonl(traces)
+                if self.otlp_endpoint:
+                    self._post_otlp(traces)
+            except Exception as e:
+                print(f"Trace export failed: {e}")
+
+    def _write_jsonl(self, traces: List[Trace]):
+        os.makedirs(os.path.dirname(os.path.abspath(self.jsonl_path)), exist_ok=True)
+        with open(self.jsonl_path, "a", encoding="utf-8") as f:
+            for trace in traces:
+                for s in trace.spans:
+                    f.write(json.dumps(s.to_dict(trace.trace_id), ensure_ascii=False) + "\n")
+
+    def _post_otlp(self, traces: List[Trace]):
+        spans = []
+        for trace in traces:
+            for s in trace.spans:
+                spans.append({
+                    "traceId": trace.trace_id,
+                    "spanId": s.span_id,
+                    **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                    "name": s.name,
+                    "kind": 2 if s.parent_id is None else 1,  # SERVER for the root, INTERNAL below
+                    "startTimeUnixNano": str(s.start_ns),
+                    "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                    "attributes": [
+                        {"key": key, "value": {"stringValue": str(value)}} for key, value in s.attributes.items()
+                    ],
+                    "status": {"code": 2, "message": s.error} if s.error else {}
+                })
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": OTEL_SERVICE_NAME}},
+                    {"key": "service.version", "value": {"stringValue": APP_VERSION}}
+                ]},
+                "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}]
+            }]
+        }
+        request = urllib.request.Request(
+            self.otlp_endpoint,
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        urllib.request.urlopen(request, timeout=5).close()
+
+exporter = _Exporter(TRACE_JSONL_PATH, OTLP_ENDPOINT)
+
+class TracingMiddleware:
+    """
+    ASGI middleware tracing every HTTP request.
+
+    The response carries the request id (X-Request-ID, taken from the request
+    when the client sends a valid one) and a Server-Timing header with the
+    duration of every stage finished before the response started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for key, value in scope.get("headers", []):
+            if key == REQUEST_ID_HEADER.encode():
+                candidate = value.decode("latin-1")
+                if _VALID_REQUEST_ID.match(candidate):
+                    request_id = candidate
+                break
+
+        trace = Trace(request_id=request_id)
+        trace_token = _current_trace.set(trace)
+        root = Span("request", None, {"http.method": scope["method"], "http.route": scope["path"]})
+        trace.spans.append(root)
+        span_token = _current_span.set(root)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                timing = trace.server_timing()
+                total = f"total;dur={root.duration_ms:.1f}"
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", f"{timing}, {total}".lstrip(", ").encode("latin-1")))
+                headers.append((REQUEST_ID_HEADER.encode(), trace.request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            exporter.submit(trace)
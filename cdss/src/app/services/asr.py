@@ -1,10 +1,13 @@
+import asyncio
 import os
 import time
 import torch
+from typing import Dict, List
 from funasr import AutoModel
 from app.core.config import ASR_CONFIG, LANGUAGE_MODEL_CONFIG
 from app.core.exceptions import TranscriptionError
 from app.core.i18n import SUPPORTED_LANGUAGES
+from app.core.tracing import span
 
 class ASRService:
     _instance = None
@@ -68,51 +71,77 @@ class ASRService:
             print(f"Failed to load Whisper model for {language}: {e}")
             return {"type": "external", "language": language}
 
-    async def transcribe_voice(self, voice_file: bytes, language: str = "zh") -> str:
-        """Transcribe voice file to text with language awareness"""
+    def loaded_models(self) -> Dict[str, str]:
+        """Language -> engine of the ASR models loaded in this process"""
+        loaded = {}
+        for language, model in self._models.items():
+            loaded[language] = model.get("type", "unknown") if isinstance(model, dict) else type(model).__name__
+        return loaded
+
+    def warm_up(self, languages: List[str]):
+        """Load the ASR models for the given languages ahead of the first request"""
+        for language in languages:
+            self._initialize_model(language)
+
+    def _resolve_model(self, language: str):
+        """Return (language, model) after lazy initialization and the Chinese fallback"""
         if language not in SUPPORTED_LANGUAGES:
             language = "zh"  # fallback to Chinese
 
         # Lazy initialization of the model
         if language not in self._models:
-            self._initialize_model(language)
+            with span("asr.load", language=language):
+                self._initialize_model(language)
 
         # If model initialization failed or is disabled, try Chinese as fallback
         if language not in self._models and language != "zh":
             print(f"No ASR model available for {language}, falling back to Chinese")
             language = "zh"
             if language not in self._models:
-                self._initialize_model(language)
+                with span("asr.load", language=language):
+                    self._initialize_model(language)
 
         model_info = self._models.get(language)
         if not model_info:
             raise TranscriptionError("ASR", f"No ASR model available for {language}")
+        return language, model_info
+
+    def _funasr_generate(self, model, inputs):
+        return model.generate(
+            input=inputs,
+            use_itn=True,
+            batch_size_s=300,
+            merge_vad=True,
+            merge_length_s=15,
+            hotwords="./hotwords.txt"
+        )
+
+    async def transcribe_voice(self, voice_file: bytes, language: str = "zh") -> str:
+        """Transcribe voice file to text with language awareness"""
+        language, model_info = self._resolve_model(language)
 
         temp_file = f"temp{time.time()}"
         try:
-            with open(temp_file, "wb") as f:
-                f.write(voice_file)
+            with span("asr.write_input", bytes=len(voice_file)):
+                with open(temp_file, "wb") as f:
+                    f.write(voice_file)
             
             if language == 'zh' and not isinstance(model_info, dict):
-                # Use FunASR for Chinese
-                res = model_info.generate(
-                    input=temp_file,
-                    use_itn=True,
-                    batch_size_s=300,
-                    merge_vad=True,
-                    merge_length_s=15,
-                    hotwords="./hotwords.txt"
-                )
+                # Use FunASR for Chinese; inference runs in a thread to keep the event loop free
+                with span("asr.infer", engine="funasr"):
+                    res = await asyncio.to_thread(self._funasr_generate, model_info, temp_file)
                 if not res or not res[0] or "text" not in res[0]:
                     raise TranscriptionError("ASR", "Empty transcription result")
                 return res[0]["text"]
                 
             elif model_info.get("type") == "whisper" and "model" in model_info:
                 # Use Whisper for other languages
-                result = model_info["model"].transcribe(
-                    temp_file, 
-                    language=language if language != 'zh' else None
-                )
+                with span("asr.infer", engine="whisper"):
+                    result = await asyncio.to_thread(
+                        model_info["model"].transcribe,
+                        temp_file, 
+                        language=language if language != 'zh' else None
+                    )
                 return result["text"]
                 
             else:
@@ -125,6 +154,36 @@ class ASRService:
             if os.path.exists(temp_file):
                 os.remove(temp_file)
 
+    async def transcribe_voice_batch(self, voice_files: List[bytes], language: str = "zh") -> List[str]:
+        """
+        Transcribe several voice files of the same language.
+
+        FunASR processes the whole batch in one generate call; other engines
+        transcribe the files one by one.
+        """
+        language, model_info = self._resolve_model(language)
+        if not (language == 'zh' and not isinstance(model_info, dict)) or len(voice_files) == 1:
+            return [await self.transcribe_voice(voice_file, language) for voice_file in voice_files]
+
+        temp_files = [f"temp{time.time()}-{i}" for i in range(len(voice_files))]
+        try:
+            for temp_file, voice_file in zip(temp_files, voice_files):
+                with open(temp_file, "wb") as f:
+                    f.write(voice_file)
+            with span("asr.infer", engine="funasr", batch_size=len(voice_files)):
+                res = await asyncio.to_thread(self._funasr_generate, model_info, temp_files)
+            if not res or len(res) != len(voice_files) or any("text" not in r for r in res):
+                raise TranscriptionError("ASR", "Empty transcription result")
+            return [r["text"] for r in res]
+        except TranscriptionError:
+            raise
+        except Exception as e:
+            raise TranscriptionError("ASR", str(e))
+        finally:
+            for temp_file in temp_files:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+
     async def _transcribe_external(self, file_path: str, language: str) -> str:
         """Use external API for transcription"""
         try:
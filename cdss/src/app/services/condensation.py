@@ -0,0 +1,107 @@
+"""
+Map-reduce condensation of long medical records
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.core.config import (
+    CONDENSE_ENABLED, CONDENSE_MIN_TOKENS, CONDENSE_CHUNK_TOKENS, CONDENSE_MAX_CONCURRENCY, CONDENSE_CACHE_SIZE
+)
+from app.core.exceptions import DeadlineExceeded, LLMServiceError
+from app.core.singleflight import SingleFlight, content_key
+from app.core.stats import cache_stats
+from app.core.tracing import span
+from app.core import metrics, prompts
+from app.services.llm import llm_service
+from app.utils.tokens import estimate_tokens, split_by_tokens
+
+class RecordCondenser:
+    def __init__(
+        self,
+        enabled: bool = CONDENSE_ENABLED,
+        min_tokens: int = CONDENSE_MIN_TOKENS,
+        chunk_tokens: int = CONDENSE_CHUNK_TOKENS,
+        max_concurrency: int = CONDENSE_MAX_CONCURRENCY,
+        cache_size: int = CONDENSE_CACHE_SIZE
+    ):
+        self.enabled = enabled
+        self.min_tokens = min_tokens
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._flight = SingleFlight("condense")
+
+    async def condense(self, medical_records: Optional[str], language: str) -> Optional[str]:
+        """The records as they are if short enough, otherwise their (cached) condensed version"""
+        if not self.enabled or not medical_records or estimate_tokens(medical_records) <= self.min_tokens:
+            return medical_records
+
+        key = content_key("condense", medical_records, language)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            cache_stats("condensed_records").hit()
+            return self._cache[key]
+        cache_stats("condensed_records").miss()
+
+        try:
+            condensed, _ = await self._flight.do(key, lambda: self._condense(medical_records, language))
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            # Better a slow or truncated answer than none at all
+            print(f"Could not condense medical records, using them as they are: {e}")
+            return medical_records
+
+        self._remember(key, condensed)
+        return condensed
+
+    def _remember(self, key: str, value: str):
+        self._cache[key] = value
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _summarise(self, text: str, language: str, merge: bool = False) -> str:
+        result = await llm_service.generate_completion(
+            messages=prompts.condense_messages(language, text, merge),
+            system_context=prompts.role_context(language, "doctor"),
+            language=language
+        )
+        if result.get("degraded", False):
+            # Too lossy to stand in for the patient's history on every later turn
+            raise LLMServiceError("Fallback", "summary written by the fallback model")
+        return result["content"].strip()
+
+    async def _condense(self, medical_records: str, language: str) -> str:
+        started = time.perf_counter()
+        parts = split_by_tokens(medical_records, self.chunk_tokens)
+        slots = asyncio.Semaphore(self.max_concurrency)
+
+        async def summarise_part(part: str) -> str:
+            key = content_key("condense-part", part, language)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            async with slots:
+                summary = await self._summarise(part, language)
+            self._remember(key, summary)
+            return summary
+
+        with span("condense", parts=len(parts)):
+            # Let every part finish so one bad part does not throw away the good summaries
+            summaries = await asyncio.gather(*(summarise_part(part) for part in parts), return_exceptions=True)
+            for summary in summaries:
+                if isinstance(summary, BaseException):
+                    raise summary
+            condensed = "\n\n".join(summaries)
+            if len(parts) > 1 and estimate_tokens(condensed) > self.min_tokens:
+                condensed = await self._summarise(condensed, language, merge=True)
+
+        metrics.condense_seconds.observe(time.perf_counter() - started, language=language)
+        metrics.condensed_tokens.inc(estimate_tokens(medical_records), stage="before")
+        metrics.condensed_tokens.inc(estimate_tokens(condensed), stage="after")
+        return condensed
+
+record_condenser = RecordCondenser()
@@ -0,0 +1,66 @@
+"""
+CPU text embeddings shared by guideline retrieval and the semantic cache
+"""
+
+import hashlib
+import re
+import threading
+from importlib.util import find_spec
+from typing import List
+import numpy as np
+from app.core.config import RETRIEVAL_EMBEDDING_MODEL
+
+HASH_DIM = 1024
+
+class HashingEmbedder:
+    """
+    Dependency-free embedding: signed feature hashing of words and character
+    bigrams (which also covers Chinese and Thai, written without spaces).
+    """
+
+    name = f"hashing-{HASH_DIM}"
+    # Word overlap, not meaning: "5 mg" and "50 mg" score alike
+    semantic = False
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                features = [token] + [token[i:i + 2] for i in range(len(token) - 1)]
+                for feature in features:
+                    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+                    vectors[row, digest % HASH_DIM] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+class SentenceTransformerEmbedder:
+    semantic = True
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.name = model_name
+        self._model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self._model.encode(
+            texts, batch_size=32, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+def make_embedder(model_name: str = RETRIEVAL_EMBEDDING_MODEL):
+    if model_name and find_spec("sentence_transformers") is not None:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            print(f"Could not load embedding model {model_name}, using feature hashing: {e}")
+    return HashingEmbedder()
+
+_embedder = None
+_lock = threading.Lock()
+
+def get_embedder():
+    """The process-wide embedder, loaded on first use"""
+    global _embedder
+    with _lock:
+        if _embedder is None:
+            _embedder = make_embedder()
+        return _embedder
@@ -0,0 +1,122 @@
+import asyncio
+import itertools
+import time
+from typing import Dict, Optional
+from app.core.config import INFERENCE_SOCKET, INFERENCE_TIMEOUT_S, INFERENCE_PING_TIMEOUT_S, INFERENCE_MAX_IN_FLIGHT
+from app.core.exceptions import InferenceServiceError
+from app.core.deadline import timeout_for
+from app.utils.ipc import encode_frame, read_frame
+
+class InferenceClient:
+    """
+    Thin client of the out-of-process inference server.
+
+    Requests are multiplexed over one persistent connection per API worker. At
+    most max_in_flight requests are outstanding; beyond that calls fail fast with
+    503 instead of queueing without bound, and every call is bounded by timeout_s.
+    """
+
+    def __init__(
+        self,
+        socket_path: str = INFERENCE_SOCKET,
+        timeout_s: float = INFERENCE_TIMEOUT_S,
+        max_in_flight: int = INFERENCE_MAX_IN_FLIGHT,
+        ping_timeout_s: float = INFERENCE_PING_TIMEOUT_S
+    ):
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self.ping_timeout_s = ping_timeout_s
+        self.max_in_flight = max_in_flight
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def _ensure_connected(self):
+        if self._writer is not None and not self._writer.is_closing():
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError as e:
+                raise InferenceServiceError(f"Cannot connect to {self.socket_path}: {e}")
+            self._reader_task = asyncio.create_task(self._read_responses(reader))
+
+    async def _read_responses(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                header, _ = await read_frame(reader)
+                future = self._pending.pop(header.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(header)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._writer = None
+            # The server went away: fail everything still waiting on it
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(InferenceServiceError("Connection to inference server lost"))
+            self._pending.clear()
+
+    async def _request(
+        self, op: str, payload: bytes = b"", language: str = "zh", timeout_s: Optional[float] = None
+    ) -> Dict:
+        if self.in_flight >= self.max_in_flight:
+            raise InferenceServiceError("Too many inference requests in flight", retry_after=1)
+        # Bounded by the request deadline as well as our own timeout
+        timeout_s = timeout_for(timeout_s or self.timeout_s)
+        await self._ensure_connected()
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        header = {
+            "id": request_id,
+            "op": op,
+            "language": language,
+            # Lets the server drop the request if it is still queued when we give up
+            "deadline": time.time() + timeout_s
+        }
+        try:
+            self._writer.write(encode_frame(header, payload))
+            await self._writer.drain()
+            response = await asyncio.wait_for(future, timeout_s)
+        except asyncio.TimeoutError:
+            raise InferenceServiceError(f"{op} timed out after {timeout_s:.1f}s", status_code=504)
+        except ConnectionError as e:
+            raise InferenceServiceError(f"Connection to inference server lost: {e}")
+        finally:
+            self._pending.pop(request_id, None)
+
+        if not response.get("ok"):
+            status_code = response.get("status_code", 500)
+            raise InferenceServiceError(
+                response.get("error"),
+                status_code=status_code,
+                retry_after=1 if status_code == 503 else None
+            )
+        return response
+
+    async def transcribe_voice(self, voice_file: bytes, language: str = "zh") -> str:
+        return (await self._request("asr", voice_file, language))["text"]
+
+    async def transcribe_image(self, image_file: bytes, language: str = "zh") -> str:
+        return (await self._request("ocr", image_file, language))["text"]
+
+    async def ping(self) -> Dict:
+        """Return the server's queue depths and loaded models; a hung server fails within ping_timeout_s"""
+        response = await self._request("ping", timeout_s=self.ping_timeout_s)
+        return {"queues": response["queues"], "models": response.get("models", {})}
+
+# Create a singleton instance; only used when INFERENCE_SOCKET is configured
+inference_client = InferenceClient()
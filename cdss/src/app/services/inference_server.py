@@ -0,0 +1,174 @@
+"""
+Out-of-process ASR/OCR inference server with per-language batching
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.core.config import (
+    INFERENCE_MAX_QUEUE, INFERENCE_MAX_BATCH_SIZE, INFERENCE_BATCH_WINDOW_MS
+)
+from app.services.warmup import loaded_models
+from app.utils.ipc import encode_frame, read_frame
+
+# A batch handler transcribes a list of payloads of one language
+BatchHandler = Callable[[List[bytes], str], Awaitable[List[str]]]
+
+@dataclass
+class _Job:
+    request_id: int
+    language: str
+    payload: bytes
+    deadline: Optional[float]
+    writer: asyncio.StreamWriter
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+async def _asr_batch(payloads: List[bytes], language: str) -> List[str]:
+    from app.services.asr import asr_service
+    return await asr_service.transcribe_voice_batch(payloads, language)
+
+async def _ocr_batch(payloads: List[bytes], language: str) -> List[str]:
+    # PaddleOCR takes one image per call; batching still saves the queueing round trips
+    from app.services.ocr import ocr_service
+    return [await ocr_service.transcribe_image(payload, language) for payload in payloads]
+
+class InferenceServer:
+    def __init__(
+        self,
+        socket_path: str,
+        handlers: Optional[Dict[str, BatchHandler]] = None,
+        max_queue: int = INFERENCE_MAX_QUEUE,
+        max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+        batch_window_ms: float = INFERENCE_BATCH_WINDOW_MS
+    ):
+        self.socket_path = socket_path
+        self.handlers = handlers or {"asr": _asr_batch, "ocr": _ocr_batch}
+        self.max_queue = max_queue
+        self.max_batch_size = max_batch_size
+        self.batch_window_s = batch_window_ms / 1000
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._batchers: List[asyncio.Task] = []
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {op: queue.qsize() for op, queue in self.queues.items()}
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # stale socket of a previous run
+        self.queues = {op: asyncio.Queue(maxsize=self.max_queue) for op in self.handlers}
+        self._batchers = [asyncio.create_task(self._batch_loop(op)) for op in self.handlers]
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._batchers:
+            task.cancel()
+        await asyncio.gather(*self._batchers, return_exceptions=True)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header, payload = await read_frame(reader)
+                self._dispatch(header, payload, writer)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # peer went away, or sent an oversized or garbled frame
+        finally:
+            writer.close()
+
+    def _dispatch(self, header: Dict, payload: bytes, writer: asyncio.StreamWriter):
+        request_id = header.get("id")
+        op = header.get("op")
+        if op == "ping":
+            self._reply(writer, {"id": request_id, "ok": True, "queues": self.queue_depths(), "models": loaded_models()})
+            return
+        if op not in self.queues:
+            self._reply(writer, {"id": request_id, "ok": False, "status_code": 400, "error": f"Unknown operation: {op}"})
+            return
+        job = _Job(request_id, header.get("language", "zh"), payload, header.get("deadline"), writer)
+        try:
+            self.queues[op].put_nowait(job)
+        except asyncio.QueueFull:
+            self._reply(writer, {"id": request_id, "ok": False, "status_code": 503, "error": f"{op} queue is full"})
+
+    def _reply(self, writer: asyncio.StreamWriter, header: Dict):
+        if not writer.is_closing():
+            writer.write(encode_frame(header))
+
+    async def _next_batch(self, queue: asyncio.Queue) -> List[_Job]:
+        batch = [await queue.get()]
+        window_ends = time.monotonic() + self.batch_window_s
+        while len(batch) < self.max_batch_size:
+            remaining = window_ends - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batch_loop(self, op: str):
+        handler = self.handlers[op]
+        queue = self.queues[op]
+        while True:
+            batch = await self._next_batch(queue)
+
+            # Drop work nobody is waiting for any more
+            now = time.time()
+            live = []
+            for job in batch:
+                if job.writer.is_closing():
+                    continue
+                if job.deadline and job.deadline <= now:
+                    self._reply(job.writer, {"id": job.request_id, "ok": False, "status_code": 504, "error": "Deadline expired in queue"})
+                    continue
+                live.append(job)
+
+            by_language: Dict[str, List[_Job]] = {}
+            for job in live:
+                by_language.setdefault(job.language, []).append(job)
+
+            for language, jobs in by_language.items():
+                try:
+                    texts = await handler([job.payload for job in jobs], language)
+                    if len(texts) != len(jobs):
+                        # Results cannot be matched to requests any more; fail them all rather than guess
+                        raise RuntimeError(f"{op} handler returned {len(texts)} results for {len(jobs)} requests")
+                    for job, text in zip(jobs, texts):
+                        self._reply(job.writer, {"id": job.request_id, "ok": True, "text": text})
+                except Exception as e:
+                    for job in jobs:
+                        self._reply(job.writer, {
+                            "id": job.request_id,
+                            "ok": False,
+                            "status_code": getattr(e, "status_code", 500),
+                            "error": getattr(e, "detail", None) or str(e)
+                        })
+
+def run_inference_server(socket_path: str, languages: List[str], warm_up: bool = True):
+    """Entry point of the inference-server process"""
+    if warm_up:
+        from app.services.warmup import warm_up_models
+        for service, seconds in warm_up_models(languages).items():
+            print(f"Loaded {service} models for {languages} in {seconds:.1f}s")
+
+    server = InferenceServer(socket_path)
+    print(f"Inference server listening on {socket_path}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
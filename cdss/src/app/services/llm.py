@@ -1,30 +1,196 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
 from openai import OpenAI
+from openai.types import CompletionUsage
 from typing import Dict, List, Optional
 from app.core.config import (
-    LLM_API_URL, LLM_API_KEY, LLM_MODEL_NAME,
-    FALLBACK_LLM_API_URL, FALLBACK_LLM_API_KEY, FALLBACK_MODEL_NAME
+    LLM_API_URLS, LLM_API_KEY, LLM_MODEL_NAME,
+    FALLBACK_LLM_API_URLS, FALLBACK_LLM_API_KEY, FALLBACK_MODEL_NAME, LLM_STREAMING, LLM_MIN_FALLBACK_BUDGET_S
 )
-from app.core.exceptions import LLMServiceError
-from app.core.i18n import get_language_prompt
+from app.core.exceptions import LLMServiceError, DeadlineExceeded
+from app.core.deadline import remaining, timeout_for
+from app.core.stats import BackendStats, cache_stats
+from app.core.prompts import JSON_INSTRUCTION, prefix_key
+from app.core.tracing import span
+from app.core.degradation import degradation_router
+from app.core.model_router import model_router
+from app.core.singleflight import SingleFlight, content_key
+from app.core import metrics
+from app.utils.tokens import estimate_tokens
+from app.services.llm_pool import EndpointPool
+from app.services.llm_warm_pool import WarmPool
 
 class LLMService:
     def __init__(self):
-        self.primary_client = OpenAI(base_url=LLM_API_URL, api_key=LLM_API_KEY)
-        self.fallback_client = OpenAI(base_url=FALLBACK_LLM_API_URL, api_key=FALLBACK_LLM_API_KEY)
+        self.pools = {
+            "primary": EndpointPool("primary", LLM_API_URLS, lambda url: OpenAI(base_url=url, api_key=LLM_API_KEY)),
+            "fallback": EndpointPool(
+                "fallback", FALLBACK_LLM_API_URLS, lambda url: OpenAI(base_url=url, api_key=FALLBACK_LLM_API_KEY)
+            )
+        }
+        # The first endpoint of each tier, for callers that need a client directly
+        self.primary_client = self.pools["primary"].endpoints[0].client
+        self.fallback_client = self.pools["fallback"].endpoints[0].client
+        # Per tier, summed over the tier's endpoints
+        self.backend_stats = {"primary": BackendStats(), "fallback": BackendStats()}
+        self._single_flight = SingleFlight("llm")
+        # Keeps every endpoint's model loaded; started by the app's lifespan when LLM_WARM_POOL_ENABLED
+        primary_models = model_router.models if model_router.enabled else [LLM_MODEL_NAME]
+        self.warm_pool = WarmPool(
+            [(url, model) for url in LLM_API_URLS for model in primary_models] +
+            [(url, FALLBACK_MODEL_NAME) for url in FALLBACK_LLM_API_URLS]
+        )
+
+    async def _call_backend(
+        self,
+        backend: str,
+        language: Optional[str] = None,
+        session_id: Optional[str] = None,
+        validator=None,
+        **kwargs
+    ):
+        """
+        Run a chat completion on an endpoint of a backend tier, recording load, health, latency and token usage.
+
+        The call is bounded by the request deadline. If the request is cancelled
+        (deadline or client disconnect), a streamed completion is aborted at the
+        next chunk; a non-streamed one is left to its timeout. With a validator,
+        the completion is streamed and stopped as soon as the validator rejects it.
+        """
+        stats = self.backend_stats[backend]
+        pool = self.pools[backend]
+        endpoint = pool.pick(session_id)
+        model = kwargs.get("model")
+        timeout = timeout_for(None)
+        cancelled = threading.Event()
+        prefix_hit = endpoint.seen_prefix(prefix_key(kwargs["messages"]))
+        if prefix_hit:
+            cache_stats("llm_prefix").hit()
+        else:
+            cache_stats("llm_prefix").miss()
+        metrics.llm_prefix_cache_lookups.inc(model=model, result="hit" if prefix_hit else "miss")
+        cold_start = self.warm_pool.note_request(endpoint.url, model)
+        with span(f"llm.{backend}", model=model, url=endpoint.url, cold_start=cold_start) as current:
+            started = stats.start()
+            endpoint.stats.start()
+            try:
+                # The OpenAI client is blocking; run it off the event loop so concurrent
+                # requests are not serialised behind one another
+                response, first_token_s = await asyncio.to_thread(
+                    self._complete, endpoint.client, cancelled, validator, timeout=timeout, **kwargs
+                )
+            except BaseException as e:
+                cancelled.set()
+                outcome = "cancelled" if isinstance(e, asyncio.CancelledError) else "error"
+                if outcome == "cancelled":
+                    # Says nothing about the backend's health or latency
+                    stats.cancel()
+                    endpoint.stats.cancel()
+                else:
+                    stats.finish(started, e)
+                    endpoint.stats.finish(started, e)
+                    pool.record(endpoint, time.perf_counter() - started, e)
+                metrics.llm_requests.inc(backend=backend, model=model, outcome=outcome)
+                metrics.llm_request_seconds.observe(time.perf_counter() - started, backend=backend, model=model, outcome=outcome)
+                raise
+            stats.finish(started)
+            endpoint.stats.finish(started)
+            pool.record(endpoint, time.perf_counter() - started)
+            if backend == "primary":
+                degradation_router.observe_primary(time.perf_counter() - started)
+            metrics.llm_requests.inc(backend=backend, model=model, outcome="ok")
+            metrics.llm_request_seconds.observe(time.perf_counter() - started, backend=backend, model=model, outcome="ok")
+            if first_token_s is not None:
+                metrics.llm_time_to_first_token.observe(first_token_s, backend=backend, model=model)
+            if response.usage is not None:
+                metrics.llm_prompt_tokens.inc(response.usage.prompt_tokens, model=model, language=language or "unknown")
+                metrics.llm_completion_tokens.inc(response.usage.completion_tokens, model=model, language=language or "unknown")
+                cached_tokens = self._cached_tokens(response.usage)
+                if cached_tokens:
+                    metrics.llm_cached_prompt_tokens.inc(cached_tokens, model=model)
+                if current is not None:
+                    current.attributes["prompt_tokens"] = response.usage.prompt_tokens
+                    current.attributes["completion_tokens"] = response.usage.completion_tokens
+                    current.attributes["prefix_hit"] = prefix_hit
+        return response
+
+    @staticmethod
+    def _cached_tokens(usage) -> int:
+        """Prompt tokens served from the server's prefix cache, if the server reports them (OpenAI, vLLM, DeepSeek)"""
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+        if not isinstance(cached, int):
+            cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        return cached if isinstance(cached, int) else 0
+
+    def _complete(self, client: OpenAI, cancelled: threading.Event, validator=None, **kwargs):
+        """Return (response, seconds to the first token); the latter is only known when streaming"""
+        if not LLM_STREAMING and validator is None:
+            return self._create_chat_completion(client=client, **kwargs), None
+
+        started = time.perf_counter()
+        stream = self._create_chat_completion(client=client, stream=True, **kwargs)
+        first_token_s = None
+        parts = []
+        usage = None
+        for chunk in stream:
+            if cancelled.is_set():
+                # Nobody waits for the answer any more; closing the stream stops the generation
+                stream.close()
+                raise LLMServiceError(client.base_url, "Completion cancelled")
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token_s is None:
+                    first_token_s = time.perf_counter() - started
+                parts.append(delta)
+                if validator is not None and not validator.feed(delta):
+                    # Complete, or gone off-schema: either way more tokens would be wasted
+                    stream.close()
+                    break
+        content = "".join(parts)
+        if usage is None:
+            # Some servers do not report usage on streams; estimate it instead
+            prompt_tokens = sum(estimate_tokens(m["content"]) for m in kwargs["messages"])
+            completion_tokens = estimate_tokens(content)
+            usage = CompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            )
+        response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+        return response, first_token_s
 
     def _add_json_instruction(self, messages: List[Dict]) -> List[Dict]:
-        """Add JSON instruction to system message"""
+        """Add JSON instruction to system message, unless the precompiled context already carries it"""
         messages = messages.copy()
         if messages and messages[0]["role"] == "system":
-            messages[0]["content"] = messages[0]["content"] + " Please respond in JSON format."
+            if JSON_INSTRUCTION not in messages[0]["content"]:
+                messages[0] = {**messages[0], "content": f"{messages[0]['content']} {JSON_INSTRUCTION}"}
         else:
-            messages.insert(0, {"role": "system", "content": "Please respond in JSON format."})
+            messages.insert(0, {"role": "system", "content": JSON_INSTRUCTION})
         return messages
 
-    def _create_chat_completion(self, client: OpenAI, model: str, messages: List[Dict], response_format: Optional[Dict] = None):
+    def _create_chat_completion(
+        self,
+        client: OpenAI,
+        model: str,
+        messages: List[Dict],
+        response_format: Optional[Dict] = None,
+        stream: bool = False,
+        timeout: Optional[float] = None
+    ):
         """Create a chat completion that works with OpenAI, DeepSeek and Ollama APIs"""
         try:
             base_url_str = str(client.base_url)
+            request_kwargs = {'stream': True, 'stream_options': {"include_usage": True}} if stream else {}
+            if timeout is not None:
+                request_kwargs['timeout'] = timeout
             
             # Check for DeepSeek API
             if "deepseek" in base_url_str.lower():
@@ -32,6 +198,7 @@ class LLMService:
                 kwargs = {
                     'model': model,
                     'messages': messages,
+                    **request_kwargs
                 }
                 if response_format and response_format.get("type") == "json_object":
                     kwargs['messages'] = self._add_json_instruction(messages)
@@ -45,13 +212,14 @@ class LLMService:
                 return client.chat.completions.create(
                     model=model,
                     messages=messages,
-                    stream=False
+                    **{'stream': False, **request_kwargs}
                 )
             else:
                 # OpenAI format
                 kwargs = {
                     'model': model,
                     'messages': messages,
+                    **request_kwargs
                 }
                 if response_format:
                     kwargs['messages'] = self._add_json_instruction(messages)
@@ -64,7 +232,13 @@ class LLMService:
         self,
         messages: List[Dict],
         is_json: bool = False,
-        system_context: Optional[str] = None
+        system_context: Optional[str] = None,
+        language: Optional[str] = None,
+        allow_degrade: bool = False,
+        session_id: Optional[str] = None,
+        validator=None,
+        endpoint: Optional[str] = None,
+        role: Optional[str] = None
     ) -> Dict:
         """
         Generate a completion using the LLM service.
@@ -73,53 +247,114 @@ class LLMService:
             messages: List of message dictionaries with 'role' and 'content'
             is_json: Whether to request JSON formatted response
             system_context: Optional system context to prepend to messages
+            language: Language of the request, used to label token usage metrics
+            allow_degrade: Whether the fallback model may answer while the primary is overloaded
+            session_id: Conversation id; keeps the conversation on one endpoint of each tier
+            validator: Optional incremental validator of the streamed output. Its feed(delta) is
+                called with every streamed delta and stops the completion by returning False;
+                reset() is called before each backend is tried.
+            endpoint: API endpoint the request serves (e.g. "/query"); with role, used to route
+                trivial requests to the fastest model. None for internal calls.
+            role: Role of the user (doctor/patient)
             
         Returns:
-            Dict containing 'content' and 'usage' information
+            Dict containing 'content', 'usage' and 'degraded' (answered by the fallback model)
         """
-        try:
-            formatted_messages = []
-            if system_context:
-                formatted_messages.append({"role": "system", "content": system_context})
-            formatted_messages.extend(messages)
-
-            kwargs = {
-                'model': LLM_MODEL_NAME,
-                'messages': formatted_messages
-            }
-            
-            if is_json:
-                kwargs['response_format'] = {"type": "json_object"}
+        if validator is not None:
+            # The validator belongs to this caller, so the generation cannot be shared
+            return await self._generate(
+                messages, is_json, system_context, language, allow_degrade, session_id, endpoint, role, validator
+            )
 
-            response = self._create_chat_completion(
-                client=self.primary_client,
-                **kwargs
+        # Identical concurrent requests (retries, two clinicians on one record) share one generation.
+        # session_id only picks the endpoint, so it is not part of the key.
+        key = content_key(messages, is_json, system_context, language, allow_degrade, endpoint, role)
+        result, _ = await self._single_flight.do(
+            key, lambda: self._generate(
+                messages, is_json, system_context, language, allow_degrade, session_id, endpoint, role
             )
-            
+        )
+        return dict(result)
+
+    async def _generate(
+        self,
+        messages: List[Dict],
+        is_json: bool,
+        system_context: Optional[str],
+        language: Optional[str],
+        allow_degrade: bool,
+        session_id: Optional[str],
+        endpoint: Optional[str],
+        role: Optional[str],
+        validator=None
+    ) -> Dict:
+        formatted_messages = []
+        if system_context:
+            formatted_messages.append({"role": "system", "content": system_context})
+        formatted_messages.extend(messages)
+
+        kwargs = {'messages': formatted_messages}
+        if is_json:
+            kwargs['response_format'] = {"type": "json_object"}
+
+        # Trivial requests go to the fastest primary model, long prompts to one whose context fits
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in formatted_messages)
+        primary_model = model_router.route(prompt_tokens, endpoint, role, language)
+        backends = [("primary", primary_model), ("fallback", FALLBACK_MODEL_NAME)]
+        if allow_degrade and degradation_router.should_degrade(self.backend_stats["primary"].in_flight):
+            # The primary is overloaded: let the light model answer and keep the primary as backup
+            backends.reverse()
+            degradation_router.degraded_requests += 1
+            metrics.llm_degraded_requests.inc(model=FALLBACK_MODEL_NAME)
+
+        errors = {}
+        for backend, model in backends:
+            if errors:
+                left = remaining()
+                if left is not None and left < LLM_MIN_FALLBACK_BUDGET_S:
+                    # Not enough budget for another backend to finish; fail now instead of wasting it
+                    failed = next(iter(errors))
+                    raise LLMServiceError(
+                        failed.capitalize(),
+                        f"{errors[failed]}. Fallback skipped with {max(left, 0):.1f}s of the deadline left"
+                    )
+            if validator is not None:
+                validator.reset()
+            try:
+                response = await self._call_backend(backend, language, session_id, validator, model=model, **kwargs)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                errors[backend] = e
+                continue
             return {
                 'content': response.choices[0].message.content,
-                'usage': response.usage
+                'usage': response.usage,
+                'degraded': backend == "fallback"
             }
-            
-        except Exception as primary_error:
-            try:
-                # Try fallback service
-                kwargs['model'] = FALLBACK_MODEL_NAME
-                fallback_response = self._create_chat_completion(
-                    client=self.fallback_client,
-                    **kwargs
-                )
-                
-                return {
-                    'content': fallback_response.choices[0].message.content,
-                    'usage': fallback_response.usage
-                }
-                
-            except Exception as fallback_error:
-                raise LLMServiceError(
-                    "All Services",
-                    f"Primary: {str(primary_error)}. Fallback: {str(fallback_error)}"
-                )
+
+        raise LLMServiceError(
+            "All Services",
+            f"Primary: {str(errors['primary'])}. Fallback: {str(errors['fallback'])}"
+        )
+
+    def status(self) -> Dict:
+        """Health, load and latency of each backend, for /server-info"""
+        return {
+            "primary": {
+                "model": LLM_MODEL_NAME,
+                **self.backend_stats["primary"].snapshot(),
+                "endpoints": self.pools["primary"].snapshot()
+            },
+            "fallback": {
+                "model": FALLBACK_MODEL_NAME,
+                **self.backend_stats["fallback"].snapshot(),
+                "endpoints": self.pools["fallback"].snapshot()
+            },
+            "degradation": degradation_router.snapshot(),
+            "routing": model_router.snapshot(),
+            "warm_pool": self.warm_pool.snapshot()
+        }
 
 # Create a singleton instance
 llm_service = LLMService()
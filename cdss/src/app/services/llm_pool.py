@@ -0,0 +1,116 @@
+"""
+Pools of OpenAI-compatible endpoints serving one LLM tier
+"""
+
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from app.core.config import LLM_EJECT_AFTER_FAILURES, LLM_EJECT_S, LLM_STICKY_MAX_EXTRA, LLM_PREFIX_CACHE_SLOTS
+from app.core.stats import BackendStats
+
+# Weight of the newest sample in the latency EWMA
+EWMA_ALPHA = 0.3
+# Assumed latency of an endpoint without samples, so new endpoints get tried
+DEFAULT_LATENCY_S = 1.0
+MAX_EJECT_S = 600
+
+class Endpoint:
+    def __init__(self, url: str, client, prefix_slots: int = LLM_PREFIX_CACHE_SLOTS):
+        self.url = url
+        self.client = client
+        self.stats = BackendStats()
+        self.ewma_latency_s: Optional[float] = None
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.prefix_slots = prefix_slots
+        self._prefixes: OrderedDict = OrderedDict()
+        self._prefix_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def seen_prefix(self, key: str) -> bool:
+        """Whether the endpoint recently processed a prompt with this prefix, i.e. likely still has it cached"""
+        with self._prefix_lock:
+            seen = key in self._prefixes
+            self._prefixes[key] = True
+            self._prefixes.move_to_end(key)
+            while len(self._prefixes) > self.prefix_slots:
+                self._prefixes.popitem(last=False)
+            return seen
+
+    def score(self) -> float:
+        return (self.stats.in_flight + 1) * (self.ewma_latency_s or DEFAULT_LATENCY_S)
+
+    def snapshot(self) -> Dict:
+        return {
+            "url": self.url,
+            "available": self.available,
+            "ewma_latency_s": self.ewma_latency_s,
+            "ejections": self.ejections,
+            **self.stats.snapshot()
+        }
+
+class EndpointPool:
+    def __init__(
+        self,
+        name: str,
+        urls: List[str],
+        client_factory: Callable[[str], object],
+        eject_after_failures: int = LLM_EJECT_AFTER_FAILURES,
+        eject_s: float = LLM_EJECT_S,
+        sticky_max_extra: int = LLM_STICKY_MAX_EXTRA
+    ):
+        if not urls:
+            raise ValueError(f"LLM pool {name} has no endpoints")
+        self.name = name
+        self.endpoints = [Endpoint(url, client_factory(url)) for url in urls]
+        self.eject_after_failures = eject_after_failures
+        self.eject_s = eject_s
+        self.sticky_max_extra = sticky_max_extra
+        self._lock = threading.Lock()
+
+    def _rendezvous(self, session_id: str, candidates: List[Endpoint]) -> Endpoint:
+        def weight(endpoint: Endpoint) -> int:
+            digest = hashlib.blake2b(f"{session_id}|{endpoint.url}".encode("utf-8"), digest_size=8).digest()
+            return int.from_bytes(digest, "big")
+        return max(candidates, key=weight)
+
+    def pick(self, session_id: Optional[str] = None) -> Endpoint:
+        """Choose the endpoint for a request"""
+        available = [e for e in self.endpoints if e.available]
+        if not available:
+            # Everything is ejected: try the one that comes back first rather than failing outright
+            return min(self.endpoints, key=lambda e: e.ejected_until)
+        best = min(e.score() for e in available)
+        least_loaded = random.choice([e for e in available if e.score() == best])
+        if session_id:
+            sticky = self._rendezvous(session_id, available)
+            if sticky.stats.in_flight - least_loaded.stats.in_flight < self.sticky_max_extra:
+                return sticky
+        return least_loaded
+
+    def record(self, endpoint: Endpoint, seconds: float, error: Optional[BaseException] = None):
+        """Update the endpoint's latency estimate and passive health after a call"""
+        with self._lock:
+            if error is None:
+                endpoint.ewma_latency_s = seconds if endpoint.ewma_latency_s is None else (
+                    EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * endpoint.ewma_latency_s
+                )
+                endpoint.ejections = 0
+            elif endpoint.stats.consecutive_failures >= self.eject_after_failures and endpoint.available:
+                backoff = min(MAX_EJECT_S, self.eject_s * 2 ** endpoint.ejections)
+                endpoint.ejected_until = time.monotonic() + backoff
+                endpoint.ejections += 1
+                print(f"Ejected LLM endpoint {endpoint.url} from the {self.name} pool for {backoff:.0f}s")
+
+    @property
+    def in_flight(self) -> int:
+        return sum(e.stats.in_flight for e in self.endpoints)
+
+    def snapshot(self) -> List[Dict]:
+        return [e.snapshot() for e in self.endpoints]
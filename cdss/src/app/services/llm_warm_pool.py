@@ -0,0 +1,195 @@
+"""
+Warm pool keeping the Ollama models behind the LLM tiers loaded
+"""
+
+import asyncio
+import json
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from app.core.config import (
+    LLM_KEEP_ALIVE, LLM_KEEP_ALIVE_INTERVAL_S, LLM_WARM_HOURS, LLM_WARM_WEEKDAYS
+)
+from app.core import metrics
+
+PS_TIMEOUT_S = 5
+# Loading a model from disk can take a while on small boxes
+PRELOAD_TIMEOUT_S = 300
+
+def native_url(url: str) -> str:
+    """Ollama's native API root for an OpenAI-compatible base URL"""
+    url = url.rstrip("/")
+    return url[:-len("/v1")] if url.endswith("/v1") else url
+
+def _tagged(model: str) -> str:
+    return model if ":" in model else f"{model}:latest"
+
+def parse_hours(spec: str) -> Optional[Tuple[int, int]]:
+    """Parse "HH:MM-HH:MM" into minutes of the day; None (empty spec) means always"""
+    if not spec.strip():
+        return None
+    start, _, end = spec.partition("-")
+
+    def minutes(value: str) -> int:
+        hours, _, mins = value.strip().partition(":")
+        return int(hours) * 60 + int(mins or 0)
+    return minutes(start), minutes(end)
+
+class WarmTarget:
+    def __init__(self, url: str, model: str):
+        self.url = url
+        self.model = model
+        self.native_url = native_url(url)
+        # None until the endpoint answered /api/ps (True) or turned out not to be Ollama (False)
+        self.supported: Optional[bool] = None
+        self.loaded: Optional[bool] = None
+        self.cold_starts = 0
+        self.last_preload_s: Optional[float] = None
+        self.last_keep_alive: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def snapshot(self) -> Dict:
+        return {
+            "url": self.url,
+            "model": self.model,
+            "supported": self.supported,
+            "loaded": self.loaded,
+            "cold_starts": self.cold_starts,
+            "last_preload_s": self.last_preload_s,
+            "last_keep_alive": self.last_keep_alive,
+            "last_error": self.last_error
+        }
+
+class WarmPool:
+    def __init__(
+        self,
+        targets: Iterable[Tuple[str, str]],
+        keep_alive: str = LLM_KEEP_ALIVE,
+        interval_s: float = LLM_KEEP_ALIVE_INTERVAL_S,
+        hours: str = LLM_WARM_HOURS,
+        weekdays: List[int] = LLM_WARM_WEEKDAYS
+    ):
+        self.targets: Dict[Tuple[str, str], WarmTarget] = {}
+        for url, model in targets:
+            self.targets.setdefault((url, model), WarmTarget(url, model))
+        self.keep_alive = keep_alive
+        self.interval_s = interval_s
+        self.hours = parse_hours(hours)
+        self.weekdays = set(weekdays)
+        self._task: Optional[asyncio.Task] = None
+
+    def in_warm_hours(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now()
+        if now.isoweekday() not in self.weekdays:
+            return False
+        if self.hours is None:
+            return True
+        start, end = self.hours
+        minute = now.hour * 60 + now.minute
+        # A window like 22:00-06:00 wraps around midnight
+        return start <= minute < end if start <= end else minute >= start or minute < end
+
+    def _request(self, url: str, body: Optional[Dict] = None, timeout: float = PS_TIMEOUT_S) -> Dict:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(
+            url, data=data, headers={"Content-Type": "application/json"}, method="POST" if data else "GET"
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read() or b"{}")
+
+    def _loaded_models(self, target: WarmTarget) -> Optional[Set[str]]:
+        """Models loaded on the target's endpoint, or None if that is unknown"""
+        if target.supported is False:
+            return None
+        try:
+            reply = self._request(f"{target.native_url}/api/ps")
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                target.supported = False
+                print(f"LLM endpoint {target.url} has no /api/ps; not an Ollama server, warm pool skips it")
+            target.last_error = str(e)
+            return None
+        except Exception as e:
+            target.last_error = str(e)
+            return None
+        target.supported = True
+        return {_tagged(model.get("name") or model.get("model", "")) for model in reply.get("models", [])}
+
+    def _preload(self, target: WarmTarget):
+        """Load the model if needed and push its expiry keep_alive into the future"""
+        started = time.perf_counter()
+        try:
+            self._request(
+                f"{target.native_url}/api/generate",
+                {"model": target.model, "keep_alive": self.keep_alive},
+                timeout=PRELOAD_TIMEOUT_S
+            )
+        except Exception as e:
+            target.last_error = str(e)
+            print(f"Could not preload {target.model} on {target.url}: {e}")
+            return
+        target.last_preload_s = time.perf_counter() - started
+        target.last_keep_alive = time.time()
+        target.loaded = True
+        target.last_error = None
+        metrics.llm_preload_seconds.observe(target.last_preload_s, model=target.model)
+
+    def refresh(self, target: WarmTarget, warm: bool):
+        """One round for a target: update its loaded state and, during warm hours, keep it loaded"""
+        models = self._loaded_models(target)
+        if models is None:
+            return
+        target.loaded = _tagged(target.model) in models
+        if not warm:
+            return
+        if not target.loaded and target.last_keep_alive is not None:
+            # It was kept warm before, so something evicted it in between
+            target.cold_starts += 1
+            metrics.llm_cold_starts.inc(model=target.model, detected="keepalive")
+            print(f"LLM model {target.model} on {target.url} was unloaded; reloading")
+        self._preload(target)
+
+    async def run_once(self, warm: Optional[bool] = None):
+        """Refresh every target; warm defaults to whether it is working hours now"""
+        warm = self.in_warm_hours() if warm is None else warm
+        await asyncio.gather(*(
+            asyncio.to_thread(self.refresh, target, warm) for target in self.targets.values()
+        ))
+
+    async def _run(self):
+        # Preload at startup whatever the hour, so the first request after a deploy is not cold
+        await self.run_once(warm=True)
+        while True:
+            await asyncio.sleep(self.interval_s)
+            await self.run_once()
+
+    def start(self):
+        if self._task is None and self.targets:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def note_request(self, url: str, model: str) -> bool:
+        """Record a request to model on url; returns whether the model was known to be unloaded (a cold start)"""
+        target = self.targets.get((url, model))
+        if target is None or target.loaded is not False:
+            return False
+        # The request itself loads the model
+        target.loaded = True
+        target.cold_starts += 1
+        metrics.llm_cold_starts.inc(model=model, detected="request")
+        return True
+
+    def snapshot(self) -> Dict:
+        return {
+            "running": self._task is not None,
+            "warm_hours": self.in_warm_hours(),
+            "keep_alive": self.keep_alive,
+            "targets": [target.snapshot() for target in self.targets.values()]
+        }
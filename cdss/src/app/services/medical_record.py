@@ -1,17 +1,106 @@
+import asyncio
+import json
 import time
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from openai.types import CompletionUsage
 from app.services.llm import llm_service
-from app.core.config import SUPPORTED_AUDIO_TYPES
-from app.core.exceptions import UnsupportedMediaType, TranscriptionError
-from app.core.i18n import get_language_prompt
+from app.services.condensation import record_condenser
+from app.services.record_store import record_store
+from app.core.config import (
+    SUPPORTED_AUDIO_TYPES, BATCH_MAX_CONCURRENCY, TRANSCRIPT_NORMALIZATION, INFERENCE_SOCKET, RETRIEVAL_ENABLED,
+    SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_ROLES, RECORD_CONTEXT_CACHE_SIZE, STRUCTURED_OUTPUT_ENABLED,
+    STRUCTURED_MAX_RETRIES
+)
+from app.core.tracing import span
+from app.core.deadline import check_deadline
+from app.core import metrics
+from app.core.singleflight import SingleFlight, content_key
+from app.core.stats import cache_stats
+from app.core.exceptions import UnsupportedMediaType, TranscriptionError, LLMServiceError
+from app.core.i18n import get_medical_record_sections
+from app.core import prompts
+from app.utils.record_sections import extract_json_object, json_record, parse_sections, render_sections, section_text
+from app.utils.section_stream import SectionStreamValidator
+from app.utils.transcript_normalizer import normalize_transcript
+from app.utils.audio import audio_duration
 
 class MedicalRecordService:
-    async def process_voice_files(self, files: List[bytes], content_types: List[str], language: str = "zh") -> str:
-        """Process voice files with language awareness"""
-        try:
-            from app.services.asr import asr_service
-        except ImportError:
-            raise RuntimeError("ASR service not available in lightweight mode")
+    def __init__(self):
+        # Shared by all batch requests so that backfills cannot crowd out interactive traffic
+        self._batch_slots = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+        self.batch_in_flight = 0
+        # The same file uploaded twice at once (e.g. a frontend retry) is recognised once
+        self._asr_flight = SingleFlight("asr")
+        self._ocr_flight = SingleFlight("ocr")
+        # Validated generations cannot share an LLM call, so identical records are coalesced here instead
+        self._record_flight = SingleFlight("medical_record")
+        # (record_id, language) -> (updated_at, stored record prepared for prompting, condensed if long)
+        self._record_contexts: OrderedDict = OrderedDict()
+
+    async def save_record(self, content: str, language: str, is_json: bool) -> str:
+        """Store a generated medical record and return its record_id"""
+        return await asyncio.to_thread(record_store.save, content, language, is_json)
+
+    async def update_record(self, record_id: str, content: str, is_json: Optional[bool] = None):
+        # Cached contexts of the record, in this worker or any other, go stale through its updated_at
+        await asyncio.to_thread(record_store.update, record_id, content, is_json)
+
+    async def load_record(self, record_id: str) -> str:
+        """The text of a stored medical record; raises RecordNotFound"""
+        return (await asyncio.to_thread(record_store.get, record_id))["content"]
+
+    async def _prepared_record(self, record_id: str, language: str) -> str:
+        """
+        A stored record ready for the query context, cached so that chat turns skip loading and condensing it.
+
+        Every hit is checked against the record's updated_at, so an update made through
+        any worker is seen by all of them.
+        """
+        key = (record_id, language)
+        updated_at = await asyncio.to_thread(record_store.updated_at, record_id)
+        cached = self._record_contexts.get(key)
+        if cached is not None and cached[0] == updated_at:
+            self._record_contexts.move_to_end(key)
+            cache_stats("record_context").hit()
+            return cached[1]
+        cache_stats("record_context").miss()
+        record = await asyncio.to_thread(record_store.get, record_id)
+        prepared = await record_condenser.condense(record["content"], language)
+        self._record_contexts[key] = (record["updated_at"], prepared)
+        self._record_contexts.move_to_end(key)
+        while len(self._record_contexts) > RECORD_CONTEXT_CACHE_SIZE:
+            self._record_contexts.popitem(last=False)
+        return prepared
+
+    def _normalize_transcript(self, transcript: str, language: str) -> Tuple[str, int]:
+        """Return the cleaned ASR transcript and the number of tokens the cleanup saved"""
+        if not TRANSCRIPT_NORMALIZATION:
+            return transcript, 0
+        with span("normalize"):
+            normalized = normalize_transcript(transcript, language)
+        return normalized.text, normalized.tokens_saved
+
+    async def process_voice_files(
+        self,
+        files: List[bytes],
+        content_types: List[str],
+        language: str = "zh"
+    ) -> Tuple[str, int]:
+        """
+        Process voice files with language awareness.
+
+        Returns the transcript, normalised when TRANSCRIPT_NORMALIZATION is on, and the
+        number of prompt tokens the normalisation saved. Only speech is normalised:
+        OCR text and typed transcripts are passed to the LLM as they are.
+        """
+        if INFERENCE_SOCKET:
+            from app.services.inference_client import inference_client as asr_service
+        else:
+            try:
+                from app.services.asr import asr_service
+            except ImportError:
+                raise RuntimeError("ASR service not available in lightweight mode")
             
         transcripts = []
         
@@ -19,26 +108,54 @@ class MedicalRecordService:
             if content_type not in SUPPORTED_AUDIO_TYPES:
                 raise UnsupportedMediaType(content_type)
                 
+            # Files still waiting are dropped once the request is out of time or cancelled
+            check_deadline("ASR")
             # Pass language to ASR service
-            transcript = await asr_service.transcribe_voice(file_content, language)
+            started = time.perf_counter()
+            with span("asr", content_type=content_type, bytes=len(file_content)) as current:
+                transcript, shared = await self._asr_flight.do(
+                    content_key("asr", file_content, language),
+                    lambda: asr_service.transcribe_voice(file_content, language)
+                )
+                if current is not None:
+                    current.attributes["coalesced"] = shared
+            elapsed = time.perf_counter() - started
+            if not shared:
+                metrics.asr_seconds.observe(elapsed, language=language)
+                duration = audio_duration(file_content)
+                if duration:
+                    metrics.asr_real_time_factor.observe(elapsed / duration, language=language)
             if not transcript:
                 raise TranscriptionError("ASR", "Empty transcript")
             transcripts.append(transcript)
         
-        return "\n".join(transcripts)
+        return self._normalize_transcript("\n".join(transcripts), language)
 
     async def process_image_files(self, files: List[bytes], language: str = "zh") -> str:
         """Process image files with language awareness"""
-        try:
-            from app.services.ocr import ocr_service
-        except ImportError:
-            raise RuntimeError("OCR service not available in lightweight mode")
+        if INFERENCE_SOCKET:
+            from app.services.inference_client import inference_client as ocr_service
+        else:
+            try:
+                from app.services.ocr import ocr_service
+            except ImportError:
+                raise RuntimeError("OCR service not available in lightweight mode")
             
         transcripts = []
         
         for file_content in files:
+            check_deadline("OCR")
             # Pass language to OCR service
-            transcript = await ocr_service.transcribe_image(file_content, language)
+            started = time.perf_counter()
+            with span("ocr", bytes=len(file_content)) as current:
+                transcript, shared = await self._ocr_flight.do(
+                    content_key("ocr", file_content, language),
+                    lambda: ocr_service.transcribe_image(file_content, language)
+                )
+                if current is not None:
+                    current.attributes["coalesced"] = shared
+            if not shared:
+                metrics.ocr_seconds.observe(time.perf_counter() - started, language=language)
             if not transcript:
                 raise TranscriptionError("OCR", "Empty transcript")
             transcripts.append(transcript)
@@ -50,34 +167,223 @@ class MedicalRecordService:
         transcript: str,
         medical_records: Optional[str] = None,
         language: str = "zh",
-        is_json: bool = True
+        is_json: bool = True,
+        endpoint: str = "/t2mr"
     ) -> Dict:
         """Generate medical record from transcript and additional records"""
-        # Get language-specific prompts
-        context_str = get_language_prompt(language, 'doctor_context')
-        format_prompt = get_language_prompt(language, 'mr_format')
-        format_detail = get_language_prompt(language, 'mr_format_detail')
+        medical_records = await record_condenser.condense(medical_records, language)
+
+        structured = is_json and STRUCTURED_OUTPUT_ENABLED
+        with span("prompt_build"):
+            # Precompiled instructions first, the transcript last, so the prefix is cacheable
+            messages = prompts.medical_record_messages(language, transcript, medical_records, structured)
+
+        if structured:
+            result, _ = await self._record_flight.do(
+                content_key("structured", messages, language, endpoint),
+                lambda: self._generate_structured_record(messages, language, endpoint)
+            )
+        else:
+            result = await llm_service.generate_completion(
+                messages=messages,
+                system_context=prompts.role_context(language, "doctor", is_json),
+                is_json=is_json,
+                language=language,
+                endpoint=endpoint,
+                role="doctor"
+            )
         
-        # Construct the prompt
-        prompt = f"{format_prompt}\n{format_detail}\n\n{transcript}"
-        if medical_records:
-            prompt += f"\n\nAdditional medical records:\n{medical_records}"
+        return {
+            "content": result["content"],
+            "timestamp": int(time.time()),
+            "prompt_tokens": result["usage"].prompt_tokens,
+            "completion_tokens": result["usage"].completion_tokens,
+            "total_tokens": result["usage"].total_tokens,
+            "degraded": result.get("degraded", False)
+        }
 
-        # Create messages list
-        messages = [{"role": "user", "content": prompt}]
+    async def _generate_structured_record(self, messages: List[Dict], language: str, endpoint: str) -> Dict:
+        """
+        Generate a JSON medical record whose keys are exactly the language's sections.
+
+        The completion is streamed through a SectionStreamValidator and stopped as
+        soon as it goes off-schema (unknown or repeated section, broken JSON,
+        chatter). Sections completed before that point are kept and only the
+        missing ones are asked for again, up to STRUCTURED_MAX_RETRIES times, after
+        the original messages so the retry reuses their cached prefix. A record
+        that closes cleanly without some sections is accepted as written.
+        """
+        schema = get_medical_record_sections(language)
+        sections: Dict[str, Any] = {}
+        missing = schema
+        results = []
+        for attempt in range(STRUCTURED_MAX_RETRIES + 1):
+            if attempt:
+                metrics.structured_section_retries.inc(len(missing), language=language)
+            validator = SectionStreamValidator(missing)
+            result = await llm_service.generate_completion(
+                messages=messages if not attempt else prompts.section_retry_messages(language, messages, missing),
+                system_context=prompts.role_context(language, "doctor", True),
+                is_json=True,
+                language=language,
+                validator=validator,
+                endpoint=endpoint,
+                role="doctor"
+            )
+            results.append(result)
+            # Validate what was actually returned, which is also all that was streamed
+            validator.reset()
+            validator.feed(result["content"])
+            if validator.error:
+                print(f"Medical record went off-schema: {validator.error}")
+            sections.update(validator.sections)
+            missing = validator.missing
+            failed = bool(validator.error) or not validator.done
+            # Sections left out of a complete object (e.g. no TCM findings) are not worth another call
+            if not missing or not failed:
+                break
+
+        if failed:
+            outcome = "incomplete"
+        else:
+            outcome = "valid" if len(results) == 1 else "repaired"
+        metrics.structured_outputs.inc(outcome=outcome)
+
+        prompt_tokens = sum(r["usage"].prompt_tokens for r in results)
+        completion_tokens = sum(r["usage"].completion_tokens for r in results)
+        return {
+            # Nothing usable in any attempt: hand back the first reply as generated
+            "content": render_sections(
+                {name: sections[name] for name in schema if name in sections}, True
+            ) if sections else results[0]["content"],
+            "usage": CompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            ),
+            "degraded": any(r.get("degraded", False) for r in results)
+        }
+
+    async def generate_medical_records_batch(
+        self,
+        items: List[Dict],
+        concurrency: int
+    ) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[Exception]]]:
+        """
+        Generate medical records for many transcripts with bounded concurrency.
+
+        Args:
+            items: List of generate_medical_record keyword arguments
+            concurrency: Maximum number of items of this batch in flight at once
+
+        Yields:
+            Tuples of (item index, result, error) in completion order. Exactly one of
+            result and error is set, so one failing item does not fail the batch.
+        """
+        pending: asyncio.Queue = asyncio.Queue()
+        for index, item in enumerate(items):
+            pending.put_nowait((index, item))
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            while True:
+                try:
+                    index, item = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                async with self._batch_slots:
+                    self.batch_in_flight += 1
+                    try:
+                        result = await self.generate_medical_record(**item)
+                        finished.put_nowait((index, result, None))
+                    except Exception as e:
+                        finished.put_nowait((index, None, e))
+                    finally:
+                        self.batch_in_flight -= 1
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(items))))]
+        try:
+            for _ in range(len(items)):
+                yield await finished.get()
+        finally:
+            # Stop scheduling new items if the consumer goes away (e.g. client disconnect)
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def update_medical_record(
+        self,
+        existing_record: str,
+        transcript_delta: str,
+        medical_records: Optional[str] = None,
+        language: str = "zh",
+        is_json: bool = True
+    ) -> Dict:
+        """
+        Update an existing medical record with the newly appended part of a transcript.
+
+        Only the existing sections and the transcript delta are sent to the LLM,
+        which returns just the sections that change. The reply is merged into the
+        existing record locally, so follow-up turns cost a fraction of a full
+        regeneration. Sections the update does not touch keep their values as they
+        were, nested JSON included.
+        """
+        # JSON values as stored, so untouched sections are written back unchanged
+        preamble, sections = parse_sections(existing_record, keep_values=True)
+        if not sections:
+            # Nothing to merge into, so regenerate with the old record as extra context
+            combined_records = "\n\n".join(filter(None, [existing_record, medical_records]))
+            response = await self.generate_medical_record(
+                transcript=transcript_delta,
+                medical_records=combined_records,
+                language=language,
+                is_json=is_json,
+                endpoint="/t2mr/update"
+            )
+            _, new_sections = parse_sections(response["content"])
+            response["sections"] = {name: "changed" for name in new_sections}
+            return response
+
+        medical_records = await record_condenser.condense(medical_records, language)
+        messages = prompts.medical_record_update_messages(
+            language, json.dumps(sections, ensure_ascii=False), transcript_delta, medical_records
+        )
 
         result = await llm_service.generate_completion(
             messages=messages,
-            system_context=context_str,
-            is_json=is_json
+            system_context=prompts.role_context(language, "doctor", True),
+            is_json=True,
+            language=language,
+            endpoint="/t2mr/update",
+            role="doctor"
         )
-        
+
+        updates = extract_json_object(result["content"])
+        if updates is None:
+            # Merging nothing would return the old record as if it were current
+            raise LLMServiceError("Update", "reply is not a JSON object of changed sections")
+        known_sections = list(sections) + [
+            name for name in get_medical_record_sections(language) if name not in sections
+        ]
+        merged = dict(sections)
+        markers = {name: "unchanged" for name in sections}
+        for name in known_sections:
+            if name not in updates:
+                continue
+            value = updates[name].strip() if isinstance(updates[name], str) else updates[name]
+            if section_text(value).strip() != section_text(sections.get(name, "")).strip():
+                merged[name] = value
+                markers[name] = "changed"
+
+        unchanged = "changed" not in markers.values() and is_json == (json_record(existing_record) is not None)
         return {
-            "content": result["content"],
+            "content": existing_record if unchanged else render_sections(merged, is_json, preamble, language),
+            "sections": markers,
             "timestamp": int(time.time()),
             "prompt_tokens": result["usage"].prompt_tokens,
             "completion_tokens": result["usage"].completion_tokens,
-            "total_tokens": result["usage"].total_tokens
+            "total_tokens": result["usage"].total_tokens,
+            "degraded": result.get("degraded", False)
         }
 
     async def process_chat(
@@ -87,29 +393,67 @@ class MedicalRecordService:
         medical_records: Optional[str] = None,
         session_id: Optional[str] = None,
         history: Optional[List[str]] = None,
-        language: str = "zh"
+        language: str = "zh",
+        allow_degrade: bool = False,
+        use_semantic_cache: bool = False,
+        record_id: Optional[str] = None,
+        endpoint: str = "/query"
     ) -> Dict:
-        """Process chat messages and return response"""
-        # Get language-specific context
-        context_str = get_language_prompt(language, f'{role}_context')
-        
-        # Build messages list
-        messages = []
-        if history:
-            messages.append({"role": "assistant", "content": '\n'.join(history)})
-        
-        # Add medical records context if provided
-        if medical_records:
-            query_context = get_language_prompt(language, f'{role}_query_context')
-            context_with_records = query_context.format(medical_records=medical_records)
-            messages.append({"role": "system", "content": context_with_records})
-            
-        messages.append({"role": "user", "content": prompt})
+        """
+        Process chat messages and return response.
+
+        record_id refers to a stored medical record and takes precedence over medical_records.
+        allow_degrade lets the fallback model answer under load. With use_semantic_cache,
+        answers to earlier similar questions are reused, unless the question comes with
+        patient-specific medical records or history. endpoint, with role, lets the model
+        router send trivial questions to the fastest model.
+        """
+        if record_id:
+            medical_records = await self._prepared_record(record_id, language)
+        else:
+            # Long histories are condensed once per patient and reused by later turns
+            medical_records = await record_condenser.condense(medical_records, language)
+
+        cacheable = (
+            use_semantic_cache and SEMANTIC_CACHE_ENABLED and role in SEMANTIC_CACHE_ROLES
+            and not medical_records and not history
+        )
+        if cacheable:
+            from app.services.semantic_cache import semantic_cache
+            with span("semantic_cache"):
+                cached, vector = await asyncio.to_thread(semantic_cache.lookup, language, role, prompt)
+            if cached is not None:
+                return {
+                    "session_id": session_id,
+                    "content": cached,
+                    "timestamp": int(time.time()),
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "total_tokens": 0,
+                    "cached": True
+                }
+
+        retrieved_info = ""
+        if role == "doctor" and RETRIEVAL_ENABLED:
+            from app.services.retrieval import retrieval_service
+            with span("retrieve"):
+                retrieved_info = await asyncio.to_thread(retrieval_service.retrieve, prompt)
+
+        # Role context and records stay byte-identical across turns; history and the question follow
+        messages = prompts.chat_messages(language, role, prompt, medical_records, history, retrieved_info)
 
         result = await llm_service.generate_completion(
             messages=messages,
-            system_context=context_str
+            system_context=prompts.role_context(language, role),
+            language=language,
+            allow_degrade=allow_degrade,
+            session_id=session_id,
+            endpoint=endpoint,
+            role=role
         )
+        if cacheable and vector is not None and not result.get("degraded", False):
+            # Answers of the light fallback model are not kept for later patients
+            semantic_cache.store(language, role, prompt, vector, result["content"])
         
         return {
             "session_id": session_id,
@@ -117,7 +461,8 @@ class MedicalRecordService:
             "timestamp": int(time.time()),
             "prompt_tokens": result["usage"].prompt_tokens,
             "completion_tokens": result["usage"].completion_tokens,
-            "total_tokens": result["usage"].total_tokens
+            "total_tokens": result["usage"].total_tokens,
+            "degraded": result.get("degraded", False)
         }
 
 # Create a singleton instance
@@ -1,7 +1,10 @@
+import asyncio
+from typing import Dict, List
 from paddleocr import PaddleOCR
 from app.core.exceptions import TranscriptionError
 from app.core.i18n import SUPPORTED_LANGUAGES
 from app.core.config import LANGUAGE_MODEL_CONFIG
+from app.core.tracing import span
 
 class OCRService:
     _instance = None
@@ -49,6 +52,18 @@ class OCRService:
             if language != "zh":  # Only fall back for non-Chinese
                 self._models[language] = {"type": "external", "language": language}
 
+    def loaded_models(self) -> Dict[str, str]:
+        """Language -> engine of the OCR models loaded in this process"""
+        loaded = {}
+        for language, model in self._models.items():
+            loaded[language] = model.get("type", "unknown") if isinstance(model, dict) else type(model).__name__
+        return loaded
+
+    def warm_up(self, languages: List[str]):
+        """Load the OCR models for the given languages ahead of the first request"""
+        for language in languages:
+            self._initialize_model(language)
+
     async def transcribe_image(self, image_file: bytes, language: str = "zh") -> str:
         """Transcribe image file to text with language awareness"""
         if language not in SUPPORTED_LANGUAGES:
@@ -56,14 +71,16 @@ class OCRService:
 
         # Lazy initialization of the model
         if language not in self._models:
-            self._initialize_model(language)
+            with span("ocr.load", language=language):
+                self._initialize_model(language)
 
         # If model initialization failed or is disabled, try Chinese as fallback
         if language not in self._models and language != "zh":
             print(f"No OCR model available for {language}, falling back to Chinese")
             language = "zh"
             if language not in self._models:
-                self._initialize_model(language)
+                with span("ocr.load", language=language):
+                    self._initialize_model(language)
 
         model = self._models.get(language)
         if not model:
@@ -74,8 +91,9 @@ class OCRService:
                 # Route to external OCR service
                 return await self._transcribe_external(image_file, language)
             else:
-                # Use PaddleOCR
-                result = model.ocr(image_file, cls=True)
+                # Use PaddleOCR; inference runs in a thread to keep the event loop free
+                with span("ocr.infer", engine="paddleocr"):
+                    result = await asyncio.to_thread(model.ocr, image_file, cls=True)
                 if not result:
                     raise TranscriptionError("OCR", "Empty transcription result")
 
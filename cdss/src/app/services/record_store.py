@@ -0,0 +1,101 @@
+"""
+Local SQLite store of generated medical records
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+from app.core.config import RECORD_STORE_PATH
+from app.core.exceptions import RecordNotFound
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    language TEXT NOT NULL,
+    is_json INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+class RecordStore:
+    def __init__(self, path: str = RECORD_STORE_PATH):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use, so importing the app never creates the database file
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(SCHEMA)
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def save(self, content: str, language: str, is_json: bool) -> str:
+        """Store a new record and return its id"""
+        record_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT INTO records (id, content, language, is_json, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (record_id, content, language, int(is_json), now, now)
+            )
+            connection.commit()
+        return record_id
+
+    def update(self, record_id: str, content: str, is_json: Optional[bool] = None):
+        """Replace a record's content, and its format when is_json is given"""
+        with self._lock:
+            connection = self._connect()
+            if is_json is None:
+                cursor = connection.execute(
+                    "UPDATE records SET content = ?, updated_at = ? WHERE id = ?", (content, time.time(), record_id)
+                )
+            else:
+                cursor = connection.execute(
+                    "UPDATE records SET content = ?, is_json = ?, updated_at = ? WHERE id = ?",
+                    (content, int(is_json), time.time(), record_id)
+                )
+            connection.commit()
+        if cursor.rowcount == 0:
+            raise RecordNotFound(record_id)
+
+    def updated_at(self, record_id: str) -> float:
+        """When the record was last written; a cheap check of whether a cached copy is still current"""
+        with self._lock:
+            row = self._connect().execute("SELECT updated_at FROM records WHERE id = ?", (record_id,)).fetchone()
+        if row is None:
+            raise RecordNotFound(record_id)
+        return row[0]
+
+    def get(self, record_id: str) -> Dict:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT content, language, is_json, created_at, updated_at FROM records WHERE id = ?", (record_id,)
+            ).fetchone()
+        if row is None:
+            raise RecordNotFound(record_id)
+        content, language, is_json, created_at, updated_at = row
+        return {
+            "record_id": record_id,
+            "content": content,
+            "language": language,
+            "is_json": bool(is_json),
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+record_store = RecordStore()
@@ -0,0 +1,232 @@
+"""
+Local retrieval over a folder of clinical guideline documents
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+import numpy as np
+from app.core.config import (
+    RETRIEVAL_DOCS_DIR, RETRIEVAL_INDEX_DIR, RETRIEVAL_CHUNK_CHARS,
+    RETRIEVAL_CHUNK_OVERLAP, RETRIEVAL_TOP_K, RETRIEVAL_MIN_SCORE, RETRIEVAL_MAX_CHARS, RETRIEVAL_ANN_MIN_ROWS
+)
+from app.core import metrics
+from app.services.embeddings import get_embedder
+
+DOCUMENT_SUFFIXES = (".txt", ".md")
+
+class Hit(NamedTuple):
+    score: float
+    source: str
+    text: str
+
+def chunk_text(text: str, size: int = RETRIEVAL_CHUNK_CHARS, overlap: int = RETRIEVAL_CHUNK_OVERLAP) -> List[str]:
+    """Pack paragraphs into chunks of about size characters; consecutive chunks share overlap characters"""
+    overlap = min(overlap, size // 2)
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        # Paragraphs longer than a chunk are cut with the same overlap
+        for start in range(0, max(len(paragraph) - overlap, 1), size - overlap):
+            if paragraph[start:start + size]:
+                pieces.append(paragraph[start:start + size])
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > size:
+            chunks.append(current)
+            current = f"{current[-overlap:]}\n{piece}" if overlap else piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _write_json(path: Path, data):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+class RetrievalIndex:
+    def __init__(
+        self,
+        docs_dir: str,
+        index_dir: str,
+        embedder,
+        chunk_chars: int = RETRIEVAL_CHUNK_CHARS,
+        chunk_overlap: int = RETRIEVAL_CHUNK_OVERLAP,
+        ann_min_rows: int = RETRIEVAL_ANN_MIN_ROWS
+    ):
+        self.docs_dir = Path(docs_dir)
+        self.embedder = embedder
+        self.chunk_chars = chunk_chars
+        self.chunk_overlap = chunk_overlap
+        self.ann_min_rows = ann_min_rows
+        # One directory per embedder, since vectors of different models do not mix
+        self.dir = Path(index_dir) / re.sub(r"[^\w.-]+", "_", embedder.name)
+        self.cache_dir = self.dir / "files"
+        self.matrix: Optional[np.ndarray] = None
+        self.chunks: List[Dict] = []
+        self.ann = None
+
+    def _file_key(self, content: bytes) -> str:
+        digest = hashlib.blake2b(content, digest_size=16)
+        digest.update(f"{self.chunk_chars}:{self.chunk_overlap}".encode())
+        return digest.hexdigest()
+
+    def _load_or_embed(self, key: str, content: bytes, stats: Dict) -> tuple:
+        vectors_path, chunks_path = self.cache_dir / f"{key}.npy", self.cache_dir / f"{key}.json"
+        if vectors_path.exists() and chunks_path.exists():
+            stats["reused"] += 1
+            return np.load(vectors_path), json.loads(chunks_path.read_text(encoding="utf-8"))
+        chunks = chunk_text(content.decode("utf-8", errors="ignore"), self.chunk_chars, self.chunk_overlap)
+        vectors = self.embedder.encode(chunks) if chunks else np.zeros((0, 0), dtype=np.float32)
+        np.save(vectors_path, vectors)
+        _write_json(chunks_path, chunks)
+        stats["embedded"] += 1
+        return vectors, chunks
+
+    def build(self) -> Dict:
+        """Bring the index up to date with the documents folder and open it"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # One builder at a time; the others then find the index up to date
+        with open(self.dir / "build.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return self._build()
+
+    def _build(self) -> Dict:
+        started = time.perf_counter()
+        manifest_path = self.dir / "manifest.json"
+        matrix_path = self.dir / "vectors.f32"
+        previous = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+        known = {entry["path"]: entry for entry in previous.get("files", [])}
+
+        files = sorted(
+            path for path in self.docs_dir.rglob("*") if path.is_file() and path.suffix.lower() in DOCUMENT_SUFFIXES
+        )
+        entries = []
+        for path in files:
+            relative = path.relative_to(self.docs_dir).as_posix()
+            stat = path.stat()
+            entry = known.get(relative)
+            # Unchanged size and mtime: trust the recorded hash instead of reading the file
+            if not (entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns):
+                entry = {"path": relative, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                         "key": self._file_key(path.read_bytes())}
+            entries.append(entry)
+
+        stats = {"files": len(entries), "embedded": 0, "reused": 0, "rebuilt": False}
+        keys = [(entry["path"], entry["key"]) for entry in entries]
+        if keys != [(entry["path"], entry["key"]) for entry in previous.get("files", [])] or not matrix_path.exists():
+            vectors, chunks = [], []
+            for entry in entries:
+                content = (self.docs_dir / entry["path"]).read_bytes()
+                file_vectors, file_chunks = self._load_or_embed(entry["key"], content, stats)
+                vectors.extend(file_vectors)
+                chunks.extend({"source": entry["path"], "text": text} for text in file_chunks)
+            dim = len(vectors[0]) if vectors else 0
+            # Written aside and renamed: other processes may have the current matrix mapped
+            tmp = matrix_path.with_suffix(".f32.tmp")
+            if vectors:
+                matrix = np.memmap(tmp, dtype=np.float32, mode="w+", shape=(len(vectors), dim))
+                matrix[:] = np.stack(vectors)
+                matrix.flush()
+                del matrix
+            else:
+                tmp.write_bytes(b"")
+            os.replace(tmp, matrix_path)
+            (self.dir / "ann.faiss").unlink(missing_ok=True)
+            _write_json(self.dir / "chunks.json", chunks)
+            _write_json(manifest_path, {"files": entries, "rows": len(chunks), "dim": dim})
+            stats["rebuilt"] = True
+        elif entries != previous.get("files"):
+            # Touched but unchanged files: only remember their new mtimes
+            _write_json(manifest_path, {**previous, "files": entries})
+
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        self.chunks = json.loads((self.dir / "chunks.json").read_text(encoding="utf-8"))
+        self.matrix = (
+            np.memmap(matrix_path, dtype=np.float32, mode="r", shape=(manifest["rows"], manifest["dim"]))
+            if manifest["rows"] else None
+        )
+        self.ann = self._open_ann() if manifest["rows"] >= self.ann_min_rows else None
+        stats["chunks"] = len(self.chunks)
+        stats["seconds"] = time.perf_counter() - started
+        return stats
+
+    def _open_ann(self):
+        if find_spec("faiss") is None:
+            return None
+        import faiss
+        path = self.dir / "ann.faiss"
+        if path.exists():
+            return faiss.read_index(str(path))
+        index = faiss.IndexHNSWFlat(self.matrix.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+        index.add(np.ascontiguousarray(self.matrix))
+        tmp = path.with_suffix(".faiss.tmp")
+        faiss.write_index(index, str(tmp))
+        os.replace(tmp, path)
+        return index
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K, min_score: float = RETRIEVAL_MIN_SCORE) -> List[Hit]:
+        if self.matrix is None or not query.strip():
+            return []
+        vector = self.embedder.encode([query])[0]
+        k = min(k, len(self.chunks))
+        if self.ann is not None:
+            scores, rows = self.ann.search(vector[None, :], k)
+            ranked = [(float(score), int(row)) for score, row in zip(scores[0], rows[0]) if row >= 0]
+        else:
+            scores = self.matrix @ vector
+            top = np.argpartition(-scores, k - 1)[:k]
+            ranked = sorted(((float(scores[row]), int(row)) for row in top), reverse=True)
+        return [
+            Hit(score, self.chunks[row]["source"], self.chunks[row]["text"])
+            for score, row in ranked if score >= min_score
+        ]
+
+class RetrievalService:
+    def __init__(self, docs_dir: str = RETRIEVAL_DOCS_DIR, index_dir: str = RETRIEVAL_INDEX_DIR):
+        self.docs_dir = docs_dir
+        self.index_dir = index_dir
+        self._index: Optional[RetrievalIndex] = None
+        self._lock = threading.Lock()
+
+    def ensure_index(self) -> RetrievalIndex:
+        """Build (or update) and open the index once per process"""
+        with self._lock:
+            if self._index is None:
+                index = RetrievalIndex(self.docs_dir, self.index_dir, get_embedder())
+                stats = index.build()
+                print(
+                    f"Retrieval index ready: {stats['chunks']} chunks from {stats['files']} documents "
+                    f"({stats['embedded']} embedded) in {stats['seconds']:.1f}s"
+                )
+                self._index = index
+            return self._index
+
+    def retrieve(self, query: str, k: int = RETRIEVAL_TOP_K, max_chars: int = RETRIEVAL_MAX_CHARS) -> str:
+        """The best matching guideline passages for query, formatted for the doctor query context"""
+        started = time.perf_counter()
+        hits = self.ensure_index().search(query, k)
+        metrics.retrieval_seconds.observe(time.perf_counter() - started)
+        passages, used = [], 0
+        for hit in hits:
+            passage = f"[{hit.source}] {hit.text}"
+            if passages and used + len(passage) > max_chars:
+                break
+            passages.append(passage)
+            used += len(passage)
+        return "\n\n".join(passages)
+
+retrieval_service = RetrievalService()
+
+if __name__ == "__main__":
+    stats = RetrievalIndex(RETRIEVAL_DOCS_DIR, RETRIEVAL_INDEX_DIR, get_embedder()).build()
+    print(json.dumps(stats))
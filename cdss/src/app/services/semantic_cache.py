@@ -0,0 +1,134 @@
+"""
+Semantic cache of /query answers
+"""
+
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TTL_S
+from app.core.i18n import get_negations
+from app.core.stats import cache_stats
+from app.core import metrics
+from app.services.embeddings import get_embedder
+
+# Arabic digits (with decimals) and runs of Chinese numerals
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)*|[零〇一二三四五六七八九十百千万两半]+')
+_WORD = re.compile(r"n't|n'|\w+")
+# "don't" -> "do n't", "n'est" -> "n' est", so contractions count as negations
+_CONTRACTION = re.compile(r"n't\b|\bn'")
+
+def guard_key(prompt: str, language: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """The numbers and negations of a prompt; a cached answer is only served when they match exactly"""
+    text = prompt.lower()
+    numbers = tuple(number.replace(",", ".") for number in _NUMBER.findall(text))
+    negations = get_negations(language)
+    if language in ("zh", "th"):
+        # Written without spaces: count every occurrence, longest words first
+        found = []
+        for word in sorted(negations, key=len, reverse=True):
+            found.extend([word] * text.count(word))
+            text = text.replace(word, " ")
+    else:
+        text = _CONTRACTION.sub(lambda match: f" {match.group(0)} ", text)
+        found = [word for word in _WORD.findall(text) if word in negations]
+    return numbers, tuple(sorted(found))
+
+class _Scope:
+    def __init__(self, capacity: int, dim: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.answers: List[Optional[str]] = [None] * capacity
+        self.keys: List[Optional[tuple]] = [None] * capacity
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.created_at = np.zeros(capacity, dtype=np.float64)
+        self.size = 0
+
+class SemanticCache:
+    def __init__(
+        self,
+        capacity: int = SEMANTIC_CACHE_SIZE,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl_s: float = SEMANTIC_CACHE_TTL_S,
+        embedder=None
+    ):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self._embedder = embedder
+        self._scopes: Dict[Tuple[str, str], _Scope] = {}
+        self._tick = 0
+        self._lock = threading.Lock()
+        self._refused = False
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = get_embedder()
+        return self._embedder
+
+    @property
+    def available(self) -> bool:
+        """False when only the feature-hashing embedder is available (e.g. the model failed to load)"""
+        if getattr(self.embedder, "semantic", False):
+            return True
+        if not self._refused:
+            self._refused = True
+            print(f"Semantic cache disabled: {self.embedder.name} cannot tell similar questions apart")
+        return False
+
+    def embed(self, prompt: str) -> np.ndarray:
+        return self.embedder.encode([" ".join(prompt.split())])[0]
+
+    def lookup(self, language: str, role: str, prompt: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Return (the cached answer of the most similar earlier prompt or None, the prompt's vector).
+
+        The vector is None when the cache is not available; nothing should be stored then.
+        """
+        if not self.available:
+            return None, None
+        vector = self.embed(prompt)
+        key = guard_key(prompt, language)
+        answer = None
+        with self._lock:
+            scope = self._scopes.get((language, role))
+            if scope is not None and scope.size:
+                scores = scope.vectors[:scope.size] @ vector
+                scores[time.time() - scope.created_at[:scope.size] > self.ttl_s] = -1.0
+                # Similar wording is not enough: numbers and negations must be the same
+                scores[[stored != key for stored in scope.keys[:scope.size]]] = -1.0
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._tick += 1
+                    scope.last_used[best] = self._tick
+                    answer = scope.answers[best]
+        if answer is None:
+            cache_stats("semantic").miss()
+        else:
+            cache_stats("semantic").hit()
+        metrics.semantic_cache_lookups.inc(language=language, role=role, result="miss" if answer is None else "hit")
+        return answer, vector
+
+    def store(self, language: str, role: str, prompt: str, vector: np.ndarray, answer: str):
+        """Remember the answer to the prompt embedded as vector, evicting the least recently used one if full"""
+        with self._lock:
+            scope = self._scopes.get((language, role))
+            if scope is None:
+                scope = self._scopes[(language, role)] = _Scope(self.capacity, len(vector))
+            if scope.size < self.capacity:
+                row = scope.size
+                scope.size += 1
+            else:
+                row = int(np.argmin(scope.last_used))
+            self._tick += 1
+            scope.vectors[row] = vector
+            scope.answers[row] = answer
+            scope.keys[row] = guard_key(prompt, language)
+            scope.last_used[row] = self._tick
+            scope.created_at[row] = time.time()
+
+    def __len__(self) -> int:
+        return sum(scope.size for scope in self._scopes.values())
+
+semantic_cache = SemanticCache()
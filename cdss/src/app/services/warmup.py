@@ -0,0 +1,33 @@
+import sys
+import time
+from typing import Dict, List
+from app.core.config import HAS_ASR, HAS_OCR
+
+def warm_up_models(languages: List[str]) -> Dict[str, float]:
+    """
+    Load the ASR/OCR models for the given languages now rather than on first use.
+
+    Returns:
+        Dict of service name to seconds spent loading it
+    """
+    timings = {}
+    if HAS_ASR:
+        started = time.perf_counter()
+        from app.services.asr import asr_service
+        asr_service.warm_up(languages)
+        timings["asr"] = time.perf_counter() - started
+    if HAS_OCR:
+        started = time.perf_counter()
+        from app.services.ocr import ocr_service
+        ocr_service.warm_up(languages)
+        timings["ocr"] = time.perf_counter() - started
+    return timings
+
+def loaded_models() -> Dict[str, Dict[str, str]]:
+    """The ASR/OCR models loaded in this process; never triggers loading them"""
+    models = {}
+    if "app.services.asr" in sys.modules:
+        models["asr"] = sys.modules["app.services.asr"].asr_service.loaded_models()
+    if "app.services.ocr" in sys.modules:
+        models["ocr"] = sys.modules["app.services.ocr"].ocr_service.loaded_models()
+    return models
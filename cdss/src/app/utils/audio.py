@@ -0,0 +1,20 @@
+import io
+import wave
+from typing import Optional
+
+def audio_duration(data: bytes) -> Optional[float]:
+    """
+    Duration of an audio file in seconds, or None when it cannot be read cheaply.
+
+    WAV is read from its header; other formats need the optional soundfile package.
+    """
+    try:
+        with wave.open(io.BytesIO(data)) as f:
+            return f.getnframes() / float(f.getframerate())
+    except (wave.Error, EOFError, ZeroDivisionError):
+        pass
+    try:
+        import soundfile
+        return soundfile.info(io.BytesIO(data)).duration
+    except Exception:
+        return None
@@ -0,0 +1,22 @@
+import asyncio
+import json
+import struct
+from typing import Dict, Tuple
+
+# Frame: header length and payload length as big-endian uint32, then a JSON header
+# and the raw payload bytes (audio or image content), so media is never re-encoded
+_LENGTHS = struct.Struct(">II")
+MAX_HEADER_SIZE = 64 * 1024
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[Dict, bytes]:
+    """Read one frame; raises asyncio.IncompleteReadError when the peer closes"""
+    header_size, payload_size = _LENGTHS.unpack(await reader.readexactly(_LENGTHS.size))
+    if header_size > MAX_HEADER_SIZE:
+        raise ValueError(f"Frame header too large: {header_size} bytes")
+    header = json.loads(await reader.readexactly(header_size))
+    payload = await reader.readexactly(payload_size) if payload_size else b""
+    return header, payload
+
+def encode_frame(header: Dict, payload: bytes = b"") -> bytes:
+    encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return _LENGTHS.pack(len(encoded), len(payload)) + encoded + payload
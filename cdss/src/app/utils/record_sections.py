@@ -0,0 +1,81 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Matches section headers such as "**主诉：** ..." or "##主诉：##"
+SECTION_HEADER = re.compile(r'^\s*(?:\*\*|#{2,})\s*([^*#:：\n]+?)\s*[:：]\s*(?:\*\*|#{2,})\s*(.*)$')
+
+def extract_json_object(text: str) -> Optional[Dict]:
+    """Extract the first JSON object from an LLM reply, ignoring code fences and chatter"""
+    if not text:
+        return None
+    start = text.find('{')
+    end = text.rfind('}')
+    if start == -1 or end < start:
+        return None
+    try:
+        parsed = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+def json_record(record: str) -> Optional[Dict]:
+    """The parsed JSON object of a JSON medical record, or None for a markdown record"""
+    return extract_json_object(record) if record.lstrip().startswith(('{', '```')) else None
+
+def parse_sections(record: str, keep_values: bool = False) -> Tuple[str, Dict[str, Any]]:
+    """
+    Split a medical record into its sections.
+
+    Accepts both the JSON records and the markdown records produced by
+    generate_medical_record.
+
+    Args:
+        keep_values: Keep the sections of a JSON record as their JSON values instead of text
+
+    Returns:
+        Tuple of the preamble before the first section (e.g. the title) and
+        an ordered dict of section name to section content
+    """
+    parsed = json_record(record)
+    if parsed is not None:
+        return "", {str(key): value if keep_values else section_text(value) for key, value in parsed.items()}
+
+    preamble: List[str] = []
+    sections: Dict[str, List[str]] = {}
+    current = None
+    for line in record.splitlines():
+        match = SECTION_HEADER.match(line)
+        if match:
+            current = match.group(1).strip()
+            sections[current] = [match.group(2).strip()] if match.group(2).strip() else []
+        elif current is None:
+            preamble.append(line)
+        else:
+            sections[current].append(line)
+
+    return (
+        "\n".join(preamble).strip(),
+        {name: "\n".join(lines).strip() for name, lines in sections.items()}
+    )
+
+def render_sections(
+    sections: Dict[str, Any],
+    is_json: bool,
+    preamble: str = "",
+    language: str = "zh"
+) -> str:
+    """Render sections back into a JSON or markdown medical record"""
+    if is_json:
+        return json.dumps(sections, ensure_ascii=False, indent=2)
+
+    colon = "：" if language == "zh" else ":"
+    blocks = [preamble] if preamble else []
+    blocks.extend(f"**{name}{colon}** {section_text(content)}" for name, content in sections.items())
+    return "\n\n".join(blocks)
+
+def section_text(value) -> str:
+    """The content of a JSON record section as text; nested values are kept as JSON"""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
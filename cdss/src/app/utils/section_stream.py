@@ -0,0 +1,165 @@
+"""
+Incremental validation of a streamed JSON medical record
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+# Characters of chatter or code fence tolerated before the opening brace
+MAX_PREAMBLE_CHARS = 200
+WHITESPACE = " \t\r\n"
+
+def _normalise(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+class SectionStreamValidator:
+    def __init__(self, sections: List[str]):
+        self.schema = list(sections)
+        self._allowed = {_normalise(name): name for name in sections}
+        self.reset()
+
+    def reset(self):
+        """Forget everything fed so far, e.g. before the stream is retried on another backend"""
+        self.sections: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.done = False
+        self._state = "start"
+        self._buffer: List[str] = []
+        self._key: Optional[str] = None
+        self._preamble = 0
+        self._escape = False
+        self._in_string = False
+        self._depth = 0
+
+    @property
+    def missing(self) -> List[str]:
+        """Schema sections without a valid value so far"""
+        return [name for name in self.schema if name not in self.sections]
+
+    def feed(self, text: str) -> bool:
+        """Validate the next delta; False once the object is complete or off-schema"""
+        if self.done or self.error:
+            return False
+        for char in text:
+            self._step(char)
+            if self.done or self.error:
+                return False
+        return True
+
+    def _fail(self, reason: str):
+        self.error = reason
+
+    def _step(self, char: str):
+        state = self._state
+        if state == "start":
+            if char == "{":
+                self._state = "key_or_end"
+            else:
+                self._preamble += 1
+                if self._preamble > MAX_PREAMBLE_CHARS:
+                    self._fail("no JSON object")
+        elif state in ("key_or_end", "key_or_close"):
+            if char in WHITESPACE:
+                return
+            if char == '"':
+                self._buffer = [char]
+                self._state = "key"
+            elif char == "}" and state == "key_or_end":
+                self.done = True
+            else:
+                self._fail(f"expected a section name, got {char!r}")
+        elif state == "key":
+            self._buffer.append(char)
+            if self._string_closed(char):
+                self._finish_key()
+            elif "\\" not in self._buffer and not any(
+                name.startswith(_normalise("".join(self._buffer[1:]))) for name in self._allowed
+            ):
+                # No section starts like this: fail now rather than at the closing quote.
+                # Keys with escapes (e.g. \u-escaped CJK) are only checked once complete.
+                self._fail(f"unknown section {''.join(self._buffer[1:])!r}")
+        elif state == "colon":
+            if char in WHITESPACE:
+                return
+            if char == ":":
+                self._state = "value"
+            else:
+                self._fail(f"expected ':', got {char!r}")
+        elif state == "value":
+            if char in WHITESPACE:
+                return
+            self._buffer = [char]
+            if char == '"':
+                self._state = "string"
+            elif char in "{[":
+                self._depth = 1
+                self._in_string = False
+                self._state = "nested"
+            elif char in "-0123456789tfn":
+                self._state = "scalar"
+            else:
+                self._fail(f"expected a value, got {char!r}")
+        elif state == "string":
+            self._buffer.append(char)
+            if self._string_closed(char):
+                self._finish_value()
+        elif state == "nested":
+            self._buffer.append(char)
+            if self._in_string:
+                if self._string_closed(char):
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_value()
+        elif state == "scalar":
+            if char in WHITESPACE or char in ",}":
+                self._finish_value()
+                if not self.error:
+                    self._step(char)
+            else:
+                self._buffer.append(char)
+        elif state == "comma_or_end":
+            if char in WHITESPACE:
+                return
+            if char == ",":
+                self._state = "key_or_close"
+            elif char == "}":
+                self.done = True
+            else:
+                self._fail(f"expected ',' or '}}', got {char!r}")
+
+    def _string_closed(self, char: str) -> bool:
+        """Track escapes inside a string; True when char is its closing quote"""
+        if self._escape:
+            self._escape = False
+            return False
+        if char == "\\":
+            self._escape = True
+            return False
+        return char == '"'
+
+    def _finish_key(self):
+        key = json.loads("".join(self._buffer))
+        name = self._allowed.get(_normalise(key))
+        if name is None:
+            self._fail(f"unknown section {key!r}")
+        elif name in self.sections:
+            self._fail(f"repeated section {key!r}")
+        else:
+            self._key = name
+            self._state = "colon"
+
+    def _finish_value(self):
+        try:
+            value = json.loads("".join(self._buffer))
+        except json.JSONDecodeError as e:
+            self._fail(f"invalid value of {self._key!r}: {e.msg}")
+            return
+        # Kept as written: nested objects and lists stay JSON values, not strings
+        self.sections[self._key] = value.strip() if isinstance(value, str) else value
+        self._state = "comma_or_end"
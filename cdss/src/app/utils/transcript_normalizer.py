@@ -0,0 +1,155 @@
+import re
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import List, Tuple
+from app.core.i18n import SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE, get_disfluencies
+from app.utils.tokens import estimate_tokens
+
+# Languages written without spaces between words
+UNSPACED_LANGUAGES = {'zh', 'th'}
+
+# Overlap (in characters) between consecutive recordings shorter than this is left
+# alone, so that ordinary dialogue lines sharing a few words are never merged.
+# Chinese packs a word into one or two characters, so its threshold is lower.
+MIN_SEGMENT_OVERLAP = {'zh': 8}
+DEFAULT_MIN_SEGMENT_OVERLAP = 16
+# How far into the next segment (or before the end of the previous one) the overlap may start
+OVERLAP_SLACK = 4
+# Only this much of each segment is compared when looking for overlap
+OVERLAP_WINDOW = 1000
+
+PAUSE = r'[,，、…\s]|\.\.\.'
+# Start of an utterance: start of the segment or after sentence-ending punctuation
+UTTERANCE_START = r'(^|[.?!:;。？！：；]\s*)'
+COMMA = r'\s*[,，]\s*'
+
+@dataclass
+class NormalizedTranscript:
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_before - self.tokens_after)
+
+@lru_cache(maxsize=None)
+def _disfluency_patterns(language: str) -> List[Tuple[re.Pattern, str]]:
+    """(pattern, replacement) pairs removing the language's fillers"""
+    disfluencies = get_disfluencies(language)
+    # Longest first so that e.g. "嗯嗯" wins over "嗯"
+    fillers = sorted(disfluencies['fillers'], key=len, reverse=True)
+    pause_fillers = sorted(disfluencies['pause_fillers'], key=len, reverse=True)
+    patterns = []
+
+    if fillers:
+        words = '|'.join(map(re.escape, fillers))
+        if language in UNSPACED_LANGUAGES:
+            # Without word boundaries a filler character can be part of a word (额 in 额头),
+            # so every filler needs a pause after it and more speech following
+            patterns.append((re.compile(rf'(?:(?<=^)|(?<=[\s，,。.？?！!：:]))(?:{words})(?:{PAUSE})+(?=\S)'), ''))
+        else:
+            patterns.append((re.compile(rf'\b(?:{words})\b(?:[,…]|\.\.\.)?\s*', re.IGNORECASE), ''))
+    if pause_fillers:
+        words = '|'.join(map(re.escape, pause_fillers))
+        boundary = '' if language in UNSPACED_LANGUAGES else r'\b'
+        patterns.append((
+            re.compile(rf'{UTTERANCE_START}(?:{words}){boundary}{COMMA}(?=\S)', re.IGNORECASE | re.MULTILINE),
+            r'\1'
+        ))
+    return patterns
+
+# "pai- pain" -> "pain"
+_FALSE_START = re.compile(r'\b(\w+)-\s+(?=\1)', re.IGNORECASE)
+# "the the patient", "I have, I have pain" -> one occurrence. Phrases must start with
+# a letter so that repeated readings such as "5.0 5.0" are never merged
+_REPEATED_WORDS = re.compile(r'\b([^\W\d_]\w*(?:\s+\w+){0,3})(?:\s*,?\s+\1\b)+', re.IGNORECASE)
+# "我我我" -> "我"; two-character reduplication (慢慢, 天天) is ordinary Chinese and kept
+_REPEATED_CJK_CHAR = re.compile(r'([一-鿿])\1{2,}')
+# "头痛，头痛三天" -> "头痛三天". Only repeats after a pause: back-to-back doubling is
+# verb reduplication (研究研究, 休息休息), and phrases with numerals are dosing ("一次，一次两片")
+_REPEATED_CJK_PHRASE = re.compile(r'((?:(?![一二三四五六七八九十百千万两半几])[一-鿿]){2,8}?)(?:[，,、\s]\1)+')
+_SPACES = re.compile(r'[ \t]{2,}')
+
+def strip_disfluencies(text: str, language: str) -> str:
+    """Remove filler words and false starts"""
+    for pattern, replacement in _disfluency_patterns(language):
+        text = pattern.sub(replacement, text)
+    if language not in UNSPACED_LANGUAGES:
+        text = _FALSE_START.sub('', text)
+    return text
+
+def collapse_repeats(text: str, language: str) -> str:
+    """Collapse immediately repeated words and phrases into a single occurrence"""
+    if language == 'zh':
+        text = _REPEATED_CJK_CHAR.sub(r'\1', text)
+        text = _REPEATED_CJK_PHRASE.sub(r'\1', text)
+    elif language not in UNSPACED_LANGUAGES:
+        # Collapsing one repeat can expose another ("I I have, I have"), so repeat until stable
+        for _ in range(3):
+            collapsed = _REPEATED_WORDS.sub(r'\1', text)
+            if collapsed == text:
+                break
+            text = collapsed
+    return _SPACES.sub(' ', text)
+
+def dedupe_segments(segments: List[str], min_overlap: int = DEFAULT_MIN_SEGMENT_OVERLAP) -> List[str]:
+    """
+    Remove text duplicated between consecutive recording segments.
+
+    Overlapping recordings transcribe the same speech twice: the start of one
+    segment repeats the end of the previous one, or a segment is wholly contained
+    in the previous one. Both are dropped from the later segment.
+    """
+    result: List[str] = []
+    for segment in segments:
+        segment = segment.strip()
+        if not segment:
+            continue
+        if not result:
+            result.append(segment)
+            continue
+
+        previous = result[-1]
+        if len(segment) >= min_overlap and segment in previous:
+            continue
+
+        tail = previous[-OVERLAP_WINDOW:]
+        head = segment[:OVERLAP_WINDOW]
+        match = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+        if (
+            match.size >= min_overlap
+            and match.b <= OVERLAP_SLACK
+            and match.a + match.size >= len(tail) - OVERLAP_SLACK
+        ):
+            segment = segment[match.b + match.size:].lstrip(' ，,、')
+            if not segment:
+                continue
+        result.append(segment)
+    return result
+
+def normalize_transcript(transcript: str, language: str = "zh") -> NormalizedTranscript:
+    """
+    Clean up an ASR transcript before it is put into a prompt.
+
+    Each line is treated as a recording segment: overlapping segments are
+    deduplicated, then disfluencies are stripped and repeats collapsed.
+    """
+    if language not in SUPPORTED_LANGUAGES:
+        language = DEFAULT_LANGUAGE
+
+    min_overlap = MIN_SEGMENT_OVERLAP.get(language, DEFAULT_MIN_SEGMENT_OVERLAP)
+    segments = dedupe_segments(transcript.splitlines(), min_overlap)
+    cleaned = []
+    for segment in segments:
+        segment = collapse_repeats(strip_disfluencies(segment, language), language).strip()
+        if segment:
+            cleaned.append(segment)
+    text = "\n".join(cleaned)
+
+    return NormalizedTranscript(
+        text=text,
+        tokens_before=estimate_tokens(transcript),
+        tokens_after=estimate_tokens(text)
+    )
@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.deadline import DeadlineMiddleware, deadline_scope, remaining, timeout_for
+from app.core.exceptions import DeadlineExceeded
+
+def _slow_app(finished: list) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware)
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(2)
+        finished.append(True)
+        return {"ok": True}
+
+    @app.get("/budget")
+    async def budget():
+        return {"remaining": remaining()}
+
+    return app
+
+def test_deadline_header_cancels_handler():
+    """Test a request past its X-Request-Timeout gets 504 and its handler is cancelled"""
+    finished = []
+    response = TestClient(_slow_app(finished)).get("/slow", headers={"X-Request-Timeout": "0.1"})
+    assert response.status_code == 504
+    assert finished == []
+
+def test_deadline_is_visible_to_handlers():
+    """Test handlers see the remaining budget of their request"""
+    client = TestClient(_slow_app([]))
+    assert client.get("/budget").json()["remaining"] is None
+    assert 0 < client.get("/budget", headers={"X-Request-Timeout": "30"}).json()["remaining"] <= 30
+
+async def test_client_disconnect_cancels_handler():
+    """Test the handler stops when the client disconnects"""
+    finished = []
+    middleware = DeadlineMiddleware(_slow_app(finished))
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    sent = []
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/slow", "headers": [], "query_string": b"",
+             "http_version": "1.1", "scheme": "http", "server": ("test", 80), "root_path": ""}
+    await asyncio.wait_for(middleware(scope, receive, send), 1)
+    assert finished == []
+    assert sent == []
+
+def test_timeout_for_uses_the_smaller_budget():
+    """Test call timeouts are capped by the request deadline"""
+    assert timeout_for(10) == 10
+    with deadline_scope(1):
+        assert timeout_for(10) <= 1
+    with deadline_scope(-1):
+        with pytest.raises(DeadlineExceeded):
+            timeout_for(10)
+
+async def test_body_is_read_by_the_handler_as_it_arrives():
+    """Test the middleware does not buffer the upload before the handler runs"""
+    chunks = [{"type": "http.request", "body": b"a" * 10, "more_body": True},
+              {"type": "http.request", "body": b"b" * 10, "more_body": False}]
+    served = []
+
+    async def receive():
+        if chunks:
+            served.append(len(chunks))
+            return chunks.pop(0)
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    received = []
+    async def app(scope, app_receive, send):
+        assert served == []  # nothing read before the handler asked
+        while True:
+            message = await app_receive()
+            received.append(message["body"])
+            if not message["more_body"]:
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    sent = []
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/a2mr", "headers": [(b"content-length", b"20")]}
+    await asyncio.wait_for(DeadlineMiddleware(app)(scope, receive, send), 1)
+    assert b"".join(received) == b"a" * 10 + b"b" * 10
+    assert sent[0]["status"] == 200
+
+def test_deadline_504_carries_cors_headers():
+    """Test the 504 written by DeadlineMiddleware passes through CORS, so browsers see the timeout"""
+    from app import app as cdss_app
+
+    @cdss_app.get("/test-slow-cors")
+    async def slow():
+        await asyncio.sleep(2)
+        return {"ok": True}
+
+    response = TestClient(cdss_app).get(
+        "/test-slow-cors", headers={"X-Request-Timeout": "0.1", "Origin": "http://localhost:3000"}
+    )
+    assert response.status_code == 504
+    assert "access-control-allow-origin" in response.headers
+
+def test_exempt_streaming_paths_have_no_default_deadline(monkeypatch):
+    monkeypatch.setattr("app.core.deadline.REQUEST_TIMEOUT_S", 30)
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware, exempt_paths="/stream")
+
+    @app.get("/stream")
+    async def stream():
+        return {"remaining": remaining()}
+
+    @app.get("/plain")
+    async def plain():
+        return {"remaining": remaining()}
+
+    client = TestClient(app)
+    assert client.get("/stream").json()["remaining"] is None
+    assert client.get("/plain").json()["remaining"] <= 30
+    assert client.get("/stream", headers={"X-Request-Timeout": "5"}).json()["remaining"] <= 5
@@ -0,0 +1,50 @@
+import time
+from app.core.degradation import DegradationRouter
+
+def _router(**overrides) -> DegradationRouter:
+    settings = dict(
+        enabled=True, allowed_endpoints="/query:patient,/mr2nl", queue_high=4, queue_low=1,
+        latency_high_s=10, latency_low_s=5, min_hold_s=0
+    )
+    settings.update(overrides)
+    return DegradationRouter(**settings)
+
+def test_policy_per_endpoint_and_role():
+    """Test only the listed endpoints and roles may be degraded"""
+    router = _router()
+    assert router.allows("/query", "patient")
+    assert not router.allows("/query", "doctor")
+    assert router.allows("/mr2nl", "doctor")
+    assert not router.allows("/t2mr")
+    assert not _router(enabled=False).allows("/mr2nl")
+
+def test_hysteresis_on_queue_depth():
+    """Test degradation starts above the high mark and ends only below the low mark"""
+    router = _router()
+    assert not router.should_degrade(3)
+    assert router.should_degrade(4)
+    assert router.should_degrade(2)  # between the marks: stay degraded
+    assert not router.should_degrade(1)
+
+def test_latency_triggers_degradation():
+    """Test high recent primary latency degrades even with a short queue"""
+    router = _router()
+    for _ in range(10):
+        router.observe_primary(12)
+    assert router.should_degrade(0)
+
+def test_min_hold_prevents_flapping():
+    """Test the state is held for min_hold_s after a change"""
+    router = _router(min_hold_s=60)
+    assert router.should_degrade(10)
+    assert router.should_degrade(0)
+
+def test_stale_latency_does_not_latch_degradation():
+    """Test degradation ends once the slow primary latencies have aged out"""
+    router = _router(latency_max_age_s=0.05)
+    for _ in range(10):
+        router.observe_primary(12)
+    assert router.should_degrade(0)
+    time.sleep(0.1)
+    # No new primary timings while degraded; the old ones no longer count
+    assert not router.should_degrade(0)
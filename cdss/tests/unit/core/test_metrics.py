@@ -0,0 +1,51 @@
+from fastapi.testclient import TestClient
+from app import app
+from app.core.metrics import Counter, Histogram
+
+def test_histogram_renders_cumulative_buckets():
+    """Test histogram buckets are cumulative and end with +Inf"""
+    hist = Histogram("test_seconds", "Test latency", ("endpoint",), buckets=(0.1, 1))
+    hist.observe(0.05, endpoint="/t2mr")
+    hist.observe(0.5, endpoint="/t2mr")
+    hist.observe(5, endpoint="/t2mr")
+    text = "\n".join(hist.render())
+    assert 'test_seconds_bucket{worker="0",endpoint="/t2mr",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{worker="0",endpoint="/t2mr",le="1"} 2' in text
+    assert 'test_seconds_bucket{worker="0",endpoint="/t2mr",le="+Inf"} 3' in text
+    assert 'test_seconds_count{worker="0",endpoint="/t2mr"} 3' in text
+
+def test_counter_labels_are_escaped():
+    """Test label values are escaped in the exposition format"""
+    counter = Counter("test_total", "Test counter", ("model",))
+    counter.inc(2, model='a"b')
+    assert counter.value(model='a"b') == 2
+    assert 'test_total{worker="0",model="a\\"b"} 2' in counter.render()
+
+def test_metrics_endpoint_reports_request_latency():
+    """Test /metrics exposes the latency of earlier requests by route"""
+    client = TestClient(app)
+    client.get("/server-info")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'cdss_http_request_duration_seconds_count{worker="0",method="GET",endpoint="/server-info",status="200"}' in response.text
+
+def test_any_worker_renders_the_series_of_all_workers(tmp_path, monkeypatch):
+    """Test a pre-fork scrape answered by one worker includes the values the others shared"""
+    from app.core.metrics import Registry
+    monkeypatch.setenv("CDSS_METRICS_DIR", str(tmp_path))
+    registry = Registry()
+    counter = registry.register(Counter("test_shared_total", "Test counter", ("model",)))
+
+    monkeypatch.setenv("CDSS_WORKER_ID", "1")
+    counter.inc(3, model="m")
+    registry.render()  # worker 1 shares its values
+
+    monkeypatch.setenv("CDSS_WORKER_ID", "0")
+    fresh = Registry()
+    fresh.register(Counter("test_shared_total", "Test counter", ("model",))).inc(2, model="m")
+    text = fresh.render()
+
+    assert 'test_shared_total{worker="0",model="m"} 2' in text
+    assert 'test_shared_total{worker="1",model="m"} 3' in text
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["worker-0.json", "worker-1.json"]
@@ -0,0 +1,52 @@
+from app.core.model_router import ModelRouter, parse_tiers
+
+TIERS = "qwen2.5:0.5b=8192,gemma3:1b=32768,qwen2.5:7b=131072"
+
+def _router(**overrides) -> ModelRouter:
+    settings = dict(
+        tiers=TIERS, default_model="gemma3:1b", fast_max_tokens=300, fast_endpoints="/query:patient,/mr2nl",
+        fast_languages="zh,en", output_tokens=1024
+    )
+    settings.update(overrides)
+    return ModelRouter(**settings)
+
+def test_parse_tiers():
+    """Test model names keep their ':' and windows are optional"""
+    assert parse_tiers(" qwen2.5:0.5b=8192, gemma3:1b ,") == [("qwen2.5:0.5b", 8192), ("gemma3:1b", None)]
+    assert parse_tiers("") == []
+
+def test_trivial_requests_go_to_the_fastest_model():
+    """Test short requests from fast endpoints and languages get the fastest model"""
+    router = _router()
+    assert router.choose(50, "/query", "patient", "en") == ("qwen2.5:0.5b", "fast")
+    assert router.choose(50, "/mr2nl", "doctor", "zh") == ("qwen2.5:0.5b", "fast")
+    assert router.choose(50, "/query", "doctor", "en") == ("gemma3:1b", "default")
+    assert router.choose(50, "/query", "patient", "th") == ("gemma3:1b", "default")
+    assert router.choose(50, None, None, "en") == ("gemma3:1b", "default")
+    assert router.choose(301, "/query", "patient", "en") == ("gemma3:1b", "default")
+
+def test_long_prompts_go_to_a_large_enough_window():
+    """Test prompts overflowing the default model move up, never down, the tiers"""
+    router = _router()
+    assert router.choose(31000, "/t2mr", "doctor", "zh") == ("gemma3:1b", "default")
+    assert router.choose(32000, "/t2mr", "doctor", "zh") == ("qwen2.5:7b", "long_context")
+    assert router.choose(200000, "/t2mr", "doctor", "zh") == ("qwen2.5:7b", "overflow")
+
+def test_without_tiers_everything_goes_to_the_default_model():
+    router = _router(tiers="")
+    assert not router.enabled
+    assert router.choose(50, "/query", "patient", "en") == ("gemma3:1b", "default")
+
+def test_unlisted_default_model_takes_non_trivial_requests():
+    router = _router(tiers="qwen2.5:0.5b=8192")
+    assert router.models == ["qwen2.5:0.5b", "gemma3:1b"]
+    assert router.choose(50, "/query", "patient", "en") == ("qwen2.5:0.5b", "fast")
+    assert router.choose(100000, "/t2mr", "doctor", "en") == ("gemma3:1b", "default")
+
+def test_decisions_are_recorded():
+    router = _router()
+    router.route(50, "/query", "patient", "en")
+    router.route(50, "/query", "patient", "en")
+    router.route(32000, "/t2mr", "doctor", "zh")
+    decisions = {(d["model"], d["reason"]): d["count"] for d in router.snapshot()["decisions"]}
+    assert decisions == {("qwen2.5:0.5b", "fast"): 2, ("qwen2.5:7b", "long_context"): 1}
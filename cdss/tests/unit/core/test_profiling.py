@@ -0,0 +1,39 @@
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.profiling import ProfilingMiddleware
+from app.core.tracing import TracingMiddleware
+
+def _profiled_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/work")
+    async def work():
+        return {"total": sum(range(1000))}
+
+    return app
+
+def test_admin_header_profiles_request(tmp_path, monkeypatch):
+    """Test a request with the admin header is profiled and saved under its request id"""
+    monkeypatch.setattr("app.core.profiling.PROFILING_ENABLED", True)
+    monkeypatch.setattr("app.core.profiling.PROFILING_TOKEN", "secret")
+    monkeypatch.setattr("app.core.profiling.PROFILING_DIR", str(tmp_path))
+    monkeypatch.setattr("app.core.profiling.PROFILER", "cprofile")
+    client = TestClient(_profiled_app())
+
+    response = client.get("/work", headers={"X-Profile": "secret", "X-Request-ID": "req-1"})
+    assert response.headers["x-profile-id"].endswith("-req-1")
+    assert os.path.exists(tmp_path / f"{response.headers['x-profile-id']}.prof")
+
+    response = client.get("/work", headers={"X-Profile": "wrong"})
+    assert "x-profile-id" not in response.headers
+
+def test_profiling_disabled_by_default(tmp_path, monkeypatch):
+    """Test nothing is profiled unless profiling is enabled"""
+    monkeypatch.setattr("app.core.profiling.PROFILING_TOKEN", "secret")
+    monkeypatch.setattr("app.core.profiling.PROFILING_DIR", str(tmp_path))
+    response = TestClient(_profiled_app()).get("/work", headers={"X-Profile": "secret"})
+    assert "x-profile-id" not in response.headers
+    assert not os.listdir(tmp_path)
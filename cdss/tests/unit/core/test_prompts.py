@@ -0,0 +1,51 @@
+import pytest
+from app.core import prompts
+from app.core.i18n import SUPPORTED_LANGUAGES
+from app.services.llm import LLMService
+from app.services.llm_pool import Endpoint
+
+def _system_prefix(messages):
+    return [m for m in messages if m["role"] == "system"]
+
+@pytest.mark.parametrize("language", SUPPORTED_LANGUAGES)
+@pytest.mark.parametrize("role", prompts.ROLES)
+def test_chat_prefix_is_stable_across_turns(language, role):
+    """Only history and the question change between turns; everything before them is byte-identical"""
+    first = prompts.chat_messages(language, role, "Q1", medical_records="BP 120/80")
+    second = prompts.chat_messages(language, role, "Q2", medical_records="BP 120/80", history=["Q1", "A1"])
+    assert _system_prefix(first) == _system_prefix(second)
+    assert prompts.prefix_key(first) == prompts.prefix_key(second)
+    assert second[-1] == {"role": "user", "content": "Q2"}
+
+def test_doctor_records_context_accepts_retrieved_info():
+    """The doctor template has a retrieved_info placeholder that must be filled"""
+    context = prompts.records_context("en", "doctor", "BP 120/80", retrieved_info="Guideline X")
+    assert "BP 120/80" in context and "Guideline X" in context
+
+def test_role_context_is_precompiled():
+    assert prompts.role_context("en", "doctor", True) is prompts.role_context("en", "doctor", True)
+    assert prompts.role_context("en", "doctor", True).endswith(prompts.JSON_INSTRUCTION)
+    assert prompts.role_context("xx", "patient") == prompts.role_context("zh", "patient")
+
+@pytest.mark.parametrize("language", SUPPORTED_LANGUAGES)
+def test_json_record_instruction_has_no_markdown_format(language):
+    from app.core.i18n import LLM_PROMPTS
+    instruction = prompts.TASK_INSTRUCTIONS[(language, "mr_json")]
+    assert LLM_PROMPTS[language]["mr_format_detail"] not in instruction
+    assert instruction.startswith(LLM_PROMPTS[language]["mr_format"])
+
+def test_json_instruction_is_not_added_twice():
+    messages = [{"role": "system", "content": prompts.role_context("en", "doctor", True)}]
+    assert LLMService()._add_json_instruction(messages) == messages
+    plain = [{"role": "system", "content": "ctx"}]
+    updated = LLMService()._add_json_instruction(plain)
+    assert updated[0]["content"] == f"ctx {prompts.JSON_INSTRUCTION}"
+    assert plain[0]["content"] == "ctx"
+
+def test_endpoint_tracks_recent_prefixes():
+    endpoint = Endpoint("http://llm", client=None, prefix_slots=2)
+    assert not endpoint.seen_prefix("a")
+    assert endpoint.seen_prefix("a")
+    endpoint.seen_prefix("b")
+    endpoint.seen_prefix("c")
+    assert not endpoint.seen_prefix("a")
@@ -0,0 +1,87 @@
+import signal
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from app.core import serving
+from app.core.serving import cpu_slices
+
+def test_cpu_slices_are_disjoint_when_cpus_suffice():
+    """Test each worker gets its own CPUs"""
+    assert cpu_slices([0, 1, 2, 3], workers=2, threads_per_worker=2) == [[0, 1], [2, 3]]
+
+def test_cpu_slices_wrap_when_oversubscribed():
+    """Test workers share CPUs round-robin when there are not enough"""
+    assert cpu_slices([4, 5], workers=3, threads_per_worker=1) == [[4], [5], [4]]
+
+class _FakeProcesses:
+    """Stands in for fork/waitpid/kill/signals/clock so serve_prefork runs without real workers"""
+
+    def __init__(self, monkeypatch, exits):
+        self.events = []
+        self.handlers = {}
+        self.exits = list(exits)  # (seconds after start, pid or "stop")
+        self.now = 0.0
+        self._pids = iter(range(101, 200))
+        monkeypatch.setattr(serving.os, "fork", self.fork)
+        monkeypatch.setattr(serving.os, "waitpid", self.waitpid)
+        monkeypatch.setattr(serving.os, "kill", lambda pid, sig: self.events.append(("kill", pid)))
+        monkeypatch.setattr(serving.signal, "signal", lambda sig, handler: self.handlers.setdefault(sig, handler))
+        monkeypatch.setattr(serving, "time", SimpleNamespace(monotonic=lambda: self.now, sleep=lambda s: None))
+        monkeypatch.setattr(serving, "_bind_socket", lambda host, port: MagicMock())
+        monkeypatch.setattr("uvicorn.importer.import_from_string", lambda path: "app")
+        monkeypatch.setattr("app.services.warmup.warm_up_models", self.warm_up)
+        # serve_prefork changes process-wide state; let monkeypatch restore it
+        monkeypatch.setattr(serving, "gc", SimpleNamespace(collect=lambda: None, freeze=lambda: None))
+        monkeypatch.setattr(serving, "_active_workers", None)
+        for name in ("CDSS_WORKERS", "CDSS_METRICS_DIR") + serving.THREAD_ENV_VARS:
+            monkeypatch.delenv(name, raising=False)
+
+    def warm_up(self, languages):
+        self.events.append(("preload", tuple(languages)))
+        return {}
+
+    def fork(self):
+        pid = next(self._pids)
+        self.events.append(("fork", pid))
+        return pid
+
+    def waitpid(self, pid, options):
+        if not self.exits:
+            raise ChildProcessError
+        self.now, event = self.exits.pop(0)
+        if event == "stop":
+            self.handlers[signal.SIGTERM](signal.SIGTERM, None)
+            return 0, 0
+        return event, 0
+
+def test_models_are_preloaded_once_before_forking(monkeypatch):
+    fake = _FakeProcesses(monkeypatch, [(60, "stop"), (61, 101), (61, 102)])
+    serving.serve_prefork("app:app", "127.0.0.1", 0, workers=2, preload_languages=["zh"])
+    assert fake.events[:3] == [("preload", ("zh",)), ("fork", 101), ("fork", 102)]
+    assert ("kill", 101) in fake.events and ("kill", 102) in fake.events
+
+def test_no_preload_skips_the_models(monkeypatch):
+    fake = _FakeProcesses(monkeypatch, [(60, "stop"), (61, 101)])
+    serving.serve_prefork("app:app", "127.0.0.1", 0, workers=1, preload=False)
+    assert not any(event == "preload" for event, _ in fake.events)
+
+def test_crashed_worker_is_respawned(monkeypatch):
+    fake = _FakeProcesses(monkeypatch, [(60, 101), (120, "stop"), (121, 102), (121, 103)])
+    serving.serve_prefork("app:app", "127.0.0.1", 0, workers=2, preload=False)
+    assert [pid for event, pid in fake.events if event == "fork"] == [101, 102, 103]
+
+def test_worker_dying_at_startup_stops_the_server(monkeypatch):
+    fake = _FakeProcesses(monkeypatch, [(1, 101), (2, 102)])
+    serving.serve_prefork("app:app", "127.0.0.1", 0, workers=2, preload=False)
+    assert [pid for event, pid in fake.events if event == "fork"] == [101, 102]
+    assert ("kill", 102) in fake.events
+
+def test_worker_sets_torch_threads_only_when_the_parent_loaded_torch(monkeypatch):
+    monkeypatch.delitem(sys.modules, "torch", raising=False)
+    serving._pin_worker(2, None)
+    assert "torch" not in sys.modules
+
+    torch = SimpleNamespace(set_num_threads=MagicMock(), set_num_interop_threads=MagicMock())
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    serving._pin_worker(2, None)
+    torch.set_num_threads.assert_called_once_with(2)
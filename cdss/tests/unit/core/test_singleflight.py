@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from app.core.singleflight import SingleFlight, content_key
+
+def test_content_key():
+    assert content_key(b"audio", "zh") == content_key(b"audio", "zh")
+    assert content_key(b"audio", "zh") != content_key(b"audio", "en")
+    assert content_key([{"role": "user", "content": "hi"}]) != content_key([{"role": "user", "content": "ho"}])
+
+async def test_identical_calls_share_one_computation():
+    flight = SingleFlight("test", enabled=True)
+    runs = 0
+
+    async def compute():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    results = await asyncio.gather(*(flight.do("key", compute) for _ in range(3)))
+    assert runs == 1
+    assert [result for result, _ in results] == ["result"] * 3
+    assert [shared for _, shared in results] == [False, True, True]
+    assert flight.in_flight == 0
+
+async def test_errors_reach_every_caller():
+    flight = SingleFlight("test", enabled=True)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+async def test_computation_is_cancelled_only_when_every_caller_left():
+    flight = SingleFlight("test", enabled=True)
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def compute():
+        started.set()
+        await release.wait()
+        return "done"
+
+    first = asyncio.create_task(flight.do("key", compute))
+    await started.wait()
+    second = asyncio.create_task(flight.do("key", compute))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    release.set()
+    assert await second == ("done", True)
+
+    started.clear()
+    release.clear()
+    only = asyncio.create_task(flight.do("other", compute))
+    await started.wait()
+    task = flight._calls["other"].task
+    only.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await only
+    await asyncio.sleep(0)
+    assert task.cancelled()
+
+async def test_joiner_with_a_longer_deadline_is_not_failed_by_the_first_callers():
+    from app.core.deadline import check_deadline, deadline_scope
+    from app.core.exceptions import DeadlineExceeded
+    flight = SingleFlight("test", enabled=True)
+    runs = 0
+
+    async def compute():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.05)
+        check_deadline("test")
+        return "done"
+
+    async def call(seconds):
+        with deadline_scope(seconds):
+            return await flight.do("key", compute)
+
+    first = asyncio.create_task(call(0.01))
+    await asyncio.sleep(0)
+    results = await asyncio.gather(first, call(5), call(None), return_exceptions=True)
+    assert isinstance(results[0], DeadlineExceeded)
+    assert [result for result, _ in results[1:]] == ["done", "done"]
+    assert runs == 2
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+from pathlib import Path
+from app.core.config import IMPORT_TIME_BUDGET_S
+
+SRC_DIR = Path(__file__).parents[3] / "src"
+
+IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+heavy = [name for name in ("torch", "funasr", "paddleocr", "paddle") if name in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+def _import_app():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout.split()
+    return float(output[0]), output[1] if len(output) > 1 else ""
+
+def test_import_does_not_load_model_packages():
+    """Test importing the app does not import torch, funasr or paddleocr"""
+    _, heavy = _import_app()
+    assert heavy == "", f"Heavy packages imported at startup: {heavy}"
+
+def test_import_time_within_budget():
+    """Test importing the app stays within IMPORT_TIME_BUDGET_S"""
+    # Best of three to keep the check stable on a busy machine
+    elapsed = min(_import_app()[0] for _ in range(3))
+    assert elapsed < IMPORT_TIME_BUDGET_S, f"import app took {elapsed:.2f}s, budget is {IMPORT_TIME_BUDGET_S}s"
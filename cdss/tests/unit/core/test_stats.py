@@ -0,0 +1,38 @@
+from app.core.stats import BackendStats, LatencyWindow, cache_stats
+
+def test_latency_percentiles():
+    """Test percentiles over the latency window"""
+    window = LatencyWindow()
+    assert window.percentile(50) is None
+    for ms in range(1, 101):
+        window.observe(ms / 1000)
+    summary = window.summary()
+    assert summary["p50"] == 0.051
+    assert summary["p99"] == 0.099
+
+def test_backend_health_tracks_consecutive_failures():
+    """Test a backend turns unhealthy on failure and recovers on success"""
+    stats = BackendStats()
+    stats.finish(stats.start(), RuntimeError("down"))
+    assert not stats.healthy
+    assert stats.in_flight == 0
+    stats.finish(stats.start())
+    assert stats.healthy
+    assert stats.snapshot()["failures"] == 1
+
+def test_cancelled_calls_are_neither_successes_nor_failures():
+    """Test a call abandoned by its caller leaves health and latency untouched"""
+    stats = BackendStats()
+    stats.finish(stats.start(), RuntimeError("down"))
+    stats.start()
+    stats.cancel()
+    assert stats.in_flight == 0 and stats.cancelled == 1
+    assert not stats.healthy and stats.last_success_at is None
+    assert len(stats.latency) == 0
+
+def test_cache_hit_rate():
+    """Test cache hit rates are computed from registered cache stats"""
+    stats = cache_stats("test_cache")
+    stats.hit()
+    stats.miss()
+    assert stats.snapshot()["hit_rate"] == 0.5
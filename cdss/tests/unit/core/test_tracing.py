@@ -0,0 +1,45 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.tracing import TracingMiddleware, current_trace, span
+
+def _infer():
+    with span("inner"):
+        pass
+
+def _traced_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/work")
+    async def work():
+        with span("prompt_build"):
+            pass
+        with span("llm.primary"):
+            # Spans opened in worker threads belong to the same request
+            await asyncio.to_thread(_infer)
+        return {"spans": [s.name for s in current_trace().spans]}
+
+    return app
+
+def test_server_timing_header_lists_stages():
+    """Test stage durations are returned in the Server-Timing header"""
+    response = TestClient(_traced_app()).get("/work")
+    assert response.status_code == 200
+    assert response.json()["spans"] == ["request", "prompt_build", "llm.primary", "inner"]
+    timing = response.headers["server-timing"]
+    assert "prompt_build;dur=" in timing
+    assert "llm.primary;dur=" in timing
+    assert "total;dur=" in timing
+
+def test_request_id_is_propagated():
+    """Test a valid client request id is echoed and an invalid one replaced"""
+    client = TestClient(_traced_app())
+    assert client.get("/work", headers={"X-Request-ID": "abc-123"}).headers["x-request-id"] == "abc-123"
+    assert client.get("/work", headers={"X-Request-ID": "bad id!"}).headers["x-request-id"] != "bad id!"
+
+def test_span_outside_request_is_noop():
+    """Test spans outside a traced request cost nothing and record nothing"""
+    with span("stage") as current:
+        assert current is None
+    assert current_trace() is None
@@ -0,0 +1,88 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.condensation import RecordCondenser
+from app.utils.tokens import estimate_tokens, split_by_tokens
+
+LONG_RECORDS = "\n".join(f"2024-{month:02d} visit: blood pressure 150/95, amlodipine 5 mg daily." for month in range(1, 13)) * 20
+
+def _llm(reply: str = "Hypertension on amlodipine 5 mg."):
+    llm = MagicMock()
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+
+    async def complete(**kwargs):
+        await asyncio.sleep(0.01)
+        return {"content": reply, "usage": usage}
+    llm.generate_completion = AsyncMock(side_effect=complete)
+    return llm
+
+def test_split_by_tokens_keeps_lines_whole():
+    parts = split_by_tokens(LONG_RECORDS, 200)
+    assert len(parts) > 1
+    assert all(estimate_tokens(part) <= 200 for part in parts)
+    assert "\n".join(parts) == LONG_RECORDS
+    assert split_by_tokens("", 10) == []
+
+async def test_short_records_are_left_alone():
+    condenser = RecordCondenser(enabled=True, min_tokens=1000)
+    llm = _llm()
+    with patch("app.services.condensation.llm_service", llm):
+        assert await condenser.condense("BP 120/80", "en") == "BP 120/80"
+        assert await condenser.condense(None, "en") is None
+    llm.generate_completion.assert_not_called()
+
+async def test_long_records_are_condensed_in_parallel_and_cached():
+    condenser = RecordCondenser(enabled=True, min_tokens=500, chunk_tokens=400, max_concurrency=4)
+    llm = _llm()
+    with patch("app.services.condensation.llm_service", llm):
+        first, second = await asyncio.gather(
+            condenser.condense(LONG_RECORDS, "en"), condenser.condense(LONG_RECORDS, "en")
+        )
+        parts = len(split_by_tokens(LONG_RECORDS, 400))
+        assert llm.generate_completion.await_count == parts
+        again = await condenser.condense(LONG_RECORDS, "en")
+
+    assert first == second == again
+    assert estimate_tokens(first) < estimate_tokens(LONG_RECORDS)
+    assert llm.generate_completion.await_count == parts
+    assert llm.generate_completion.call_args.kwargs["messages"][-1]["role"] == "user"
+
+async def test_long_summaries_are_merged():
+    condenser = RecordCondenser(enabled=True, min_tokens=500, chunk_tokens=400)
+    llm = _llm(reply="x " * 400)
+    with patch("app.services.condensation.llm_service", llm):
+        await condenser.condense(LONG_RECORDS, "en")
+    merge_prompt = llm.generate_completion.call_args.kwargs["messages"][0]["content"]
+    assert merge_prompt.startswith("Below are summaries")
+
+async def test_failed_condensation_falls_back_to_the_records():
+    condenser = RecordCondenser(enabled=True, min_tokens=500, chunk_tokens=400)
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(side_effect=RuntimeError("down"))
+    with patch("app.services.condensation.llm_service", llm):
+        assert await condenser.condense(LONG_RECORDS, "en") == LONG_RECORDS
+
+async def test_fallback_summaries_are_not_used_or_cached():
+    condenser = RecordCondenser(enabled=True, min_tokens=500, chunk_tokens=400)
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(return_value={"content": "Hypertension.", "usage": usage, "degraded": True})
+    with patch("app.services.condensation.llm_service", llm):
+        assert await condenser.condense(LONG_RECORDS, "en") == LONG_RECORDS
+        llm.generate_completion.return_value = {"content": "Hypertension.", "usage": usage, "degraded": False}
+        assert await condenser.condense(LONG_RECORDS, "en") != LONG_RECORDS
+
+async def test_good_part_summaries_survive_a_failed_part():
+    records = "\n".join(f"Visit {day}: blood pressure 150/95, amlodipine 5 mg daily." for day in range(240))
+    condenser = RecordCondenser(enabled=True, min_tokens=500, chunk_tokens=400, cache_size=64)
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    replies = [{"content": "Hypertension.", "usage": usage, "degraded": True}]
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(
+        side_effect=lambda **kwargs: replies.pop() if replies else {"content": "Hypertension.", "usage": usage}
+    )
+    with patch("app.services.condensation.llm_service", llm):
+        assert await condenser.condense(records, "en") == records
+        parts = len(split_by_tokens(records, 400))
+        assert llm.generate_completion.await_count == parts
+        assert await condenser.condense(records, "en") != records
+    assert llm.generate_completion.await_count == parts + 1
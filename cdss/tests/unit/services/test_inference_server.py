@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+from app.core.exceptions import InferenceServiceError
+from app.services.inference_client import InferenceClient
+from app.services.inference_server import InferenceServer
+from app.utils.ipc import _LENGTHS
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "inference.sock")
+
+async def test_requests_are_batched_by_language(socket_path):
+    """Test concurrent requests reach the handler as one batch per language"""
+    batches = []
+
+    async def handler(payloads, language):
+        batches.append((language, list(payloads)))
+        return [f"{language}:{payload.decode()}" for payload in payloads]
+
+    server = InferenceServer(socket_path, handlers={"asr": handler}, batch_window_ms=50)
+    await server.start()
+    try:
+        client = InferenceClient(socket_path, timeout_s=5)
+        results = await asyncio.gather(
+            client.transcribe_voice(b"a", "zh"),
+            client.transcribe_voice(b"b", "zh"),
+            client.transcribe_voice(b"c", "en"),
+        )
+    finally:
+        await server.stop()
+
+    assert results == ["zh:a", "zh:b", "en:c"]
+    assert sorted(batches) == [("en", [b"c"]), ("zh", [b"a", b"b"])]
+
+async def test_full_queue_is_refused(socket_path):
+    """Test the server refuses work beyond its queue instead of queueing it"""
+    release = asyncio.Event()
+
+    async def handler(payloads, language):
+        await release.wait()
+        return ["done"] * len(payloads)
+
+    server = InferenceServer(socket_path, handlers={"ocr": handler}, max_queue=1, max_batch_size=1, batch_window_ms=0)
+    await server.start()
+    try:
+        client = InferenceClient(socket_path, timeout_s=5)
+        running = asyncio.create_task(client.transcribe_image(b"1"))
+        await asyncio.sleep(0.05)  # picked up by the batcher
+        queued = asyncio.create_task(client.transcribe_image(b"2"))
+        await asyncio.sleep(0.05)  # fills the queue
+        with pytest.raises(InferenceServiceError) as exc_info:
+            await client.transcribe_image(b"3")
+        release.set()
+        assert await running == "done"
+        assert await queued == "done"
+    finally:
+        await server.stop()
+
+    assert exc_info.value.status_code == 503
+
+async def test_client_fails_fast_when_server_is_down(socket_path):
+    """Test an unreachable server surfaces as a 503 instead of hanging"""
+    client = InferenceClient(socket_path, timeout_s=5)
+    with pytest.raises(InferenceServiceError) as exc_info:
+        await client.transcribe_voice(b"a")
+    assert exc_info.value.status_code == 503
+
+async def test_ping_of_a_hung_server_times_out_quickly(socket_path):
+    """Test a health ping does not wait the full inference timeout for a server that never answers"""
+    async def never_reply(reader, writer):
+        await reader.read()
+        writer.close()
+
+    server = await asyncio.start_unix_server(never_reply, path=socket_path)
+    try:
+        client = InferenceClient(socket_path, timeout_s=60, ping_timeout_s=0.1)
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(InferenceServiceError) as exc_info:
+            await client.ping()
+    finally:
+        server.close()
+
+    assert exc_info.value.status_code == 504
+    assert asyncio.get_running_loop().time() - started < 5
+
+async def test_short_batch_result_fails_every_request(socket_path):
+    """Test a handler returning fewer results than requests answers each request with an error"""
+    async def handler(payloads, language):
+        return ["only one"]
+
+    server = InferenceServer(socket_path, handlers={"asr": handler}, batch_window_ms=50)
+    await server.start()
+    try:
+        client = InferenceClient(socket_path, timeout_s=5)
+        results = await asyncio.gather(
+            client.transcribe_voice(b"a"), client.transcribe_voice(b"b"), return_exceptions=True
+        )
+    finally:
+        await server.stop()
+
+    assert all(isinstance(result, InferenceServiceError) for result in results)
+    assert all(result.status_code == 500 for result in results)
+
+async def test_garbled_frame_closes_the_connection(socket_path):
+    """Test a frame with an unreadable header closes that connection and leaves the server serving"""
+    async def handler(payloads, language):
+        return ["ok"] * len(payloads)
+
+    errors = []
+    asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+    server = InferenceServer(socket_path, handlers={"ocr": handler}, batch_window_ms=0)
+    await server.start()
+    try:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(_LENGTHS.pack(5, 0) + b"{bad!")
+        await writer.drain()
+        assert await asyncio.wait_for(reader.read(), timeout=5) == b""
+        writer.close()
+        assert await InferenceClient(socket_path, timeout_s=5).transcribe_image(b"1") == "ok"
+    finally:
+        await server.stop()
+
+    assert errors == []
@@ -123,4 +123,75 @@ async def test_api_format_selection(llm_service_instance, mock_openai, base_url,
     if "localhost" in base_url:
         assert call_kwargs.get("stream") is False
     else:
-        assert "response_format" in call_kwargs 
\ No newline at end of file
+        assert "response_format" in call_kwargs
+
+async def test_token_usage_metrics(llm_service_instance, mock_response, mock_openai):
+    """Test token usage and backend usage are counted per model and language"""
+    from app.core import metrics
+    from app.core.config import LLM_MODEL_NAME
+    mock_openai.return_value.chat.completions.create.return_value = mock_response
+    prompt_before = metrics.llm_prompt_tokens.value(model=LLM_MODEL_NAME, language="fr")
+    requests_before = metrics.llm_requests.value(backend="primary", model=LLM_MODEL_NAME, outcome="ok")
+
+    await llm_service_instance.generate_completion(
+        messages=[{"role": "user", "content": "test"}],
+        language="fr"
+    )
+
+    assert metrics.llm_prompt_tokens.value(model=LLM_MODEL_NAME, language="fr") == prompt_before + 10
+    assert metrics.llm_requests.value(backend="primary", model=LLM_MODEL_NAME, outcome="ok") == requests_before + 1
+
+async def test_streaming_measures_time_to_first_token(llm_service_instance, mock_openai):
+    """Test streamed completions are assembled and usage is estimated when missing"""
+    chunks = [
+        Mock(usage=None, choices=[Mock(delta=Mock(content="Hello "))]),
+        Mock(usage=None, choices=[Mock(delta=Mock(content="world"))])
+    ]
+    mock_openai.return_value.chat.completions.create.return_value = iter(chunks)
+    with patch('app.services.llm.LLM_STREAMING', True):
+        result = await llm_service_instance.generate_completion(messages=[{"role": "user", "content": "test"}])
+
+    assert result["content"] == "Hello world"
+    assert result["usage"].completion_tokens > 0
+    assert mock_openai.return_value.chat.completions.create.call_args.kwargs["stream"] is True
+
+async def test_fallback_skipped_without_budget(llm_service_instance, mock_openai):
+    """Test the fallback is not tried when too little of the deadline is left"""
+    from app.core.deadline import deadline_scope
+    mock_openai.return_value.chat.completions.create.side_effect = Exception("Primary failed")
+
+    with deadline_scope(1):
+        with pytest.raises(LLMServiceError) as exc_info:
+            await llm_service_instance.generate_completion(messages=[{"role": "user", "content": "test"}])
+
+    assert "Fallback skipped" in exc_info.value.detail
+    assert mock_openai.return_value.chat.completions.create.call_count == 1
+
+async def test_overload_degrades_to_fallback(llm_service_instance, mock_response, mock_openai):
+    """Test degradable requests go to the fallback model while the primary is overloaded"""
+    from app.core.config import FALLBACK_MODEL_NAME
+    mock_openai.return_value.chat.completions.create.return_value = mock_response
+    with patch('app.services.llm.degradation_router') as router:
+        router.should_degrade.return_value = True
+        result = await llm_service_instance.generate_completion(
+            messages=[{"role": "user", "content": "test"}],
+            allow_degrade=True
+        )
+        not_allowed = await llm_service_instance.generate_completion(messages=[{"role": "user", "content": "test"}])
+
+    assert result["degraded"] is True
+    assert mock_openai.return_value.chat.completions.create.call_args_list[0].kwargs["model"] == FALLBACK_MODEL_NAME
+    assert not_allowed["degraded"] is False
+
+async def test_primary_model_is_routed(llm_service_instance, mock_response, mock_openai):
+    """Test the router's choice of primary model is the one called"""
+    mock_openai.return_value.chat.completions.create.return_value = mock_response
+    with patch('app.services.llm.model_router') as router:
+        router.route.return_value = "fast-model"
+        await llm_service_instance.generate_completion(
+            messages=[{"role": "user", "content": "test"}], language="en", endpoint="/query", role="patient"
+        )
+
+    prompt_tokens, endpoint, role, language = router.route.call_args.args
+    assert prompt_tokens > 0 and (endpoint, role, language) == ("/query", "patient", "en")
+    assert mock_openai.return_value.chat.completions.create.call_args.kwargs["model"] == "fast-model"
@@ -0,0 +1,43 @@
+from app.services.llm_pool import EndpointPool
+
+URLS = ["http://a:11434/v1", "http://b:11434/v1", "http://c:11434/v1"]
+
+def _pool(**kwargs) -> EndpointPool:
+    return EndpointPool("primary", URLS, lambda url: object(), **kwargs)
+
+def test_least_outstanding_then_latency():
+    """Test requests go to the endpoint with the fewest requests in flight, weighted by latency"""
+    pool = _pool()
+    a, b, c = pool.endpoints
+    a.stats.start()
+    b.stats.start()
+    assert pool.pick() is c
+    pool.record(c, 10.0)  # c is much slower than the others
+    pool.record(a, 0.5)
+    pool.record(b, 0.5)
+    assert pool.pick() in (a, b)
+
+def test_failing_endpoint_is_ejected_and_returns():
+    """Test consecutive failures eject an endpoint until its ejection expires"""
+    pool = _pool(eject_after_failures=2, eject_s=0)
+    a = pool.endpoints[0]
+    for _ in range(2):
+        a.stats.finish(a.stats.start(), RuntimeError("down"))
+        pool.record(a, 0.1, RuntimeError("down"))
+    assert a.ejections == 1
+
+    pool = _pool(eject_after_failures=1, eject_s=60)
+    a = pool.endpoints[0]
+    a.stats.finish(a.stats.start(), RuntimeError("down"))
+    pool.record(a, 0.1, RuntimeError("down"))
+    assert not a.available
+    assert all(pool.pick() is not a for _ in range(20))
+
+def test_sessions_are_sticky_unless_overloaded():
+    """Test a session keeps its endpoint until that endpoint is much busier than the rest"""
+    pool = _pool(sticky_max_extra=2)
+    chosen = pool.pick("session-1")
+    assert all(pool.pick("session-1") is chosen for _ in range(10))
+    for _ in range(2):
+        chosen.stats.start()
+    assert pool.pick("session-1") is not chosen
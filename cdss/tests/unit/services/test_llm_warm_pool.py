@@ -0,0 +1,98 @@
+import asyncio
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.services.llm_warm_pool import WarmPool, native_url, parse_hours
+
+class FakeOllama:
+    """Just enough of Ollama's native API: /api/ps and preloading via /api/generate"""
+
+    def __init__(self):
+        self.loaded = set()
+        self.preloads = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path != "/api/ps":
+                    self.send_error(404)
+                    return
+                self._reply({"models": [{"name": name} for name in fake.loaded]})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.preloads.append(body)
+                fake.loaded.add(body["model"])
+                self._reply({"done": True})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+@pytest.fixture
+def ollama():
+    fake = FakeOllama()
+    yield fake
+    fake.server.shutdown()
+
+def test_native_url_and_hours():
+    assert native_url("http://localhost:11434/v1/") == "http://localhost:11434"
+    assert parse_hours("07:30-19:00") == (450, 1140)
+    assert parse_hours("") is None
+    pool = WarmPool([], hours="22:00-06:00", weekdays=[1, 2, 3, 4, 5, 6, 7])
+    assert pool.in_warm_hours(datetime(2026, 10, 19, 23, 0))
+    assert not pool.in_warm_hours(datetime(2026, 10, 19, 12, 0))
+    weekdays = WarmPool([], hours="", weekdays=[1, 2, 3, 4, 5])
+    assert not weekdays.in_warm_hours(datetime(2026, 10, 18, 12, 0))  # a Sunday
+
+def test_preload_keep_alive_and_cold_starts(ollama):
+    pool = WarmPool([(ollama.url, "gemma3:1b"), (ollama.url, "gemma3:1b")], keep_alive="30m")
+    asyncio.run(pool.run_once(warm=True))
+    assert ollama.preloads == [{"model": "gemma3:1b", "keep_alive": "30m"}]
+    target = pool.targets[(ollama.url, "gemma3:1b")]
+    assert target.supported and target.loaded and target.cold_starts == 0
+
+    # Evicted while kept warm: the next round counts a cold start and reloads
+    ollama.loaded.clear()
+    asyncio.run(pool.run_once(warm=True))
+    assert target.cold_starts == 1 and target.loaded
+
+    # Outside working hours the model is left to expire; a request to it is a cold start
+    ollama.loaded.clear()
+    asyncio.run(pool.run_once(warm=False))
+    assert len(ollama.preloads) == 2 and target.loaded is False
+    assert pool.note_request(ollama.url, "gemma3:1b")
+    assert not pool.note_request(ollama.url, "gemma3:1b")
+
+def test_non_ollama_endpoint_is_skipped(ollama):
+    pool = WarmPool([(ollama.url.replace("/v1", "/other"), "gpt")])
+    asyncio.run(pool.run_once(warm=True))
+    target = next(iter(pool.targets.values()))
+    assert target.supported is False and ollama.preloads == []
+
+@pytest.mark.parametrize("worker_id, started", [("0", True), ("1", False)])
+def test_only_worker_zero_runs_the_warm_pool(monkeypatch, worker_id, started):
+    """Test pre-fork workers other than worker 0 do not send their own preloads and keep-alives"""
+    from unittest.mock import AsyncMock, MagicMock
+    from fastapi.testclient import TestClient
+    from app import app
+    from app.services.llm import llm_service
+    monkeypatch.setenv("CDSS_WORKER_ID", worker_id)
+    monkeypatch.setattr("app.LLM_WARM_POOL_ENABLED", True)
+    monkeypatch.setattr(llm_service.warm_pool, "start", MagicMock())
+    monkeypatch.setattr(llm_service.warm_pool, "stop", AsyncMock())
+    with TestClient(app):
+        pass
+    assert llm_service.warm_pool.start.called is started
@@ -1,5 +1,6 @@
+import json
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 from app.core.exceptions import LLMServiceError
 
 # Mock i18n functions
@@ -95,6 +96,76 @@ async def test_generate_record_from_text(medical_record_service):
     assert "timestamp" in result
     mock_primary_client.chat.completions.create.assert_called_once()
 
+async def test_update_record_merges_changed_sections(medical_record_service):
+    """Test incremental update only replaces the sections returned by the LLM"""
+    existing = "**病历记录**\n\n**主诉：** 头痛3天\n\n**诊断：** 头痛待查"
+    update_response = {
+        'content': '{"诊断": "偏头痛"}',
+        'usage': Mock(prompt_tokens=5, completion_tokens=3, total_tokens=8)
+    }
+    with patch('app.services.medical_record.llm_service') as llm:
+        llm.generate_completion = AsyncMock(return_value=update_response)
+        result = await medical_record_service.update_medical_record(
+            existing_record=existing,
+            transcript_delta="医生：考虑偏头痛。",
+            is_json=False
+        )
+
+    assert result["sections"] == {"主诉": "unchanged", "诊断": "changed"}
+    assert "**主诉：** 头痛3天" in result["content"]
+    assert "**诊断：** 偏头痛" in result["content"]
+    assert result["content"].startswith("**病历记录**")
+    prompt = llm.generate_completion.call_args.kwargs["messages"][-1]["content"]
+    assert "考虑偏头痛" in prompt
+
+async def test_update_keeps_untouched_json_sections(medical_record_service):
+    """Test nested values of sections the update does not touch keep their JSON shape"""
+    existing = json.dumps({"体格检查": {"体温": "37.2"}, "诊断": ["头痛待查"]}, ensure_ascii=False)
+    update_response = {
+        'content': '{"诊断": ["偏头痛"]}',
+        'usage': Mock(prompt_tokens=5, completion_tokens=3, total_tokens=8)
+    }
+    with patch('app.services.medical_record.llm_service') as llm:
+        llm.generate_completion = AsyncMock(return_value=update_response)
+        result = await medical_record_service.update_medical_record(existing, "医生：考虑偏头痛。")
+
+    assert result["sections"] == {"体格检查": "unchanged", "诊断": "changed"}
+    assert json.loads(result["content"]) == {"体格检查": {"体温": "37.2"}, "诊断": ["偏头痛"]}
+
+    update_response["content"] = "{}"
+    with patch('app.services.medical_record.llm_service') as llm:
+        llm.generate_completion = AsyncMock(return_value=update_response)
+        result = await medical_record_service.update_medical_record(existing, "患者：谢谢医生。")
+    assert result["content"] == existing
+
+async def test_update_with_unparseable_reply_fails(medical_record_service):
+    """Test a reply that is not JSON raises instead of reporting every section unchanged"""
+    update_response = {
+        'content': '诊断：偏头痛',
+        'usage': Mock(prompt_tokens=5, completion_tokens=3, total_tokens=8)
+    }
+    with patch('app.services.medical_record.llm_service') as llm:
+        llm.generate_completion = AsyncMock(return_value=update_response)
+        with pytest.raises(LLMServiceError):
+            await medical_record_service.update_medical_record('{"诊断": "头痛待查"}', "医生：考虑偏头痛。")
+
+async def test_batch_reports_per_item_errors(medical_record_service):
+    """Test a failing batch item is reported without failing the other items"""
+    async def fake_generate(transcript, **kwargs):
+        if transcript == "bad":
+            raise LLMServiceError("test", "boom")
+        return {"content": transcript}
+
+    items = [{"transcript": t} for t in ["a", "bad", "c"]]
+    with patch.object(medical_record_service, 'generate_medical_record', side_effect=fake_generate):
+        results = [r async for r in medical_record_service.generate_medical_records_batch(items, concurrency=2)]
+
+    assert sorted(index for index, _, _ in results) == [0, 1, 2]
+    by_index = {index: (result, error) for index, result, error in results}
+    assert by_index[0][0] == {"content": "a"}
+    assert isinstance(by_index[1][1], LLMServiceError)
+    assert by_index[2][0] == {"content": "c"}
+
 # Stop all patches after tests
 def teardown_module(module):
     for p in patches:
@@ -0,0 +1,103 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.core.exceptions import RecordNotFound
+from app.services.medical_record import MedicalRecordService
+from app.services.record_store import RecordStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = RecordStore(str(tmp_path / "records.db"))
+    yield store
+    store.close()
+
+def test_save_get_update(store):
+    record_id = store.save("**Chief Complaint:** headache", "en", False)
+    record = store.get(record_id)
+    assert record["content"] == "**Chief Complaint:** headache"
+    assert record["language"] == "en" and record["is_json"] is False
+
+    store.update(record_id, "**Chief Complaint:** migraine")
+    assert store.get(record_id)["content"] == "**Chief Complaint:** migraine"
+
+    with pytest.raises(RecordNotFound) as error:
+        store.get("missing")
+    assert error.value.status_code == 404
+    with pytest.raises(RecordNotFound):
+        store.update("missing", "text")
+
+async def test_chat_by_record_id_reuses_prepared_context(store):
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(return_value={"content": "Answer", "usage": usage})
+    service = MedicalRecordService()
+    with patch("app.services.medical_record.llm_service", llm), \
+         patch("app.services.medical_record.record_store", store):
+        record_id = await service.save_record("BP 150/95, amlodipine 5 mg", "en", False)
+        with patch.object(store, "get", wraps=store.get) as get:
+            for question in ("Dose?", "Side effects?"):
+                await service.process_chat(question, "doctor", record_id=record_id, language="en")
+            assert get.call_count == 1
+
+        context = llm.generate_completion.call_args.kwargs["messages"][0]["content"]
+        assert "amlodipine 5 mg" in context
+
+        await service.update_record(record_id, "BP 130/85, amlodipine 10 mg")
+        await service.process_chat("Dose?", "doctor", record_id=record_id, language="en")
+        assert "amlodipine 10 mg" in llm.generate_completion.call_args.kwargs["messages"][0]["content"]
+
+        with pytest.raises(RecordNotFound):
+            await service.process_chat("Dose?", "doctor", record_id="missing", language="en")
+
+async def test_update_through_another_worker_is_seen(store):
+    """Test a context cached by one worker is refreshed after another worker updates the record"""
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(return_value={"content": "Answer", "usage": usage})
+    worker, other_worker = MedicalRecordService(), MedicalRecordService()
+    with patch("app.services.medical_record.llm_service", llm), \
+         patch("app.services.medical_record.record_store", store):
+        record_id = await worker.save_record("amlodipine 5 mg", "en", False)
+        await worker.process_chat("Dose?", "doctor", record_id=record_id, language="en")
+        await other_worker.update_record(record_id, "amlodipine 10 mg")
+        await worker.process_chat("Dose?", "doctor", record_id=record_id, language="en")
+
+    assert "amlodipine 10 mg" in llm.generate_completion.call_args.kwargs["messages"][0]["content"]
+
+
+def test_update_endpoint_loads_the_stored_record(store):
+    """Test /t2mr/update works from record_id alone, checks the id before the LLM call and stores the new format"""
+    from fastapi.testclient import TestClient
+    from app import app
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(return_value={"content": '{"Diagnosis": "Migraine"}', "usage": usage})
+    client = TestClient(app)
+    with patch("app.services.medical_record.llm_service", llm), \
+         patch("app.services.medical_record.record_store", store):
+        record_id = store.save("**Chief Complaint:** headache\n\n**Diagnosis:** unknown", "en", False)
+        response = client.post("/t2mr/update", json={
+            "record_id": record_id, "transcript_delta": "Doctor: migraine.", "language": "en", "is_json": True
+        })
+        assert response.status_code == 200
+        assert response.json()["sections"] == {"Chief Complaint": "unchanged", "Diagnosis": "changed"}
+        stored = store.get(record_id)
+        assert stored["is_json"] is True and "Migraine" in stored["content"]
+
+        llm.generate_completion.reset_mock()
+        missing = client.post("/t2mr/update", json={"record_id": "missing", "transcript_delta": "x"})
+        assert missing.status_code == 404
+        assert llm.generate_completion.await_count == 0
+        assert client.post("/t2mr/update", json={"transcript_delta": "x"}).status_code == 422
+
+def test_batch_results_are_stored(store):
+    import json
+    from fastapi.testclient import TestClient
+    from app import app
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(return_value={"content": '{"Diagnosis": "Migraine"}', "usage": usage})
+    with patch("app.services.medical_record.llm_service", llm), \
+         patch("app.services.medical_record.record_store", store):
+        response = TestClient(app).post("/t2mr/batch", json={"items": [{"transcript": "headache", "language": "en"}]})
+        line = json.loads(response.text.splitlines()[0])
+        assert store.get(line["result"]["record_id"])["content"] == '{"Diagnosis": "Migraine"}'
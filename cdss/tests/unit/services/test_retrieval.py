@@ -0,0 +1,65 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.embeddings import HashingEmbedder
+from app.services.retrieval import RetrievalIndex, RetrievalService, chunk_text
+
+GUIDELINES = {
+    "hypertension.md": "Hypertension\n\nStart ACE inhibitors for blood pressure above 140/90 in adults.",
+    "diabetes.txt": "Type 2 diabetes\n\nMetformin is the first-line therapy; check HbA1c every three months.",
+    "asthma.md": "Asthma\n\nInhaled corticosteroids control persistent asthma symptoms.",
+}
+
+@pytest.fixture
+def docs(tmp_path):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    for name, text in GUIDELINES.items():
+        (folder / name).write_text(text, encoding="utf-8")
+    return folder
+
+def test_chunk_text_respects_size_and_overlap():
+    text = "\n\n".join(["a" * 300, "b" * 300, "c" * 1000])
+    chunks = chunk_text(text, size=500, overlap=50)
+    assert all(len(chunk) <= 551 for chunk in chunks)
+    assert "".join(chunks).count("c") >= 1000
+    assert chunk_text("") == []
+
+def test_search_finds_relevant_guideline(docs, tmp_path):
+    index = RetrievalIndex(str(docs), str(tmp_path / "index"), HashingEmbedder())
+    stats = index.build()
+    assert stats["embedded"] == 3 and stats["rebuilt"]
+    assert isinstance(index.matrix, np.memmap)
+    hits = index.search("first-line therapy for type 2 diabetes metformin", k=2, min_score=0)
+    assert hits[0].source == "diabetes.txt"
+
+def test_build_is_incremental(docs, tmp_path):
+    embedder = HashingEmbedder()
+    RetrievalIndex(str(docs), str(tmp_path / "index"), embedder).build()
+
+    unchanged = RetrievalIndex(str(docs), str(tmp_path / "index"), embedder).build()
+    assert unchanged["embedded"] == 0 and not unchanged["rebuilt"]
+
+    (docs / "gout.md").write_text("Gout\n\nColchicine relieves acute gout flares.", encoding="utf-8")
+    added = RetrievalIndex(str(docs), str(tmp_path / "index"), embedder).build()
+    assert added["embedded"] == 1 and added["reused"] == 3 and added["rebuilt"]
+
+def test_retrieve_formats_passages_with_sources(docs, tmp_path):
+    service = RetrievalService(str(docs), str(tmp_path / "index"))
+    context = service.retrieve("inhaled corticosteroids asthma")
+    assert context.startswith("[asthma.md]")
+
+def test_concurrent_builds_embed_once(docs, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    embedder = HashingEmbedder()
+    indexes = [RetrievalIndex(str(docs), str(tmp_path / "index"), embedder) for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        stats = list(pool.map(lambda index: index.build(), indexes))
+
+    assert sum(s["embedded"] for s in stats) == 3
+    assert sum(s["rebuilt"] for s in stats) == 1
+    assert not list((tmp_path / "index").rglob("*.tmp"))
+    for index in indexes:
+        assert index.search("metformin type 2 diabetes", k=1, min_score=0)[0].source == "diabetes.txt"
@@ -0,0 +1,82 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.embeddings import HashingEmbedder
+from app.services.medical_record import MedicalRecordService
+from app.services.semantic_cache import SemanticCache
+
+class WordOverlapEmbedder(HashingEmbedder):
+    """The hashing embedder standing in for a sentence-transformers model"""
+    semantic = True
+
+class SameVectorEmbedder(HashingEmbedder):
+    """Worst case: every question looks identical to the embedding model"""
+    semantic = True
+
+    def encode(self, texts):
+        return super().encode(["question"] * len(texts))
+
+def test_near_duplicate_hits_within_scope():
+    cache = SemanticCache(capacity=4, threshold=0.8, embedder=WordOverlapEmbedder())
+    answer, vector = cache.lookup("en", "patient", "Can I eat before the CT scan?")
+    assert answer is None
+    cache.store("en", "patient", "Can I eat before the CT scan?", vector, "Please fast for 4 hours.")
+
+    assert cache.lookup("en", "patient", "can I eat before the CT scan")[0] == "Please fast for 4 hours."
+    assert cache.lookup("zh", "patient", "Can I eat before the CT scan?")[0] is None
+    assert cache.lookup("en", "doctor", "Can I eat before the CT scan?")[0] is None
+    assert cache.lookup("en", "patient", "How long does an MRI take?")[0] is None
+
+def test_least_recently_used_answer_is_evicted():
+    cache = SemanticCache(capacity=2, threshold=0.95, embedder=WordOverlapEmbedder())
+    for question in ("first question about fasting", "second question about parking"):
+        cache.store("en", "patient", question, cache.embed(question), question)
+    cache.lookup("en", "patient", "first question about fasting")
+    third = "third question about visiting hours"
+    cache.store("en", "patient", third, cache.embed(third), "third")
+
+    assert len(cache) == 2
+    assert cache.lookup("en", "patient", "first question about fasting")[0] is not None
+    assert cache.lookup("en", "patient", "second question about parking")[0] is None
+
+@pytest.mark.parametrize("language,stored,asked", [
+    ("en", "How many 5 mg tablets should I take?", "How many 50 mg tablets should I take?"),
+    ("en", "Can I eat before the CT scan?", "Can I not eat before the CT scan?"),
+    ("en", "Should I stop taking metformin?", "Should I keep taking metformin?"),
+    ("en", "I can eat after the scan", "I can't eat after the scan"),
+    ("fr", "Je peux manger avant le scanner ?", "Je ne peux pas manger avant le scanner ?"),
+    ("zh", "CT前可以吃饭吗", "CT前不可以吃饭吗"),
+    ("zh", "每天吃两片吗", "每天吃三片吗"),
+])
+def test_near_misses_are_never_served(language, stored, asked):
+    """Test questions differing in numbers or negations miss even at similarity 1.0"""
+    cache = SemanticCache(threshold=0.9, embedder=SameVectorEmbedder())
+    cache.store(language, "patient", stored, cache.embed(stored), "answer")
+    assert cache.lookup(language, "patient", stored)[0] == "answer"
+    assert cache.lookup(language, "patient", asked)[0] is None
+
+def test_refused_with_the_hashing_embedder():
+    cache = SemanticCache(threshold=0.5, embedder=HashingEmbedder())
+    assert not cache.available
+    assert cache.lookup("en", "patient", "Can I eat before the CT scan?") == (None, None)
+
+async def test_process_chat_bypasses_cache_with_medical_records():
+    cache = SemanticCache(threshold=0.8, embedder=WordOverlapEmbedder())
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(return_value={"content": "Fast for 4 hours.", "usage": usage})
+    service = MedicalRecordService()
+    with patch("app.services.medical_record.llm_service", llm), \
+         patch("app.services.medical_record.SEMANTIC_CACHE_ENABLED", True), \
+         patch("app.services.semantic_cache.semantic_cache", cache):
+        first = await service.process_chat("Can I eat before the CT?", "patient", language="en", use_semantic_cache=True)
+        second = await service.process_chat("can I eat before the CT", "patient", language="en", use_semantic_cache=True)
+        with_records = await service.process_chat(
+            "Can I eat before the CT?", "patient", medical_records="Diabetes", language="en", use_semantic_cache=True
+        )
+
+    assert not first.get("cached") and second["cached"] and second["content"] == "Fast for 4 hours."
+    assert not with_records.get("cached")
+    assert llm.generate_completion.await_count == 2
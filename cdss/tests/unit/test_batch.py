@@ -0,0 +1,49 @@
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.batch import collect_jobs, fingerprint, run_batch, run_job
+
+def test_collect_jobs_per_file_and_per_directory(tmp_path):
+    """Test media files are grouped into jobs and unknown files are ignored"""
+    (tmp_path / "visit1").mkdir()
+    (tmp_path / "a.txt").write_text("头痛3天", encoding="utf-8")
+    (tmp_path / "visit1" / "b.wav").write_bytes(b"RIFF")
+    (tmp_path / "visit1" / "c.png").write_bytes(b"PNG")
+    (tmp_path / "visit1" / "notes.bin").write_bytes(b"x")
+
+    per_file = collect_jobs(str(tmp_path))
+    assert [key for key, _ in per_file] == ["a.txt", "visit1/b.wav", "visit1/c.png"]
+
+    per_directory = dict(collect_jobs(str(tmp_path), per_directory=True))
+    assert len(per_directory["visit1"]) == 2
+
+def test_run_batch_skips_checkpointed_jobs(tmp_path):
+    """Test a resumed run does not redo jobs recorded in the checkpoint"""
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    (archive / "a.txt").write_text("头痛3天", encoding="utf-8")
+    output = tmp_path / "records.jsonl"
+    checkpoint = tmp_path / "records.jsonl.checkpoint"
+    checkpoint.write_text(
+        json.dumps({"key": "a.txt", "fingerprint": fingerprint([str(archive / "a.txt")])}) + "\n",
+        encoding="utf-8"
+    )
+
+    stats = run_batch(str(archive), str(output))
+
+    assert stats == {"processed": 0, "skipped": 1, "failed": 0}
+    assert not output.exists()
+
+def test_wav_and_m4a_jobs_are_transcribed(tmp_path):
+    """Test recordings reach ASR with a content type the service accepts"""
+    from app.services.medical_record import medical_record_service
+    asr = MagicMock()
+    asr.transcribe_voice = AsyncMock(return_value="头痛3天")
+    record = {"content": "{}", "prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+    for name in ("visit.wav", "visit.m4a"):
+        (tmp_path / name).write_bytes(b"RIFF" + name.encode())
+        with patch("app.services.medical_record.INFERENCE_SOCKET", "test.sock"), \
+                patch("app.services.inference_client.inference_client", asr), \
+                patch.object(medical_record_service, "generate_medical_record", AsyncMock(return_value=dict(record))):
+            entry = run_job(name, [str(tmp_path / name)], "zh", True)
+        assert entry["status"] == "ok", entry.get("error")
+    assert asr.transcribe_voice.await_count == 2
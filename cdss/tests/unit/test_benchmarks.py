@@ -0,0 +1,78 @@
+import pytest
+from benchmarks.fixtures import synthetic_png, synthetic_wav
+from benchmarks.load import compare
+from app.utils.audio import audio_duration
+
+def _results(p95: float, rps: float) -> dict:
+    return {"endpoints": {"t2mr": {"requests_per_s": rps, "latency_s": {"p50": p95 / 2, "p95": p95, "p99": p95}}}}
+
+def test_fixtures_are_valid_media():
+    """Test the synthetic fixtures are a WAV of the requested length and a PNG"""
+    assert audio_duration(synthetic_wav(seconds=2.0)) == 2.0
+    assert synthetic_png(32, 32).startswith(b"\x89PNG\r\n\x1a\n")
+
+def test_compare_flags_regressions_beyond_tolerance():
+    """Test latency and throughput regressions are reported, noise is not"""
+    baseline = _results(p95=1.0, rps=10.0)
+    assert compare(_results(p95=1.05, rps=9.5), baseline, tolerance=0.1) == []
+    regressions = compare(_results(p95=1.5, rps=5.0), baseline, tolerance=0.1)
+    assert any("p95" in line for line in regressions)
+    assert any("requests/s" in line for line in regressions)
+
+def test_engine_run_reports_cold_warm_and_rtf(tmp_path, monkeypatch):
+    """Test an engine run separates the cold call and computes the real-time factor"""
+    from benchmarks import engines
+    monkeypatch.setattr("app.core.serving.limit_threads", lambda threads: None)
+    monkeypatch.setitem(engines.ENGINES, "echo", ("audio", lambda: (lambda path: "text")))
+    audio = tmp_path / "visit.wav"
+    audio.write_bytes(synthetic_wav(seconds=1.0))
+
+    run = engines.run_engine("echo", threads=1, files=[str(audio)], repeats=2)
+
+    assert run["cold_s"] is not None
+    assert run["warm_s"]["p50"] is not None
+    assert run["real_time_factor"] < 1
+    assert run["peak_rss_bytes"] > 0
+
+def test_engines_run_through_the_service(tmp_path):
+    """Test engines are called through the service and refused when it did not load them locally"""
+    from benchmarks import engines
+
+    class FakeService:
+        def __init__(self, loaded):
+            self.loaded = loaded
+
+        def warm_up(self, languages):
+            pass
+
+        def loaded_models(self):
+            return {"zh": self.loaded}
+
+        async def transcribe(self, content, language):
+            return f"{language}:{len(content)}"
+
+    image = tmp_path / "scan.png"
+    image.write_bytes(synthetic_png(8, 8))
+    service = FakeService("PaddleOCR")
+    infer = engines._service_engine(service, "zh", "paddleocr", service.transcribe)
+    assert infer(str(image)) == f"zh:{image.stat().st_size}"
+
+    external = FakeService("external")
+    with pytest.raises(RuntimeError):
+        engines._service_engine(external, "zh", "paddleocr", external.transcribe)
+
+@pytest.mark.parametrize("language", ["zh", "en"])
+def test_stub_answers_the_requested_record_sections(language):
+    """Test the stub's JSON record covers the schema, and a retry gets just the sections it asks for"""
+    import json
+    from app.core import prompts
+    from app.core.i18n import get_medical_record_sections
+    from benchmarks.stub_llm import _reply_for
+
+    schema = get_medical_record_sections(language)
+    messages = prompts.medical_record_messages(language, "cough", is_json=True)
+    body = {"messages": messages, "response_format": {"type": "json_object"}}
+    assert list(json.loads(_reply_for(body))) == schema
+
+    retry = prompts.section_retry_messages(language, messages, schema[-2:])
+    assert list(json.loads(_reply_for({**body, "messages": retry}))) == schema[-2:]
@@ -0,0 +1,116 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.core.i18n import get_medical_record_sections
+from app.services.medical_record import MedicalRecordService
+from app.utils.section_stream import SectionStreamValidator
+
+SECTIONS = ["Chief Complaint", "Diagnosis", "Treatment Plan"]
+
+def _feed_in_chunks(validator: SectionStreamValidator, text: str, size: int = 3) -> int:
+    """Feed text a few characters at a time; return how much was consumed before the validator stopped"""
+    for start in range(0, len(text), size):
+        if not validator.feed(text[start:start + size]):
+            return start + size
+    return len(text)
+
+def test_valid_record_after_code_fence():
+    validator = SectionStreamValidator(SECTIONS)
+    text = '```json\n{"Chief Complaint": "Headache \\"3 days\\"", "diagnosis": {"primary": "Migraine"}, "Treatment Plan": null}\n```'
+    _feed_in_chunks(validator, text)
+
+    assert validator.done and validator.error is None and validator.missing == []
+    assert validator.sections["Chief Complaint"] == 'Headache "3 days"'
+    assert validator.sections["Diagnosis"] == {"primary": "Migraine"}
+
+def test_unknown_section_stops_the_stream_early():
+    validator = SectionStreamValidator(SECTIONS)
+    text = '{"Chief Complaint": "Headache", "Patient Name": "' + "x" * 500 + '"}'
+    consumed = _feed_in_chunks(validator, text)
+
+    assert "unknown section" in validator.error
+    assert consumed < text.index("Name")
+    assert validator.sections == {"Chief Complaint": "Headache"}
+    assert validator.missing == ["Diagnosis", "Treatment Plan"]
+
+def test_repeated_section_and_chatter_are_rejected():
+    repeated = SectionStreamValidator(SECTIONS)
+    repeated.feed('{"Diagnosis": "Migraine", "Diagnosis": "Tension headache"}')
+    assert "repeated section" in repeated.error
+    assert repeated.sections == {"Diagnosis": "Migraine"}
+
+    chatter = SectionStreamValidator(SECTIONS)
+    assert not chatter.feed("Sure! " * 50)
+    assert chatter.error == "no JSON object"
+
+    chatter.reset()
+    assert chatter.feed('{"Diagnosis"') and chatter.error is None
+
+async def test_only_failed_sections_are_retried():
+    schema = get_medical_record_sections("en")
+    first = {name: f"{name} text" for name in schema[:5]}
+    replies = [
+        json.dumps(first)[:-1] + ', "Patient Name": "John"}',
+        json.dumps({name: "None" for name in schema[5:]})
+    ]
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+
+    async def complete(**kwargs):
+        content = replies.pop(0)
+        kwargs["validator"].feed(content)
+        return {"content": content, "usage": usage}
+
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(side_effect=complete)
+    with patch("app.services.medical_record.llm_service", llm), \
+            patch("app.services.medical_record.STRUCTURED_OUTPUT_ENABLED", True):
+        result = await MedicalRecordService().generate_medical_record("Headache for 3 days", language="en")
+
+    assert llm.generate_completion.await_count == 2
+    retry = llm.generate_completion.call_args.kwargs["messages"][-1]["content"]
+    assert schema[5] in retry and schema[0] not in retry
+    record = json.loads(result["content"])
+    assert list(record) == schema
+    assert record["Chief Complaint"] == "Chief Complaint text"
+    assert result["total_tokens"] == 30
+
+async def test_identical_concurrent_records_share_one_generation():
+    schema = get_medical_record_sections("en")
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+
+    async def complete(**kwargs):
+        await asyncio.sleep(0.01)
+        content = json.dumps({name: "None" for name in schema})
+        kwargs["validator"].feed(content)
+        return {"content": content, "usage": usage}
+
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(side_effect=complete)
+    service = MedicalRecordService()
+    with patch("app.services.medical_record.llm_service", llm), \
+            patch("app.services.medical_record.STRUCTURED_OUTPUT_ENABLED", True):
+        first, second = await asyncio.gather(
+            service.generate_medical_record("Headache for 3 days", language="en"),
+            service.generate_medical_record("Headache for 3 days", language="en")
+        )
+
+    assert llm.generate_completion.await_count == 1
+    assert first["content"] == second["content"]
+
+async def test_nested_values_and_omitted_sections_are_kept_as_written():
+    schema = get_medical_record_sections("zh")
+    content = json.dumps({schema[0]: "头痛三天", schema[1]: {"体温": "37.2"}, schema[2]: ["偏头痛"]}, ensure_ascii=False)
+    usage = MagicMock(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+
+    async def complete(**kwargs):
+        kwargs["validator"].feed(content)
+        return {"content": content, "usage": usage}
+
+    llm = MagicMock()
+    llm.generate_completion = AsyncMock(side_effect=complete)
+    with patch("app.services.medical_record.llm_service", llm), \
+            patch("app.services.medical_record.STRUCTURED_OUTPUT_ENABLED", True):
+        result = await MedicalRecordService().generate_medical_record("头痛三天", language="zh")
+
+    assert llm.generate_completion.await_count == 1
+    assert json.loads(result["content"]) == json.loads(content)
@@ -0,0 +1,60 @@
+import pytest
+from app.utils.transcript_normalizer import (
+    collapse_repeats,
+    dedupe_segments,
+    normalize_transcript,
+    strip_disfluencies
+)
+
+@pytest.mark.parametrize("language,text,expected", [
+    ("zh", "嗯，我头痛。那个，额头也痛。", "我头痛。额头也痛。"),
+    ("zh", "患者：嗯。", "患者：嗯。"),
+    ("en", "Um, the pai- pain is, you know, bad", "the pain is, you know, bad"),
+    ("en", "Well, I slept. So, no pain", "I slept. no pain"),
+])
+def test_strip_disfluencies(language, text, expected):
+    """Test fillers are removed without touching words that merely contain them"""
+    assert strip_disfluencies(text, language) == expected
+
+@pytest.mark.parametrize("language,text,expected", [
+    ("zh", "我我我头痛，头痛三天", "我头痛三天"),
+    ("zh", "慢慢来", "慢慢来"),
+    ("en", "I I have, I have a a headache", "I have a headache"),
+    ("en", "WBC 5.0 5.0", "WBC 5.0 5.0"),
+])
+def test_collapse_repeats(language, text, expected):
+    """Test repeated words and phrases collapse but numbers and reduplication survive"""
+    assert collapse_repeats(text, language) == expected
+
+@pytest.mark.parametrize("language,text", [
+    ("en", "5 mm nodule, ER positive"),
+    ("en", "the lesion is 12 mm"),
+    ("en", "I slept well, no pain"),
+    ("en", "It feels like, a burning pain"),
+    ("fr", "Le moral est bon, pas de douleur"),
+    ("es", "Duermo bien pues, sin dolor"),
+    ("zh", "研究研究再说"),
+    ("zh", "每天一次，一次两片"),
+])
+def test_clinical_content_is_kept(language, text):
+    """Test units, receptor status, reduplication and mid-sentence words survive normalisation"""
+    assert normalize_transcript(text, language).text == text
+
+def test_dedupe_overlapping_segments():
+    """Test the overlap between consecutive recordings is removed from the later one"""
+    segments = [
+        "患者三天前开始头痛，昨天开始发烧到三十八度五",
+        "昨天开始发烧到三十八度五，今天还有点咳嗽",
+        "今天还有点咳嗽",
+    ]
+    assert dedupe_segments(segments, min_overlap=8) == [
+        "患者三天前开始头痛，昨天开始发烧到三十八度五",
+        "今天还有点咳嗽",
+        "今天还有点咳嗽",
+    ]
+
+def test_normalize_transcript_reports_tokens_saved():
+    """Test normalisation reports how many prompt tokens it saved"""
+    result = normalize_transcript("Um, I I have, uh, a a headache", "en")
+    assert result.text == "I have, a headache"
+    assert result.tokens_saved == result.tokens_before - result.tokens_after > 0